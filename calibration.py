@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+ADC标定 - 只记录原始ADC值，读取时再换算为电压/电流
+功能：
+1. 标定参数（满量程码值、量程、各通道比例）以JSON写入列式文件头和分段清单
+2. 读取端用NumPy对整列换算，结果与发送端逐个换算的值一致
+3. 修改标定参数后可重新换算历史数据，原始值不受影响
+
+换算公式（与发送端 SensorManager 相同）：
+    读数 = clip(原始值 / max_adc_value * adc_voltage_range, 0, reading_max)
+    物理量 = 读数 * scale
+"""
+
+import glob
+import os
+
+from segments import MANIFEST_SUFFIX, load_manifest
+
+CALIBRATION_VERSION = 1
+
+# 换算得到的列 -> 对应的原始值列
+DERIVED_COLUMNS = {
+    "voltage_ch0": "raw_ch0",
+    "current_ch1": "raw_ch1",
+    "voltage_ch2": "raw_ch2",
+    "voltage_ch3": "raw_ch3",
+}
+
+
+def make_calibration(max_adc_value, adc_voltage_range, voltage_scale, current_scale, reading_max=3.3):
+    """生成写入文件头的标定参数"""
+    scales = {"voltage_ch0": voltage_scale, "current_ch1": current_scale, "voltage_ch2": 1.0, "voltage_ch3": 1.0}
+    return {
+        "version": CALIBRATION_VERSION,
+        "max_adc_value": max_adc_value,
+        "adc_voltage_range": adc_voltage_range,
+        "reading_max": reading_max,
+        "channels": {name: {"raw": raw, "scale": scales[name]} for name, raw in DERIVED_COLUMNS.items()},
+    }
+
+
+# 发送端默认参数（ADS1115 增益1，分压/分流比例 60V、120A 对应 3.3V）
+DEFAULT_CALIBRATION = make_calibration(32767, 4.096, 60.0 / 3.3, 120.0 / 3.3)
+
+
+def raw_schema(schema):
+    """去掉可换算的列，只保留原始值和其它测量值"""
+    return [(name, dtype) for name, dtype in schema if name not in DERIVED_COLUMNS]
+
+
+def needs_calibration(columns):
+    """数据中有原始值列但缺少换算列"""
+    return any(name not in columns and raw in columns for name, raw in DERIVED_COLUMNS.items())
+
+
+def apply_calibration(columns, calibration=None):
+    """为缺少的换算列补上物理量；columns 可以是 {列名: 数组} 或 pandas DataFrame，原地修改并返回"""
+    import numpy as np
+
+    calibration = calibration or DEFAULT_CALIBRATION
+    full_scale = calibration["adc_voltage_range"] / calibration["max_adc_value"]
+    for name, channel in calibration["channels"].items():
+        if name in columns or channel["raw"] not in columns:
+            continue
+        raw = np.asarray(columns[channel["raw"]], dtype=np.float64)
+        reading = np.clip(raw * full_scale, 0.0, calibration["reading_max"])
+        columns[name] = reading * channel["scale"]
+    return columns
+
+
+def find_calibration(data_file):
+    """查找数据文件的标定参数：所在文件夹中列出该文件的分段清单，找不到时返回None"""
+    name = os.path.basename(data_file)
+    for manifest_path in glob.glob(os.path.join(os.path.dirname(data_file), "*" + MANIFEST_SUFFIX)):
+        try:
+            manifest = load_manifest(manifest_path)
+        except (OSError, ValueError):
+            continue
+        if any(segment["file"] == name for segment in manifest["segments"]):
+            return manifest.get("metadata", {}).get("calibration")
+    return None
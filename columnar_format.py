@@ -0,0 +1,364 @@
+# -*- coding: utf-8 -*-
+"""
+二进制列式记录格式（.scol）- 追加写入、分块、带类型的传感器数据文件
+功能：
+1. 文件头为JSON格式的列定义（列名、类型），之后是若干数据块
+2. 每个数据块内按列连续存放：int64纳秒时间戳、int16原始ADC值、float32测量值
+3. 读取端用内存映射直接得到NumPy数组，无需逐行解析（压缩文件先解压到内存，指定时间窗口时只解压覆盖窗口的帧）
+4. 与现有CSV格式互相转换
+5. 只记录原始ADC值的文件在头部带有标定参数，读取时自动换算出电压/电流列
+
+文件布局（小端）：
+    b"SCOL" | 版本 uint16 | 保留 uint16 | 头部长度 uint32 | 头部JSON | 填充到8字节对齐
+    数据块: b"CHNK" | 行数 uint32 | 数据长度 uint32 | 保留 uint32 | 各列数据（每列填充到8字节对齐）
+写入中断时末尾可能有不完整的数据块，读取时会被忽略。
+
+命令行用法：
+    python columnar_format.py to-csv data.scol [-o data.csv]
+    python columnar_format.py from-csv data.csv [-o data.scol]
+    python columnar_format.py info data.scol
+"""
+
+import array
+import datetime
+import json
+import os
+import struct
+import sys
+import argparse
+
+from calibration import DERIVED_COLUMNS, apply_calibration
+from compression import split_compression_suffix, read_data_bytes
+
+MAGIC = b"SCOL"
+CHUNK_MAGIC = b"CHNK"
+VERSION = 1
+FILE_HEADER = struct.Struct("<4sHHI")
+CHUNK_HEADER = struct.Struct("<4sIII")
+ALIGNMENT = 8
+FILE_EXTENSION = ".scol"
+
+# 列类型 -> (array模块类型码, 字节数)
+DTYPES = {
+    "i8": ("q", 8),
+    "i4": ("i", 4),
+    "i2": ("h", 2),
+    "f8": ("d", 8),
+    "f4": ("f", 4),
+}
+
+# 传感器数据的列定义（与CSV的列一一对应，时间戳改为纳秒整数）
+SENSOR_SCHEMA = [
+    ("timestamp_ns", "i8"),
+    ("voltage_ch0", "f4"), ("current_ch1", "f4"), ("voltage_ch2", "f4"), ("voltage_ch3", "f4"),
+    ("raw_ch0", "i2"), ("raw_ch1", "i2"), ("raw_ch2", "i2"), ("raw_ch3", "i2"),
+    ("lux", "f4"), ("temperature", "f4"), ("pressure", "f4"), ("humidity", "f4"), ("altitude", "f4"),
+]
+
+# 可选的单调时钟列（纳秒），不受系统时间调整影响，用于计算采样间隔
+MONOTONIC_COLUMN = ("monotonic_ns", "i8")
+
+CSV_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+
+def _padding(length):
+    return (-length) % ALIGNMENT
+
+
+class ColumnarWriter:
+    """追加写入的列式文件，每次 write_chunk 写入一个完整的数据块"""
+
+    def __init__(self, path, schema=SENSOR_SCHEMA, metadata=None, fileobj=None):
+        for name, dtype in schema:
+            if dtype not in DTYPES:
+                raise ValueError(f"不支持的列类型: {name}={dtype}")
+        self.path = path
+        self.schema = list(schema)
+        self.rows_written = 0
+        # fileobj 可以是其它可写对象（如压缩写入器）
+        self.file = fileobj or open(path, "wb")
+
+        header = {
+            "columns": [{"name": name, "dtype": dtype} for name, dtype in self.schema],
+            "byteorder": "little",
+            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        }
+        if metadata:
+            header["metadata"] = metadata
+        header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+        self.file.write(FILE_HEADER.pack(MAGIC, VERSION, 0, len(header_bytes)))
+        self.file.write(header_bytes)
+        self.file.write(b"\0" * _padding(FILE_HEADER.size + len(header_bytes)))
+
+    def encode_chunk(self, rows):
+        """将若干行编码为一个数据块（bytes）"""
+        columns = []
+        for index, (name, dtype) in enumerate(self.schema):
+            typecode, _ = DTYPES[dtype]
+            if typecode in "fd":
+                values = array.array(typecode, (float(row[index] or 0) for row in rows))
+            else:
+                values = array.array(typecode, (int(row[index] or 0) for row in rows))
+            if sys.byteorder != "little":
+                values.byteswap()
+            data = values.tobytes()
+            columns.append(data + b"\0" * _padding(len(data)))
+        payload = b"".join(columns)
+        return CHUNK_HEADER.pack(CHUNK_MAGIC, len(rows), len(payload), 0) + payload
+
+    def write_chunk(self, rows):
+        """写入一个数据块，返回写入的字节数"""
+        if not rows:
+            return 0
+        data = self.encode_chunk(rows)
+        self.file.write(data)
+        self.rows_written += len(rows)
+        return len(data)
+
+    def flush(self):
+        self.file.flush()
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+class ColumnarReader:
+    """内存映射读取列式文件，列数据以NumPy数组返回
+    压缩文件指定 start_ns/end_ns 时只解压覆盖该时间窗口的帧（帧按数据块切分，边界处的块可能包含窗口外的行）"""
+
+    def __init__(self, path, start_ns=None, end_ns=None):
+        import numpy as np
+        self.np = np
+        self.path = path
+        if split_compression_suffix(path)[1]:
+            self.mm = np.frombuffer(read_data_bytes(path, start_ns, end_ns), dtype=np.uint8)
+        else:
+            self.mm = np.memmap(path, dtype=np.uint8, mode="r")
+        if len(self.mm) < FILE_HEADER.size:
+            raise ValueError(f"文件过短: {path}")
+
+        magic, version, _, header_len = FILE_HEADER.unpack(bytes(self.mm[:FILE_HEADER.size]))
+        if magic != MAGIC:
+            raise ValueError(f"不是列式数据文件: {path}")
+        if version > VERSION:
+            raise ValueError(f"不支持的文件版本: {version}")
+
+        header_end = FILE_HEADER.size + header_len
+        self.header = json.loads(bytes(self.mm[FILE_HEADER.size:header_end]).decode("utf-8"))
+        self.columns = [(c["name"], c["dtype"]) for c in self.header["columns"]]
+        self.metadata = self.header.get("metadata", {})
+        # 只记录原始值的文件：按头部的标定参数换算出缺少的列
+        self.calibration = self.metadata.get("calibration")
+        stored = dict(self.columns)
+        self.derived = [name for name, raw in DERIVED_COLUMNS.items()
+                        if self.calibration and name not in stored and raw in stored]
+        order = [name for name, _ in SENSOR_SCHEMA]
+        self.names = sorted(list(stored) + self.derived,
+                            key=lambda name: order.index(name) if name in order else len(order))
+        self.data_offset = header_end + _padding(header_end)
+
+        # 扫描数据块头（只读取每块16字节），末尾不完整的块被忽略
+        self.chunks = []  # (数据起始偏移, 行数)
+        self.valid_length = self.data_offset
+        offset = self.data_offset
+        size = len(self.mm)
+        while offset + CHUNK_HEADER.size <= size:
+            magic, rows, payload_len, _ = CHUNK_HEADER.unpack(bytes(self.mm[offset:offset + CHUNK_HEADER.size]))
+            if magic != CHUNK_MAGIC or offset + CHUNK_HEADER.size + payload_len > size:
+                break
+            self.chunks.append((offset + CHUNK_HEADER.size, rows))
+            offset += CHUNK_HEADER.size + payload_len
+            self.valid_length = offset
+        self.num_rows = sum(rows for _, rows in self.chunks)
+
+    def _chunk_columns(self, data_offset, rows):
+        """返回单个数据块各列的零拷贝视图"""
+        np = self.np
+        views = {}
+        offset = data_offset
+        for name, dtype in self.columns:
+            itemsize = DTYPES[dtype][1]
+            length = rows * itemsize
+            views[name] = self.mm[offset:offset + length].view(np.dtype("<" + dtype))
+            offset += length + _padding(length)
+        return views
+
+    def time_range(self):
+        """首末行的 timestamp_ns（只读取首末两个数据块），无数据时返回 (None, None)"""
+        chunks = [chunk for chunk in self.chunks if chunk[1]]
+        if not chunks:
+            return None, None
+        first = self._chunk_columns(*chunks[0])["timestamp_ns"]
+        last = self._chunk_columns(*chunks[-1])["timestamp_ns"]
+        return int(first[0]), int(last[-1])
+
+    def iter_chunks(self):
+        """逐块返回 {列名: 数组视图}，存储的列不复制数据，换算列为新数组"""
+        for data_offset, rows in self.chunks:
+            views = self._chunk_columns(data_offset, rows)
+            if self.derived:
+                apply_calibration(views, self.calibration)
+            yield views
+
+    def read(self, columns=None):
+        """读取全部数据，返回 {列名: 数组}；只有一个数据块时存储的列为零拷贝视图"""
+        np = self.np
+        names = columns or self.names
+        chunks = list(self.iter_chunks())
+        if len(chunks) == 1:
+            return {name: chunks[0][name] for name in names}
+        result = {}
+        for name in names:
+            dtype = np.dtype("<" + dict(self.columns).get(name, "f8"))
+            parts = [chunk[name] for chunk in chunks]
+            result[name] = np.concatenate(parts) if parts else np.empty(0, dtype=dtype)
+        return result
+
+    def to_dataframe(self, columns=None):
+        """读取为pandas DataFrame"""
+        import pandas as pd
+        return pd.DataFrame(self.read(columns))
+
+    def close(self):
+        mmap_obj = getattr(self.mm, "_mmap", None)
+        self.mm = None
+        if mmap_obj is not None:
+            try:
+                mmap_obj.close()
+            except BufferError:
+                # 仍有数组视图在使用，交给垃圾回收
+                pass
+
+
+def scan_chunks(data, offset=0):
+    """扫描内存中的数据块（不解析列数据），返回 (完整块的结束位置, 行数, 首行时间戳, 末行时间戳)
+    时间戳取每块第一列（timestamp_ns），用于恢复时重建帧索引"""
+    rows_total = 0
+    first_ns = last_ns = 0
+    while offset + CHUNK_HEADER.size <= len(data):
+        magic, rows, payload_len, _ = CHUNK_HEADER.unpack_from(data, offset)
+        end = offset + CHUNK_HEADER.size + payload_len
+        if magic != CHUNK_MAGIC or end > len(data):
+            break
+        if rows:
+            column = offset + CHUNK_HEADER.size
+            if not rows_total:
+                first_ns = struct.unpack_from("<q", data, column)[0]
+            last_ns = struct.unpack_from("<q", data, column + (rows - 1) * 8)[0]
+        rows_total += rows
+        offset = end
+    return offset, rows_total, first_ns, last_ns
+
+
+def header_end(data):
+    """文件头（含对齐填充）的长度，数据不足时返回None"""
+    if len(data) < FILE_HEADER.size:
+        return None
+    magic, _, _, header_len = FILE_HEADER.unpack_from(data)
+    end = FILE_HEADER.size + header_len
+    end += _padding(end)
+    if magic != MAGIC or end > len(data):
+        return None
+    return end
+
+
+def recover_columnar(path):
+    """截断未压缩列式文件末尾不完整的数据块（只读取各块的块头和首末时间戳）
+    返回 (行数, 截掉的字节数, 首行时间戳, 末行时间戳)"""
+    reader = ColumnarReader(path)
+    rows, valid_length = reader.num_rows, reader.valid_length
+    first_ns, last_ns = reader.time_range()
+    reader.close()
+    trailing = os.path.getsize(path) - valid_length
+    if trailing:
+        with open(path, "r+b") as f:
+            f.truncate(valid_length)
+    return rows, trailing, first_ns, last_ns
+
+
+def csv_to_columnar(csv_path, output_path=None, chunk_rows=4096):
+    """将现有CSV格式转换为列式文件，返回输出路径"""
+    import csv
+
+    output_path = output_path or os.path.splitext(csv_path)[0] + FILE_EXTENSION
+    writer = ColumnarWriter(output_path, SENSOR_SCHEMA)
+    names = [name for name, _ in SENSOR_SCHEMA]
+    try:
+        with open(csv_path, newline="", encoding="utf-8") as f:
+            reader = csv.DictReader(f)
+            rows = []
+            for record in reader:
+                if "timestamp_ns" in record and record["timestamp_ns"]:
+                    timestamp_ns = int(record["timestamp_ns"])
+                else:
+                    moment = datetime.datetime.strptime(record["timestamp"], CSV_TIMESTAMP_FORMAT)
+                    timestamp_ns = int(round(moment.timestamp() * 1000)) * 1000000
+                rows.append([timestamp_ns] + [record.get(name) or 0 for name in names[1:]])
+                if len(rows) >= chunk_rows:
+                    writer.write_chunk(rows)
+                    rows = []
+            writer.write_chunk(rows)
+    finally:
+        writer.close()
+    return output_path
+
+
+def columnar_to_csv(path, output_path=None):
+    """将列式文件转换回现有CSV格式，返回输出路径"""
+    import csv
+
+    output_path = output_path or os.path.splitext(path)[0] + ".csv"
+    reader = ColumnarReader(path)
+    names = reader.names
+    value_names = [name for name in names if name != "timestamp_ns"]
+    try:
+        with open(output_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["timestamp"] + value_names)
+            for chunk in reader.iter_chunks():
+                timestamps = [
+                    datetime.datetime.fromtimestamp(ns / 1e9).strftime(CSV_TIMESTAMP_FORMAT)[:-3]
+                    for ns in chunk["timestamp_ns"].tolist()]
+                columns = [chunk[name].tolist() for name in value_names]
+                writer.writerows(zip(timestamps, *columns))
+    finally:
+        reader.close()
+    return output_path
+
+
+def parse_arguments():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description='列式传感器数据文件工具')
+    parser.add_argument('action', choices=['to-csv', 'from-csv', 'info'], help='操作')
+    parser.add_argument('input', help='输入文件')
+    parser.add_argument('-o', '--output', help='输出文件（默认与输入同名，扩展名不同）')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+
+    if not os.path.exists(args.input):
+        print(f"错误: 文件 {args.input} 不存在")
+        sys.exit(1)
+
+    if args.action == 'to-csv':
+        print(f"已转换: {columnar_to_csv(args.input, args.output)}")
+    elif args.action == 'from-csv':
+        print(f"已转换: {csv_to_columnar(args.input, args.output)}")
+    else:
+        reader = ColumnarReader(args.input)
+        print(f"文件: {args.input}")
+        print(f"数据块: {len(reader.chunks)}，行数: {reader.num_rows}")
+        print(f"列: {', '.join(f'{name}({dtype})' for name, dtype in reader.columns)}")
+        if reader.derived:
+            print(f"读取时换算: {', '.join(reader.derived)}")
+        if reader.metadata:
+            print(f"元数据: {json.dumps(reader.metadata, ensure_ascii=False)}")
+        trailing = os.path.getsize(args.input) - reader.valid_length
+        if trailing:
+            print(f"警告: 文件末尾有 {trailing} 字节不完整的数据块")
+        reader.close()
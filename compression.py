@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+"""
+分帧流式压缩 - 记录文件边写边压缩，可按帧定位、可在写入过程中读取
+功能：
+1. 支持 gzip（标准库）和 zstd（需安装 zstandard）
+2. 每次刷新做一次同步刷新（sync flush），已刷新的数据即可被解压读取
+3. 未压缩数据每满一帧（默认1MB）结束一个独立的压缩帧，帧信息追加到 .idx 索引文件
+4. 读取端按索引只解压覆盖时间窗口的帧，末尾未结束的帧按流解压，不完整部分被忽略
+
+文件布局：
+    data.csv.gz      若干个独立的gzip成员（标准gzip工具可直接解压完整文件）
+    data.csv.gz.idx  每帧一条记录：压缩偏移、压缩长度、原始偏移、行数、首末行时间戳（纳秒）
+第一帧只包含文件头（CSV表头或列式文件头），行数为0，读取时总会包含。
+
+命令行用法：
+    python compression.py info data.csv.gz
+    python compression.py decompress data.csv.gz [-o data.csv]
+"""
+
+import argparse
+import os
+import struct
+import sys
+import zlib
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+# 压缩格式 -> 文件扩展名
+COMPRESSIONS = {"gzip": ".gz", "zstd": ".zst"}
+DEFAULT_LEVELS = {"gzip": 6, "zstd": 3}
+DEFAULT_FRAME_SIZE = 1024 * 1024  # 每帧未压缩数据量
+INDEX_SUFFIX = ".idx"
+# 压缩偏移, 压缩长度, 原始偏移, 行数, 保留, 首行时间戳, 末行时间戳
+INDEX_RECORD = struct.Struct("<QQQIIqq")
+
+
+def available_compressions():
+    """当前环境可用的压缩格式"""
+    return [name for name in COMPRESSIONS if name != "zstd" or ZSTD_AVAILABLE]
+
+
+def split_compression_suffix(path):
+    """返回 (去掉压缩扩展名的路径, 压缩格式或None)"""
+    for name, suffix in COMPRESSIONS.items():
+        if path.endswith(suffix):
+            return path[:-len(suffix)], name
+    return path, None
+
+
+class _Compressor:
+    """gzip/zstd压缩对象的统一接口"""
+
+    def __init__(self, codec, level):
+        if codec == "gzip":
+            self.obj = zlib.compressobj(level, zlib.DEFLATED, 31)
+            self.sync_mode = zlib.Z_SYNC_FLUSH
+            self.finish_mode = zlib.Z_FINISH
+        elif codec == "zstd":
+            if not ZSTD_AVAILABLE:
+                raise ValueError("zstandard模块不可用，无法使用zstd压缩")
+            self.obj = zstandard.ZstdCompressor(level=level).compressobj()
+            self.sync_mode = zstandard.COMPRESSOBJ_FLUSH_BLOCK
+            self.finish_mode = zstandard.COMPRESSOBJ_FLUSH_FINISH
+        else:
+            raise ValueError(f"不支持的压缩格式: {codec}")
+
+    def compress(self, data):
+        return self.obj.compress(data)
+
+    def sync(self):
+        return self.obj.flush(self.sync_mode)
+
+    def finish(self):
+        return self.obj.flush(self.finish_mode)
+
+
+def _new_decompressor(codec):
+    if codec == "gzip":
+        return zlib.decompressobj(31)
+    if not ZSTD_AVAILABLE:
+        raise ValueError("zstandard模块不可用，无法读取zstd文件")
+    return zstandard.ZstdDecompressor().decompressobj()
+
+
+def decompress_stream(data, codec):
+    """解压若干个连续的压缩帧，末尾不完整的帧尽量解压已刷新的部分"""
+    parts = []
+    while data:
+        decompressor = _new_decompressor(codec)
+        try:
+            parts.append(decompressor.decompress(data))
+        except Exception as e:
+            # zlib.error / zstandard.ZstdError
+            print(f"解压错误，忽略后续数据: {e}")
+            break
+        data = decompressor.unused_data
+    return b"".join(parts)
+
+
+class FramedCompressedWriter:
+    """分帧压缩写入的二进制文件对象，记录器把它当作普通文件使用"""
+
+    def __init__(self, path, codec, level=None, frame_size=DEFAULT_FRAME_SIZE):
+        self.path = path
+        self.codec = codec
+        self.level = DEFAULT_LEVELS[codec] if level is None else level
+        self.frame_size = frame_size
+        self.compressor = _Compressor(codec, self.level)
+        self.file = open(path, "wb")
+        self.index_file = open(path + INDEX_SUFFIX, "wb")
+
+        self.offset = 0          # 已写入的压缩字节数
+        self.raw_offset = 0      # 已写入的原始字节数
+        self.frame_offset = 0
+        self.frame_raw_offset = 0
+        self.frame_rows = 0
+        self.frame_first_ns = 0
+        self.frame_last_ns = 0
+        self.frames_written = 0
+
+    def _write(self, data):
+        if data:
+            self.file.write(data)
+            self.offset += len(data)
+
+    def write(self, data):
+        self._write(self.compressor.compress(data))
+        self.raw_offset += len(data)
+        return len(data)
+
+    def note_rows(self, count, first_ns, last_ns):
+        """登记当前帧中刚写入的行数和时间范围"""
+        if not self.frame_rows:
+            self.frame_first_ns = first_ns
+        self.frame_rows += count
+        self.frame_last_ns = last_ns
+
+    def frame_full(self):
+        return self.raw_offset - self.frame_raw_offset >= self.frame_size
+
+    def end_frame(self):
+        """结束当前帧并写入索引记录（先写数据再写索引，索引不会指向不存在的数据）"""
+        if self.raw_offset == self.frame_raw_offset:
+            return
+        self._write(self.compressor.finish())
+        self.file.flush()
+        self.index_file.write(INDEX_RECORD.pack(
+            self.frame_offset, self.offset - self.frame_offset, self.frame_raw_offset,
+            self.frame_rows, 0, self.frame_first_ns, self.frame_last_ns))
+        self.index_file.flush()
+        self.frames_written += 1
+
+        self.compressor = _Compressor(self.codec, self.level)
+        self.frame_offset = self.offset
+        self.frame_raw_offset = self.raw_offset
+        self.frame_rows = 0
+
+    def flush(self):
+        """同步刷新：已写入的数据可以被读取端解压"""
+        if self.raw_offset != self.frame_raw_offset:
+            self._write(self.compressor.sync())
+        self.file.flush()
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.end_frame()
+        self.file.close()
+        self.index_file.close()
+
+
+class FramedReader:
+    """读取分帧压缩文件；写入过程中也可读取已刷新的数据"""
+
+    def __init__(self, path):
+        self.path = path
+        _, self.codec = split_compression_suffix(path)
+        if not self.codec:
+            raise ValueError(f"不是压缩文件: {path}")
+        self.size = os.path.getsize(path)
+
+        # 只采用与数据文件一致的连续索引记录，其余部分按流解压
+        self.frames = []  # (压缩偏移, 压缩长度, 原始偏移, 行数, 首行时间戳, 末行时间戳)
+        self.tail_offset = 0
+        index_path = path + INDEX_SUFFIX
+        if os.path.exists(index_path):
+            with open(index_path, "rb") as f:
+                index_data = f.read()
+            for i in range(len(index_data) // INDEX_RECORD.size):
+                offset, length, raw_offset, rows, _, first_ns, last_ns = INDEX_RECORD.unpack_from(
+                    index_data, i * INDEX_RECORD.size)
+                if offset != self.tail_offset or offset + length > self.size:
+                    break
+                self.frames.append((offset, length, raw_offset, rows, first_ns, last_ns))
+                self.tail_offset = offset + length
+
+    def read(self, start_ns=None, end_ns=None):
+        """返回解压后的数据；指定时间窗口时跳过窗口外的完整帧（文件头帧总会包含）"""
+        parts = []
+        with open(self.path, "rb") as f:
+            for offset, length, _, rows, first_ns, last_ns in self.frames:
+                if rows and ((start_ns is not None and last_ns < start_ns) or
+                             (end_ns is not None and first_ns > end_ns)):
+                    continue
+                f.seek(offset)
+                parts.append(decompress_stream(f.read(length), self.codec))
+            # 末尾尚未结束的帧（或缺少索引的部分）
+            f.seek(self.tail_offset)
+            tail = f.read()
+        if tail:
+            parts.append(decompress_stream(tail, self.codec))
+        return b"".join(parts)
+
+
+def recover_framed(path, scan_tail):
+    """断电后修复分帧压缩文件：丢弃无效的索引记录，把末尾未结束的帧中完整的部分重新压缩为完整的帧
+    只解压最后一个已索引帧之后的数据。scan_tail(原始数据, 是否从文件头开始) 返回
+    (保留长度, 行数, 首行时间戳, 末行时间戳)。返回 (末尾恢复的行数, 丢弃的原始字节数)"""
+    reader = FramedReader(path)
+    with open(path, "rb") as f:
+        f.seek(reader.tail_offset)
+        tail = f.read()
+    raw = decompress_stream(tail, reader.codec) if tail else b""
+    keep, rows, first_ns, last_ns = scan_tail(raw, reader.tail_offset == 0) if raw else (0, 0, 0, 0)
+
+    frame = b""
+    if keep:
+        compressor = _Compressor(reader.codec, DEFAULT_LEVELS[reader.codec])
+        frame = compressor.compress(raw[:keep]) + compressor.finish()
+    raw_offset = 0
+    if reader.frames:
+        # 最后一个已索引帧的原始长度需要解压才能得知，这里只在有新帧时计算
+        last_offset, last_length, last_raw_offset = reader.frames[-1][:3]
+        if frame:
+            with open(path, "rb") as f:
+                f.seek(last_offset)
+                raw_offset = last_raw_offset + len(decompress_stream(f.read(last_length), reader.codec))
+
+    with open(path, "r+b") as f:
+        f.truncate(reader.tail_offset)
+        f.seek(reader.tail_offset)
+        f.write(frame)
+        f.flush()
+        os.fsync(f.fileno())
+    with open(path + INDEX_SUFFIX, "wb") as f:
+        for offset, length, frame_raw_offset, frame_rows, frame_first, frame_last in reader.frames:
+            f.write(INDEX_RECORD.pack(offset, length, frame_raw_offset, frame_rows, 0, frame_first, frame_last))
+        if frame:
+            f.write(INDEX_RECORD.pack(reader.tail_offset, len(frame), raw_offset, rows, 0, first_ns, last_ns))
+        f.flush()
+        os.fsync(f.fileno())
+    return rows, len(raw) - keep
+
+
+def read_data_bytes(path, start_ns=None, end_ns=None):
+    """读取数据文件的原始内容，压缩文件自动解压"""
+    if split_compression_suffix(path)[1]:
+        return FramedReader(path).read(start_ns, end_ns)
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def parse_arguments():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description='分帧压缩数据文件工具')
+    parser.add_argument('action', choices=['info', 'decompress'], help='操作')
+    parser.add_argument('input', help='压缩文件 (*.gz / *.zst)')
+    parser.add_argument('-o', '--output', help='解压输出文件（默认去掉压缩扩展名）')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+
+    if not os.path.exists(args.input):
+        print(f"错误: 文件 {args.input} 不存在")
+        sys.exit(1)
+
+    if args.action == 'decompress':
+        output = args.output or split_compression_suffix(args.input)[0]
+        data = read_data_bytes(args.input)
+        with open(output, "wb") as f:
+            f.write(data)
+        print(f"已解压: {output} ({len(data)} 字节)")
+    else:
+        reader = FramedReader(args.input)
+        raw_size = len(reader.read())
+        print(f"文件: {args.input} ({reader.codec})")
+        print(f"完整帧: {len(reader.frames)}，未索引部分: {reader.size - reader.tail_offset} 字节")
+        print(f"压缩后 {reader.size} 字节，原始 {raw_size} 字节，"
+              f"压缩比 {raw_size / reader.size if reader.size else 0:.1f}")
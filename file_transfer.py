@@ -0,0 +1,476 @@
+# -*- coding: utf-8 -*-
+"""
+结果文件传输 - 从发送端下载 result_* 文件夹中的数据和图像
+功能：
+1. 发送端运行 FileTransferServer，提供文件列表和分块下载
+2. 每个数据块附带SHA-256校验，支持按范围请求
+3. 接收端断线后可从已校验的位置继续下载（.part 文件）
+4. 多个文件的请求在同一连接上流水线发送，无需逐个等待；同时未完成的请求最多 PIPELINE_WINDOW 个，
+   每收完一个文件的响应再发送下一个请求，避免双方的套接字缓冲区都写满后互相阻塞
+
+协议（每个请求/响应头都是一行JSON）：
+    请求: {"id": 1, "op": "list", "folder": null}
+    响应: {"id": 1, "type": "list", "files": [{"path": ..., "size": ..., "mtime": ...}]}
+    请求: {"id": 2, "op": "get", "path": ..., "offset": 0, "length": null}
+    响应: {"id": 2, "type": "chunk", "offset": ..., "length": n, "sha256": ...} + n字节数据
+          ...
+          {"id": 2, "type": "end", "path": ..., "size": 文件大小}
+    请求: {"id": 3, "op": "hash", "path": ...}
+    响应: {"id": 3, "type": "hash", "path": ..., "size": ..., "sha256": ...}
+    出错: {"id": n, "type": "error", "message": ...}（get 出错时代替 end，客户端记录该文件失败后继续接收其它文件）
+
+命令行用法：
+    python file_transfer.py <发送端IP> list [文件夹]
+    python file_transfer.py <发送端IP> get <文件夹或文件>... [-o 保存目录]
+"""
+
+import socket
+import socketserver
+import threading
+import hashlib
+import json
+import os
+import sys
+import time
+import argparse
+from collections import deque
+
+TRANSFER_PORT = 8890
+CHUNK_SIZE = 256 * 1024  # 每块256KB
+PIPELINE_WINDOW = 32  # 同一连接上同时未完成的下载请求数
+RESULT_FOLDER_PREFIX = "result_"
+
+
+def sha256_hex(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class RemoteError(RuntimeError):
+    """发送端对某个请求返回的错误（如文件在列出之后被删除）"""
+
+    def __init__(self, message, request_id=None):
+        super().__init__(message)
+        self.request_id = request_id
+
+
+class FileTransferHandler(socketserver.StreamRequestHandler):
+    """处理单个客户端连接，按顺序响应流水线请求"""
+
+    def setup(self):
+        super().setup()
+        try:
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except OSError:
+            pass
+
+    def handle(self):
+        print(f"文件传输客户端连接: {self.client_address}")
+        while self.server.transfer_server.running:
+            try:
+                line = self.rfile.readline()
+            except (ConnectionError, OSError):
+                break
+            if not line:
+                break
+
+            line = line.strip()
+            if not line:
+                continue
+
+            request_id = None
+            try:
+                request = json.loads(line.decode("utf-8"))
+                request_id = request.get("id")
+                op = request.get("op")
+                if op == "list":
+                    self._handle_list(request_id, request.get("folder"))
+                elif op == "get":
+                    self._handle_get(request_id, request["path"],
+                                     int(request.get("offset") or 0),
+                                     request.get("length"),
+                                     int(request.get("chunk_size") or CHUNK_SIZE))
+                elif op == "hash":
+                    self._handle_hash(request_id, request["path"])
+                else:
+                    self._send_header({"id": request_id, "type": "error", "message": f"未知操作: {op}"})
+            except (ConnectionError, BrokenPipeError):
+                break
+            except Exception as e:
+                try:
+                    self._send_header({"id": request_id, "type": "error", "message": str(e)})
+                except OSError:
+                    break
+
+        print(f"文件传输客户端断开: {self.client_address}")
+
+    def _send_header(self, header, payload=None):
+        self.wfile.write((json.dumps(header, ensure_ascii=False) + "\n").encode("utf-8"))
+        if payload:
+            self.wfile.write(payload)
+
+    def _handle_list(self, request_id, folder):
+        files = self.server.transfer_server.list_files(folder)
+        self._send_header({"id": request_id, "type": "list", "files": files})
+
+    def _handle_get(self, request_id, path, offset, length, chunk_size):
+        full_path = self.server.transfer_server.resolve_path(path)
+        chunk_size = max(4096, min(chunk_size, 4 * 1024 * 1024))
+
+        with open(full_path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            end = size if length is None else min(size, offset + int(length))
+            f.seek(offset)
+            position = offset
+            while position < end:
+                chunk = f.read(min(chunk_size, end - position))
+                if not chunk:
+                    break
+                self._send_header({"id": request_id, "type": "chunk", "offset": position,
+                                   "length": len(chunk), "sha256": sha256_hex(chunk)}, chunk)
+                position += len(chunk)
+
+        self._send_header({"id": request_id, "type": "end", "path": path, "size": size})
+
+    def _handle_hash(self, request_id, path):
+        full_path = self.server.transfer_server.resolve_path(path)
+        digest = hashlib.sha256()
+        size = 0
+        with open(full_path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+                size += len(block)
+        self._send_header({"id": request_id, "type": "hash", "path": path,
+                           "size": size, "sha256": digest.hexdigest()})
+
+
+class ThreadingTransferServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class FileTransferServer:
+    """发送端文件传输服务，只开放 result_* 文件夹"""
+
+    def __init__(self, root_dir=".", host="0.0.0.0", port=TRANSFER_PORT):
+        self.root_dir = os.path.abspath(root_dir)
+        self.host = host
+        self.port = port
+        self.running = False
+        self.server = None
+
+    def start(self):
+        """启动文件传输服务线程"""
+        try:
+            self.server = ThreadingTransferServer((self.host, self.port), FileTransferHandler)
+        except Exception as e:
+            print(f"文件传输服务启动失败: {e}")
+            return False
+
+        self.server.transfer_server = self
+        self.running = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        print(f"文件传输服务启动，监听端口: {self.port}")
+        return True
+
+    def stop(self):
+        """停止服务"""
+        self.running = False
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def resolve_path(self, path):
+        """将相对路径解析为绝对路径，禁止访问 result_* 文件夹以外的文件"""
+        norm = os.path.normpath(path).replace("\\", "/")
+        if os.path.isabs(norm) or norm.startswith("..") or not norm.startswith(RESULT_FOLDER_PREFIX):
+            raise ValueError(f"不允许访问的路径: {path}")
+        full_path = os.path.join(self.root_dir, norm)
+        if not os.path.isfile(full_path):
+            raise FileNotFoundError(f"文件不存在: {path}")
+        return full_path
+
+    def list_files(self, folder=None):
+        """列出结果文件夹中的文件（相对路径、大小、修改时间）"""
+        if folder:
+            norm = os.path.normpath(folder).replace("\\", "/")
+            if os.path.isabs(norm) or not norm.startswith(RESULT_FOLDER_PREFIX):
+                raise ValueError(f"不允许访问的文件夹: {folder}")
+            folders = [norm]
+        else:
+            folders = sorted(name for name in os.listdir(self.root_dir)
+                             if name.startswith(RESULT_FOLDER_PREFIX)
+                             and os.path.isdir(os.path.join(self.root_dir, name)))
+
+        files = []
+        for name in folders:
+            folder_path = os.path.join(self.root_dir, name)
+            for dirpath, _, filenames in os.walk(folder_path):
+                for filename in sorted(filenames):
+                    full_path = os.path.join(dirpath, filename)
+                    try:
+                        st = os.stat(full_path)
+                    except OSError:
+                        continue
+                    rel_path = os.path.relpath(full_path, self.root_dir).replace("\\", "/")
+                    files.append({"path": rel_path, "size": st.st_size, "mtime": st.st_mtime})
+        return files
+
+
+class FileTransferClient:
+    """接收端下载客户端，支持断点续传和多文件流水线下载"""
+
+    def __init__(self, host, port=TRANSFER_PORT, timeout=30, log=print):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.log = log
+        self.sock = None
+        self.rfile = None
+        self.next_id = 1
+        self.failed = {}  # 最近一次 download() 中发送端返回错误的文件 -> 错误信息
+
+    def connect(self):
+        self.close()
+        self.sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        try:
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1024 * 1024)
+        except OSError:
+            pass
+        self.rfile = self.sock.makefile("rb", buffering=256 * 1024)
+
+    def close(self):
+        for obj in (self.rfile, self.sock):
+            if obj:
+                try:
+                    obj.close()
+                except OSError:
+                    pass
+        self.rfile = None
+        self.sock = None
+
+    def _send_request(self, request):
+        request["id"] = self.next_id
+        self.next_id += 1
+        self.sock.sendall((json.dumps(request, ensure_ascii=False) + "\n").encode("utf-8"))
+        return request["id"]
+
+    def _read_header(self):
+        line = self.rfile.readline()
+        if not line:
+            raise ConnectionError("连接已断开")
+        header = json.loads(line.decode("utf-8"))
+        if header.get("type") == "error":
+            raise RemoteError(header.get("message"), header.get("id"))
+        return header
+
+    def _read_exact(self, length):
+        data = self.rfile.read(length)
+        if len(data) != length:
+            raise ConnectionError("连接已断开")
+        return data
+
+    def list_files(self, folder=None):
+        """获取发送端文件列表"""
+        if not self.sock:
+            self.connect()
+        self._send_request({"op": "list", "folder": folder})
+        return self._read_header()["files"]
+
+    def remote_hash(self, path):
+        """获取发送端文件的完整SHA-256"""
+        if not self.sock:
+            self.connect()
+        self._send_request({"op": "hash", "path": path})
+        return self._read_header()["sha256"]
+
+    def download(self, paths, dest_dir, max_retries=20, progress=None):
+        """
+        下载多个文件到dest_dir（保持相对路径），断线后自动重连并续传
+
+        Parameters:
+        paths: 发送端相对路径列表
+        dest_dir: 本地保存目录
+        max_retries: 最大重连次数
+        progress: 可选回调 progress(path, received, size)
+        返回: 已完成的本地文件路径列表；发送端返回错误的文件跳过，记录在 self.failed 中
+        """
+        pending = list(paths)
+        completed = []
+        retries = 0
+        self.failed = {}
+
+        while pending:
+            try:
+                if not self.sock:
+                    self.connect()
+                done = self._download_pipelined(pending, dest_dir, progress)
+                completed.extend(done)
+                done = set(done)
+                pending = [p for p in pending
+                           if self._local_path(dest_dir, p) not in done and p not in self.failed]
+                if pending:
+                    # 有文件校验失败或未完整接收，下一轮从已校验位置续传
+                    retries += 1
+                    if retries > max_retries:
+                        raise RuntimeError(f"多次重试后仍有 {len(pending)} 个文件未完成")
+            except RuntimeError:
+                # 发送端返回错误后连接上可能还有未读的响应，直接断开
+                self.close()
+                raise
+            except (ConnectionError, socket.timeout, OSError) as e:
+                self.close()
+                retries += 1
+                if retries > max_retries:
+                    raise
+                delay = min(30, 2 ** min(retries, 5))
+                self.log(f"传输中断: {e}，{delay}秒后续传（第{retries}次）")
+                time.sleep(delay)
+        if self.failed:
+            self.log(f"{len(self.failed)} 个文件下载失败: " +
+                     "; ".join(f"{path}（{message}）" for path, message in self.failed.items()))
+        return completed
+
+    def _local_path(self, dest_dir, path):
+        return os.path.join(dest_dir, *path.split("/"))
+
+    def _send_get(self, dest_dir, path):
+        """从本地 .part 文件的大小处请求文件，返回 (请求序号, 路径, 本地路径, .part路径, 偏移)"""
+        local_path = self._local_path(dest_dir, path)
+        part_path = local_path + ".part"
+        os.makedirs(os.path.dirname(local_path) or ".", exist_ok=True)
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        request_id = self._send_request({"op": "get", "path": path, "offset": offset})
+        return request_id, path, local_path, part_path, offset
+
+    def _download_pipelined(self, paths, dest_dir, progress):
+        """保持最多 PIPELINE_WINDOW 个请求在途，按顺序接收响应，每开始接收一个文件就补发一个请求；
+        单个文件出错时记录到 self.failed 并继续接收其它文件"""
+        unsent = deque(paths)
+        requests = deque()
+        done = []
+        while unsent and len(requests) < PIPELINE_WINDOW:
+            requests.append(self._send_get(dest_dir, unsent.popleft()))
+
+        while requests:
+            request_id, path, local_path, part_path, offset = requests.popleft()
+            if unsent:
+                # 服务端按顺序响应，请求行很短，窗口内的请求不会写满服务端的接收缓冲区
+                requests.append(self._send_get(dest_dir, unsent.popleft()))
+            corrupt = False
+            with open(part_path, "ab") as f:
+                if f.tell() != offset:
+                    f.truncate(offset)
+                received = offset
+                size = None
+                while True:
+                    try:
+                        header = self._read_header()
+                    except RemoteError as e:
+                        if e.request_id != request_id:
+                            raise ConnectionError(f"响应序号不匹配: {e.request_id} != {request_id}")
+                        # 该文件的响应到此结束，已校验的部分保留在 .part 中
+                        self.failed[path] = str(e)
+                        self.log(f"下载失败: {path}: {e}，跳过该文件")
+                        break
+                    if header.get("id") != request_id:
+                        raise ConnectionError(f"响应序号不匹配: {header.get('id')} != {request_id}")
+                    if header["type"] == "end":
+                        size = header["size"]
+                        break
+                    data = self._read_exact(header["length"])
+                    if corrupt or header["offset"] != received:
+                        continue
+                    if sha256_hex(data) != header["sha256"]:
+                        # 校验失败：丢弃该块之后的数据，下一轮从此处续传
+                        self.log(f"数据块校验失败: {path} @ {header['offset']}，将重新请求")
+                        corrupt = True
+                        continue
+                    f.write(data)
+                    received += len(data)
+                    if progress:
+                        progress(path, received, None)
+                f.flush()
+                os.fsync(f.fileno())
+
+            if size is None:
+                # 发送端返回错误，没有收到任何数据时不留下空的 .part 文件
+                if not os.path.getsize(part_path):
+                    os.remove(part_path)
+                continue
+            if received > size:
+                # 发送端文件已变小（被替换），丢弃本地部分重新下载
+                os.remove(part_path)
+                continue
+            if corrupt or received < size:
+                continue
+
+            os.replace(part_path, local_path)
+            if progress:
+                progress(path, received, size)
+            done.append(local_path)
+
+        return done
+
+    def download_folder(self, folder, dest_dir, progress=None):
+        """下载整个结果文件夹，跳过本地已完整存在的文件"""
+        files = self.list_files(folder)
+        paths = []
+        for item in files:
+            local_path = self._local_path(dest_dir, item["path"])
+            if os.path.exists(local_path) and os.path.getsize(local_path) == item["size"]:
+                continue
+            paths.append(item["path"])
+        return self.download(paths, dest_dir, progress=progress)
+
+
+def parse_arguments():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description='从发送端下载结果文件')
+    parser.add_argument('host', help='发送端IP地址')
+    parser.add_argument('action', choices=['list', 'get'], help='list: 列出文件, get: 下载文件或文件夹')
+    parser.add_argument('paths', nargs='*', help='文件夹或文件路径（相对于发送端工作目录）')
+    parser.add_argument('-o', '--output', default='downloads', help='保存目录（默认downloads）')
+    parser.add_argument('-p', '--port', type=int, default=TRANSFER_PORT, help=f'传输端口（默认{TRANSFER_PORT}）')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    client = FileTransferClient(args.host, args.port)
+
+    try:
+        if args.action == 'list':
+            folders = args.paths or [None]
+            for folder in folders:
+                for item in client.list_files(folder):
+                    print(f"{item['size']:>12}  {item['path']}")
+        else:
+            if not args.paths:
+                print("错误: 请指定要下载的文件夹或文件")
+                sys.exit(1)
+
+            def show_progress(path, received, size):
+                if size is not None:
+                    print(f"已完成: {path} ({size} 字节)")
+
+            failed = {}
+            for target in args.paths:
+                if os.path.splitext(target)[1]:
+                    client.download([target], args.output, progress=show_progress)
+                else:
+                    client.download_folder(target, args.output, progress=show_progress)
+                failed.update(client.failed)
+            print(f"下载完成，保存到: {args.output}")
+            if failed:
+                print(f"以下 {len(failed)} 个文件下载失败:")
+                for path, message in failed.items():
+                    print(f"  {path}: {message}")
+                sys.exit(1)
+    except KeyboardInterrupt:
+        print("\n用户中断，已下载部分保存在 .part 文件中，可再次运行续传")
+    except Exception as e:
+        print(f"传输错误: {e}")
+        sys.exit(1)
+    finally:
+        client.close()
@@ -0,0 +1,708 @@
+# -*- coding: utf-8 -*-
+"""
+多发送端接收 - 一个事件循环同时管理多台发送端
+功能：
+1. 每台发送端一个 SenderLink：独立的指令连接、ReceiverState 和重连退避，消息处理与 ReceiverClient 相同
+2. 所有指令连接和图像连接都是非阻塞套接字，由一个 selectors 事件循环线程处理，不再每台设备两个线程
+3. 连接失败或断开后按指数退避重试，并加随机抖动，避免多台设备同时重连
+4. 所有发送端共用一个图像服务器端口，按对端地址区分，图像保存到各自的子目录
+5. 其它线程（GUI）发送的指令先放入发送缓冲区，再唤醒事件循环写出
+6. overview() 返回每台发送端一行的总览，供命令行和 fleet_gui.py 显示
+
+发送端列表来自命令行参数或文件（每行一个，# 之后为注释），格式为 名称=IP:端口、IP:端口 或 IP
+
+命令行用法（无界面，定期输出总览表）：
+    python fleet.py 192.168.1.205 pi2=192.168.1.206 [--senders-file senders.txt] [--image-dir 目录] [--record 目录]
+"""
+
+import argparse
+import datetime
+import errno
+import os
+import random
+import re
+import selectors
+import signal
+import socket
+import sys
+import threading
+import time
+import unicodedata
+
+from framing import LineReader
+from receiver_client import (SenderSession, ClientEvent, COMMAND_PORT, IMAGE_HOST, IMAGE_PORT,
+                             IMAGE_RECV_BUFFER, IMAGE_MEMORY_LIMIT, RECONNECT_DELAY, write_stats)
+from telemetry_recorder import add_record_arguments, open_recorder
+
+CONNECT_TIMEOUT = 5  # 连接超时（秒）
+RECONNECT_MIN_DELAY = 1  # 第一次重试前等待的时间（秒），之后每次失败加倍
+RECONNECT_MAX_DELAY = 60  # 重试间隔上限（秒）
+SYNC_DELAY = 1  # 连接成功后等待多久再请求状态同步（秒）
+OVERVIEW_INTERVAL = 5  # 命令行输出总览表的间隔（秒）
+
+# 非阻塞 connect 正在进行时返回的错误码（Windows 为 WSAEWOULDBLOCK）
+CONNECT_PENDING = {0, errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY,
+                   getattr(errno, "WSAEWOULDBLOCK", errno.EWOULDBLOCK)}
+
+OVERVIEW_COLUMNS = ["名称", "地址", "状态", "连接次数", "消息/秒", "电压(V)", "电流(A)",
+                    "温度(°C)", "湿度(%)", "记录模式", "图像", "缺失遥测", "最后消息"]
+MODE_LABELS = {"monitoring": "监测", "data_recording": "记录", "combined": "录像"}
+
+SENDER_PATTERN = re.compile(r"^(?:([\w.-]+)=)?([^\s:=]+)(?::(\d+))?$")
+
+
+def parse_sender(text, default_port=COMMAND_PORT):
+    """'名称=IP:端口'、'IP:端口' 或 'IP' -> (名称, IP, 端口)，名称默认为IP"""
+    match = SENDER_PATTERN.match(text.strip())
+    if not match:
+        raise ValueError(f"无法解析发送端: {text}")
+    name, host, port = match.groups()
+    return name or host, host, int(port) if port else default_port
+
+
+def load_senders(path):
+    """读取发送端列表文件"""
+    senders = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if line:
+                senders.append(parse_sender(line))
+    return senders
+
+
+def _format_value(value, spec):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return format(value, spec)
+    return "-"
+
+
+class SenderLink(SenderSession):
+    """事件循环中的一台发送端；套接字只在事件循环线程中读写"""
+
+    def __init__(self, fleet, name, sender_ip, command_port, image_dir):
+        super().__init__(sender_ip, command_port, image_dir)
+        self.fleet = fleet
+        self.name = name
+        self.address = sender_ip  # 对端IP，连接成功后更新，用于识别图像连接
+        self.sock = None
+        self.reader = None
+        self.events = 0  # 当前在selector中注册的事件
+        self.connecting = False
+        self.outgoing = bytearray()  # 待发送的指令，受 fleet.lock 保护
+        self.failures = 0  # 连续失败次数，决定重连等待时间
+        self.next_attempt = 0.0  # 下一次连接的时间（time.monotonic）
+        self.deadline = None  # 本次连接的超时时间
+        self.sync_due = None  # 请求状态同步的时间
+        self.message_rate = 0.0  # 最近的消息速率，overview_row() 时更新
+
+    def emit(self, event, value=None):
+        super().emit(event, value)
+        self.fleet.emit(self, event, value)
+
+    def status(self, now):
+        """连接状态文字"""
+        if self.state.command_connected:
+            return "已连接"
+        if self.connecting:
+            return "连接中"
+        if not self.fleet.running:
+            return "未连接"
+        wait = self.next_attempt - now
+        return f"{wait:.0f}秒后重连" if wait >= 1 else "等待连接"
+
+    # ---- 以下方法只在事件循环线程中调用 ----
+
+    def poll(self, now):
+        """处理到期的连接、连接超时和状态同步，返回下一个需要处理的时间（None表示等待网络事件）"""
+        if self.connecting and now >= self.deadline:
+            self.connect_failed(OSError("连接超时"))
+        elif self.sock is None and now >= self.next_attempt:
+            self.connect(now)
+        elif self.sync_due is not None and now >= self.sync_due:
+            self.sync_due = None
+            self.request_status_sync()
+        if self.connecting:
+            return self.deadline
+        if self.sock is None:
+            return self.next_attempt
+        return self.sync_due
+
+    def connect(self, now):
+        """发起非阻塞连接，结果在可写事件中处理"""
+        if self.failures == 0:
+            self.log(f"正在连接发送端指令接口 {self.sender_ip}:{self.command_port}...")
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1024*1024)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except OSError:
+            pass
+        self.sock = sock
+        self.connecting = True
+        self.deadline = now + CONNECT_TIMEOUT
+        try:
+            error = sock.connect_ex((self.sender_ip, self.command_port))
+        except OSError as e:
+            self.connect_failed(e)
+            return
+        if error not in CONNECT_PENDING:
+            self.connect_failed(OSError(error, os.strerror(error)))
+            return
+        self.set_events(selectors.EVENT_WRITE)
+
+    def set_events(self, events):
+        selector = self.fleet.selector
+        if events == self.events:
+            return
+        if not self.events:
+            selector.register(self.sock, events, self.on_ready)
+        else:
+            selector.modify(self.sock, events, self.on_ready)
+        self.events = events
+
+    def on_ready(self, events):
+        if self.connecting:
+            error = self.sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+            if error:
+                self.connect_failed(OSError(error, os.strerror(error)))
+            else:
+                self.connected()
+            return
+        if events & selectors.EVENT_READ:
+            self.read()
+        if self.sock and events & selectors.EVENT_WRITE:
+            self.flush()
+
+    def connected(self):
+        self.connecting = False
+        self.deadline = None
+        self.failures = 0
+        self.connections += 1
+        try:
+            self.address = self.sock.getpeername()[0]
+        except OSError:
+            pass
+        self.reader = LineReader(self.sock)
+        self.state.command_connected = True
+        # 连接成功后，清空运行状态并重置记录状态，准备从发送端同步最新状态
+        self.state.last_runtime_status = ""
+        self.state.reset_modes()
+        with self.fleet.lock:
+            # 立即请求补发断线期间的遥测数据（首次连接时序号为-1，不补发）
+            self.outgoing += (f"resume:{self.state.telemetry_stream_id or '-'}:"
+                              f"{self.state.last_telemetry_seq}\n").encode()
+        self.sync_due = time.monotonic() + SYNC_DELAY
+        self.log(f"已连接到发送端指令接口 {self.sender_ip}:{self.command_port}")
+        self.flush()
+        self.emit(ClientEvent.STATE)
+
+    def connect_failed(self, error):
+        self.close()
+        delay = self.schedule_reconnect()
+        self.log(f"连接发送端 {self.sender_ip}:{self.command_port} 失败: {error}，{delay:.0f}秒后重试...")
+        self.emit(ClientEvent.STATE)
+
+    def disconnect(self, reason):
+        """关闭已建立的指令连接并安排重连"""
+        self.close()
+        self.disconnects += 1
+        delay = self.schedule_reconnect()
+        self.log(f"{reason}，{delay:.0f}秒后重新连接...")
+        self.emit(ClientEvent.STATE)
+
+    def schedule_reconnect(self):
+        """按连续失败次数指数退避，返回等待的秒数"""
+        delay = min(RECONNECT_MAX_DELAY, RECONNECT_MIN_DELAY * 2 ** min(self.failures, 16))
+        delay *= random.uniform(0.8, 1.2)
+        self.failures += 1
+        self.next_attempt = time.monotonic() + delay
+        return delay
+
+    def close(self):
+        sock, self.sock = self.sock, None
+        if sock:
+            if self.events:
+                self.fleet.selector.unregister(sock)
+            sock.close()
+        self.events = 0
+        self.reader = None
+        self.connecting = False
+        self.deadline = self.sync_due = None
+        self.state.command_connected = False
+        with self.fleet.lock:
+            self.outgoing.clear()
+
+    def read(self):
+        """每次可读事件接收一次，处理其中全部完整的行"""
+        try:
+            if not self.reader.fill():
+                self.disconnect("发送端断开连接")
+                return
+            lines = self.reader.pop_lines()
+            if lines:
+                self.handle_lines(lines)
+        except (BlockingIOError, InterruptedError):
+            pass
+        except Exception as e:
+            if self.sock:
+                self.disconnect(f"状态监听错误: {e}，连接断开")
+
+    def flush(self):
+        """写出待发送的指令，发送缓冲区已满时等待可写事件"""
+        try:
+            with self.fleet.lock:
+                if self.outgoing:
+                    del self.outgoing[:self.sock.send(self.outgoing)]
+                pending = bool(self.outgoing)
+        except (BlockingIOError, InterruptedError):
+            pending = True
+        except OSError as e:
+            self.disconnect(f"发送指令失败: {e}，连接断开")
+            return
+        self.set_events(selectors.EVENT_READ | (selectors.EVENT_WRITE if pending else 0))
+
+    def request_status_sync(self):
+        """请求状态同步（发送端会发送当前状态），然后发送预设指令"""
+        try:
+            self.write_command(b"sync_status\n")
+        except OSError:
+            return
+        for command in self.connect_commands:
+            self.send_command(command)
+
+    # ---- 可在任意线程中调用 ----
+
+    def write_command(self, data):
+        with self.fleet.lock:
+            if not self.sock or self.connecting:
+                raise OSError("指令连接已关闭")
+            self.outgoing += data
+        self.fleet.wake()
+
+    def overview_row(self, now, monotonic_now):
+        """总览表中的一行（文字），同时更新消息速率"""
+        self.message_rate = self.traffic.rates(now)[0]
+        data = self.state.latest_sensor_data or {}
+        adc_data = data.get("adc_data") or {}
+        env_data = data.get("env_data") or {}
+        modes = "/".join(label for mode, label in MODE_LABELS.items() if self.state.modes[mode]) or "-"
+        return (self.name, f"{self.sender_ip}:{self.command_port}", self.status(monotonic_now),
+                str(self.connections), f"{self.message_rate:.1f}",
+                _format_value(adc_data.get("channel0_voltage"), ".2f"),
+                _format_value(adc_data.get("channel1_current"), ".2f"),
+                _format_value(env_data.get("temperature"), ".1f"),
+                _format_value(env_data.get("humidity"), ".1f"),
+                modes, str(self.images), str(self.state.missing_telemetry),
+                f"{now - self.last_message_time:.0f}秒前" if self.last_message_time else "-")
+
+
+class ImageStream:
+    """一个图像连接（非阻塞）：IMG_START:大小 头部行之后是图像数据"""
+
+    def __init__(self, fleet, sock, link):
+        self.fleet = fleet
+        self.sock = sock
+        self.link = link
+        self.reader = LineReader(sock, IMAGE_RECV_BUFFER, max_frame=IMAGE_RECV_BUFFER)
+        self.size = 0
+        self.received = 0
+        self.image = None  # 小图像接收到预分配的 bytearray
+        self.file = None  # 大图像边接收边写入临时文件
+        self.filename = None
+        self.chunk = None
+        self.began = None  # 收到 IMG_START 的时间，用于统计传输时间
+
+    @property
+    def remaining(self):
+        return self.size - self.received
+
+    def on_ready(self, events):
+        try:
+            if self.remaining and not self.reader.buffered:
+                # 图像数据直接接收到目标缓冲区，不经过行缓冲区
+                count = self.recv_payload()
+            else:
+                count = self.reader.fill()
+                if count:
+                    self.process()
+        except (BlockingIOError, InterruptedError):
+            return
+        except Exception as e:
+            self.link.log(f"接收图像数据时出错: {e}，连接断开")
+            self.close()
+            return
+        if not count:
+            if self.remaining:
+                self.link.incomplete_images += 1
+                self.link.log("图像连接断开，图像接收不完整")
+            else:
+                self.link.log("图像连接断开")
+            self.close()
+
+    def process(self):
+        """处理行缓冲区中的头部行和图像数据"""
+        while True:
+            if self.remaining:
+                data = self.reader.take(self.remaining)
+                if not len(data):
+                    return
+                self.write(data)
+                continue
+            line = self.reader.pop_line()
+            if line is None:
+                return
+            line = line.decode().strip()
+            if line.startswith("IMG_START:"):
+                self.begin(int(line.split(":")[1]))
+
+    def begin(self, size):
+        os.makedirs(self.link.image_dir, exist_ok=True)
+        self.began = time.perf_counter()
+        self.size = size
+        self.received = 0
+        if size <= IMAGE_MEMORY_LIMIT:
+            self.image = memoryview(bytearray(size))
+        else:
+            self.filename = self.link.image_path()
+            self.file = open(self.filename + ".part", "wb")
+            self.chunk = memoryview(bytearray(IMAGE_RECV_BUFFER))
+        if not size:
+            self.finish()
+
+    def recv_payload(self):
+        if self.file is None:
+            count = self.sock.recv_into(self.image[self.received:])
+        else:
+            count = self.sock.recv_into(self.chunk[:min(len(self.chunk), self.remaining)])
+            self.file.write(self.chunk[:count])
+        self.advance(count)
+        return count
+
+    def write(self, data):
+        if self.file is None:
+            self.image[self.received:self.received + len(data)] = data
+        else:
+            self.file.write(data)
+        self.advance(len(data))
+
+    def advance(self, count):
+        self.received += count
+        if count and not self.remaining:
+            self.finish()
+
+    def finish(self):
+        if self.file is None:
+            filename = self.link.save_image(self.image)
+        else:
+            self.file.close()
+            filename = self.filename
+            os.replace(filename + ".part", filename)
+            self.link.log(f"图像保存为: {filename}（边接收边写入 {self.size} 字节）")
+        self.link.note_image(filename, self.size, time.perf_counter() - self.began)
+        self.image = self.file = self.filename = self.chunk = None
+        self.size = self.received = 0
+
+    def close(self):
+        self.fleet.selector.unregister(self.sock)
+        self.sock.close()
+        self.fleet.image_streams.pop(self.sock, None)
+        if self.file:
+            self.file.close()
+            os.remove(self.filename + ".part")
+            self.file = None
+        if not any(stream.link is self.link for stream in self.fleet.image_streams.values()):
+            self.link.state.image_connected = False
+            self.link.emit(ClientEvent.STATE)
+
+
+class Fleet:
+    """多台发送端共用一个事件循环线程和一个图像服务器端口"""
+
+    def __init__(self, senders, image_host=IMAGE_HOST, image_port=IMAGE_PORT, image_dir="."):
+        names = [name for name, _, _ in senders]
+        if len(set(names)) != len(names):
+            raise ValueError("发送端名称重复")
+        self.image_host = image_host
+        self.image_port = image_port
+        self.links = [SenderLink(self, name, sender_ip, port, os.path.join(image_dir, name))
+                      for name, sender_ip, port in senders]
+        self.listeners = []
+        self.lock = threading.Lock()
+        self.selector = selectors.DefaultSelector()
+        # 其它线程通过该套接字对唤醒事件循环
+        self.wake_reader, self.wake_writer = socket.socketpair()
+        self.wake_reader.setblocking(False)
+        self.wake_writer.setblocking(False)
+        self.selector.register(self.wake_reader, selectors.EVENT_READ, self._on_wake)
+        self.server_socket = None
+        self.server_retry = 0.0
+        self.image_streams = {}
+        self.running = False
+        self.thread = None
+
+    # ---- 通知 ----
+
+    def add_listener(self, listener):
+        """listener(link, event, value)，在事件循环线程中调用；整个接收端的日志 link 为None"""
+        self.listeners.append(listener)
+
+    def emit(self, link, event, value=None):
+        for listener in self.listeners:
+            try:
+                listener(link, event, value)
+            except Exception as e:
+                print(f"接收端事件处理错误: {e}")
+
+    def log(self, message):
+        self.emit(None, ClientEvent.LOG, message)
+
+    # ---- 启动/停止 ----
+
+    def start(self):
+        self.running = True
+        for link in self.links:
+            link.started = time.time()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """停止事件循环并关闭所有连接（不向发送端发送退出指令）"""
+        self.running = False
+        self.wake()
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(5)
+
+    def wake(self):
+        try:
+            self.wake_writer.send(b"\0")
+        except OSError:
+            pass  # 唤醒字节已经足够多
+
+    # ---- 指令 ----
+
+    def send_command(self, command, links=None):
+        """向指定的（默认全部）已连接发送端发送指令，返回发送的台数"""
+        sent = 0
+        for link in links or self.links:
+            if link.state.command_connected:
+                try:
+                    link.write_command(f"{command}\n".encode())
+                    sent += 1
+                except OSError:
+                    pass
+        return sent
+
+    # ---- 事件循环 ----
+
+    def _run(self):
+        try:
+            while self.running:
+                now = time.monotonic()
+                deadlines = [link.poll(now) for link in self.links]
+                deadlines.append(self._poll_server(now))
+                deadlines = [deadline for deadline in deadlines if deadline is not None]
+                timeout = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+                for key, events in self.selector.select(timeout):
+                    if not self.running:
+                        break
+                    try:
+                        key.data(events)
+                    except Exception as e:
+                        self.log(f"事件处理错误: {e}")
+        finally:
+            self._close_all()
+
+    def _on_wake(self, events):
+        try:
+            while self.wake_reader.recv(4096):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+        for link in self.links:
+            if link.outgoing and link.sock and not link.connecting:
+                link.flush()
+
+    def _close_all(self):
+        for stream in list(self.image_streams.values()):
+            stream.close()
+        for link in self.links:
+            link.close()
+            link.emit(ClientEvent.STATE)
+        if self.server_socket:
+            self.selector.unregister(self.server_socket)
+            self.server_socket.close()
+            self.server_socket = None
+
+    # ---- 图像服务器 ----
+
+    def _poll_server(self, now):
+        """启动图像服务器，失败时过一段时间再试，返回下一次重试的时间"""
+        if self.server_socket:
+            return None
+        if now < self.server_retry:
+            return self.server_retry
+        server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            server_socket.bind((self.image_host, self.image_port))
+            server_socket.listen(max(5, len(self.links)))
+            server_socket.setblocking(False)
+        except OSError as e:
+            server_socket.close()
+            self.server_retry = now + RECONNECT_DELAY
+            self.log(f"图像服务器启动失败: {e}，{RECONNECT_DELAY}秒后重试...")
+            return self.server_retry
+        self.selector.register(server_socket, selectors.EVENT_READ, self._accept)
+        self.server_socket = server_socket
+        self.log(f"图像服务器已启动，监听端口: {self.image_port}")
+        return None
+
+    def link_for_address(self, address):
+        for link in self.links:
+            if address in (link.address, link.sender_ip):
+                return link
+        return None
+
+    def _accept(self, events):
+        try:
+            conn, addr = self.server_socket.accept()
+        except (BlockingIOError, InterruptedError):
+            return
+        link = self.link_for_address(addr[0])
+        if link is None:
+            self.log(f"未知地址 {addr[0]} 的图像连接，已关闭")
+            conn.close()
+            return
+        conn.setblocking(False)
+        try:
+            conn.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, IMAGE_RECV_BUFFER)
+        except OSError:
+            pass
+        stream = ImageStream(self, conn, link)
+        self.image_streams[conn] = stream
+        self.selector.register(conn, selectors.EVENT_READ, stream.on_ready)
+        link.state.image_connected = True
+        link.log(f"图像连接已建立: {addr[0]}:{addr[1]}")
+        link.emit(ClientEvent.STATE)
+
+    # ---- 总览/统计 ----
+
+    def overview(self):
+        """每台发送端一行总览，列见 OVERVIEW_COLUMNS"""
+        now = time.time()
+        monotonic_now = time.monotonic()
+        return [link.overview_row(now, monotonic_now) for link in self.links]
+
+    def stats(self):
+        """整体统计和每台发送端的统计"""
+        return {
+            "senders": len(self.links),
+            "connected": sum(link.state.command_connected for link in self.links),
+            "messages": sum(link.messages for link in self.links),
+            "images": sum(link.images for link in self.links),
+            "links": {link.name: link.stats() for link in self.links},
+        }
+
+
+def _display_width(text):
+    return sum(2 if unicodedata.east_asian_width(char) in "WF" else 1 for char in text)
+
+
+def format_table(rows, columns=OVERVIEW_COLUMNS):
+    """按显示宽度对齐的文字表格（中文按两个字符宽度计算）"""
+    table = [columns] + [list(row) for row in rows]
+    widths = [max(_display_width(row[index]) for row in table) for index in range(len(columns))]
+    return "\n".join("  ".join(cell + " " * (width - _display_width(cell)) for cell, width in zip(row, widths))
+                     for row in table)
+
+
+def add_fleet_arguments(parser):
+    """fleet.py 和 fleet_gui.py 共用的参数"""
+    parser.add_argument('senders', nargs='*', help='发送端，格式 名称=IP:端口、IP:端口 或 IP')
+    parser.add_argument('--senders-file', help='发送端列表文件，每行一个，# 之后为注释')
+    parser.add_argument('--image-port', type=int, default=IMAGE_PORT, help='本机图像服务器端口（所有发送端共用）')
+    parser.add_argument('--image-dir', default='.', help='图像保存目录，每台发送端一个子目录（默认当前目录）')
+    parser.add_argument('--command', action='append', default=[],
+                        help='每次连接成功后发送的指令，可重复，如 --command start_monitoring')
+    add_record_arguments(parser)
+
+
+def open_fleet(args):
+    """按命令行参数创建 Fleet（未启动）和各发送端的遥测记录器，参数有误时返回 (None, [])"""
+    try:
+        senders = [parse_sender(text) for text in args.senders]
+        if args.senders_file:
+            if not os.path.exists(args.senders_file):
+                print(f"错误: 文件 {args.senders_file} 不存在")
+                return None, []
+            senders += load_senders(args.senders_file)
+        if not senders:
+            print("错误: 未指定发送端")
+            return None, []
+        if not os.path.isdir(args.image_dir):
+            print(f"错误: 目录 {args.image_dir} 不存在")
+            return None, []
+        fleet = Fleet(senders, IMAGE_HOST, args.image_port, args.image_dir)
+    except ValueError as e:
+        print(f"错误: {e}")
+        return None, []
+
+    recorders = []
+    for link in fleet.links:
+        link.connect_commands = args.command
+        recorder = open_recorder(args, f"{link.sender_ip}:{link.command_port}", link.name)
+        if recorder is False:
+            for opened in recorders:
+                opened.close()
+            return None, []
+        if recorder:
+            link.add_listener(recorder.on_client_event)
+            recorders.append(recorder)
+    return fleet, recorders
+
+
+def parse_arguments():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description='多发送端接收：一个事件循环管理多台发送端，定期输出总览表')
+    add_fleet_arguments(parser)
+    parser.add_argument('--stats-file', help='定期写入统计信息的JSON文件')
+    parser.add_argument('--interval', type=float, default=OVERVIEW_INTERVAL, help='总览表输出间隔（秒）')
+    parser.add_argument('--quiet', action='store_true', help='不输出连接和图像日志')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    fleet, recorders = open_fleet(args)
+    if fleet is None:
+        sys.exit(1)
+
+    def print_event(link, event, value):
+        if event == ClientEvent.LOG and not args.quiet:
+            name = link.name if link else "接收端"
+            print(f"[{datetime.datetime.now().strftime('%H:%M:%S')}] [{name}] {value}", flush=True)
+
+    fleet.add_listener(print_event)
+    signal.signal(signal.SIGTERM, lambda signum, frame: fleet.stop())
+    fleet.start()
+    print(f"管理 {len(fleet.links)} 台发送端")
+
+    try:
+        while fleet.running:
+            time.sleep(args.interval)
+            print(format_table(fleet.overview()), flush=True)
+            if args.stats_file:
+                stats = fleet.stats()
+                if recorders:
+                    stats["recorders"] = {recorder.manifest_path: recorder.stats() for recorder in recorders}
+                write_stats(args.stats_file, stats)
+    except KeyboardInterrupt:
+        print("\n用户中断程序...")
+    finally:
+        fleet.stop()
+        for recorder in recorders:
+            recorder.close()
+            print(recorder.summary())
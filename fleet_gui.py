@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+多发送端总览界面 - 每台发送端一行，几十台设备也能在一屏内查看
+功能：
+1. 网络部分由 fleet.Fleet 的单个事件循环线程处理，界面每秒读取一次总览，只更新有变化的行
+2. 选中若干行（不选则为全部）后发送开启/停止数据监测、数据记录等指令
+3. 按连接状态着色：已连接为绿色，连接中为橙色，等待重连为红色
+4. 日志区与单台接收端相同（log_panel.LogPanel：有界、按级别过滤、写入轮换的日志文件）
+
+命令行用法：
+    python fleet_gui.py 192.168.1.205 pi2=192.168.1.206 [--senders-file senders.txt] [--image-dir 目录] [--record 目录]
+"""
+
+import argparse
+import queue
+import tkinter as tk
+from tkinter import ttk
+from tkinter import messagebox
+
+from fleet import OVERVIEW_COLUMNS, add_fleet_arguments, open_fleet
+from log_panel import LogPanel, make_record, add_log_arguments, DEFAULT_MAX_LINES
+from receiver_client import ClientEvent
+
+REFRESH_INTERVAL = 1000  # 总览表刷新间隔（毫秒）
+LOG_DRAIN_INTERVAL = 200  # 日志批量写入间隔（毫秒）
+
+COLUMN_WIDTHS = [90, 150, 90, 70, 70, 70, 70, 70, 70, 110, 60, 70, 80]
+
+# 按钮文字 -> 指令
+FLEET_COMMANDS = [
+    ("开启数据监测", "start_monitoring"),
+    ("停止数据监测", "stop_monitoring"),
+    ("开始数据记录", "cb"),
+    ("停止数据记录", "cs"),
+    ("开始录像+数据", "rcb"),
+    ("停止录像+数据", "rcs"),
+    ("同步状态", "sync_status"),
+]
+
+
+class FleetGUI:
+    def __init__(self, root, fleet, log_lines=DEFAULT_MAX_LINES, log_file=None, log_level="INFO"):
+        self.root = root
+        self.fleet = fleet
+        self.log_options = {"max_lines": log_lines, "log_file": log_file, "min_level": log_level}
+        self.rows = {}  # 名称 -> 当前显示的 (值, 标签)
+        self.summary = ""
+        self.log_queue = queue.SimpleQueue()
+
+        self.root.title(f"WiFi摄像头控制系统 - 多发送端总览 ({len(fleet.links)} 台)")
+        self.root.geometry("1200x700")
+
+        self.create_widgets()
+        self.fleet.add_listener(self.on_fleet_event)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
+
+        self.refresh()
+        self.drain_log()
+
+    def create_widgets(self):
+        """创建GUI组件"""
+        main_frame = ttk.Frame(self.root, padding="10")
+        main_frame.pack(fill=tk.BOTH, expand=True)
+
+        self.summary_label = ttk.Label(main_frame, text="", font=("Arial", 11, "bold"))
+        self.summary_label.pack(anchor=tk.W, pady=(0, 5))
+
+        # 总览表
+        table_frame = ttk.Frame(main_frame)
+        table_frame.pack(fill=tk.BOTH, expand=True)
+        self.tree = ttk.Treeview(table_frame, columns=OVERVIEW_COLUMNS, show="headings", selectmode="extended")
+        for column, width in zip(OVERVIEW_COLUMNS, COLUMN_WIDTHS):
+            self.tree.heading(column, text=column)
+            self.tree.column(column, width=width, anchor=tk.CENTER, stretch=False)
+        scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scrollbar.set)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.tag_configure("connected", foreground="green")
+        self.tree.tag_configure("connecting", foreground="orange")
+        self.tree.tag_configure("waiting", foreground="red")
+        for link in self.fleet.links:
+            self.tree.insert("", tk.END, iid=link.name)
+
+        # 指令按钮，作用于选中的发送端
+        button_frame = ttk.LabelFrame(main_frame, text="指令（选中的发送端，未选中时为全部）", padding="5")
+        button_frame.pack(fill=tk.X, pady=5)
+        for text, command in FLEET_COMMANDS:
+            ttk.Button(button_frame, text=text, command=lambda command=command: self.send_command(command)
+                       ).pack(side=tk.LEFT, padx=2)
+        ttk.Button(button_frame, text="取消选择", command=lambda: self.tree.selection_set(())).pack(side=tk.RIGHT)
+
+        # 日志
+        self.log_panel = LogPanel(main_frame, title="日志:", height=8, **self.log_options)
+        self.log_panel.pack(fill=tk.X)
+
+    def refresh(self):
+        """读取总览并更新有变化的行"""
+        rows = self.fleet.overview()
+        connected = 0
+        for link, values in zip(self.fleet.links, rows):
+            if link.state.command_connected:
+                connected += 1
+                tag = "connected"
+            elif link.connecting:
+                tag = "connecting"
+            else:
+                tag = "waiting"
+            if self.rows.get(link.name) != (values, tag):
+                self.rows[link.name] = (values, tag)
+                self.tree.item(link.name, values=values, tags=(tag,))
+
+        rate = sum(link.message_rate for link in self.fleet.links)
+        images = sum(link.images for link in self.fleet.links)
+        summary = f"已连接 {connected}/{len(self.fleet.links)} 台    消息 {rate:.1f} 条/秒    图像 {images} 张"
+        if summary != self.summary:
+            self.summary = summary
+            self.summary_label.config(text=summary)
+        self.root.after(REFRESH_INTERVAL, self.refresh)
+
+    def selected_links(self):
+        selected = set(self.tree.selection())
+        return [link for link in self.fleet.links if link.name in selected] or self.fleet.links
+
+    def send_command(self, command):
+        links = self.selected_links()
+        sent = self.fleet.send_command(command, links)
+        self.log_message(f"已向 {sent}/{len(links)} 台发送端发送指令: {command}")
+
+    def on_fleet_event(self, link, event, value):
+        """Fleet 监听回调（事件循环线程），只转发日志，其它状态由定时刷新读取"""
+        if event == ClientEvent.LOG:
+            self.log_message(value, link.name if link else "接收端")
+
+    def log_message(self, message, name=None):
+        """添加日志（可在任意线程中调用）"""
+        self.log_queue.put(make_record(f"[{name}] {message}" if name else message))
+
+    def drain_log(self):
+        """把队列中的日志批量写入日志区"""
+        records = []
+        try:
+            while True:
+                records.append(self.log_queue.get_nowait())
+        except queue.Empty:
+            pass
+        self.log_panel.extend(records)
+        self.root.after(LOG_DRAIN_INTERVAL, self.drain_log)
+
+    def on_closing(self):
+        """处理窗口关闭事件"""
+        if messagebox.askokcancel("退出", "确定要退出GUI程序吗？"):
+            # 只退出GUI，不向发送端发送退出指令
+            self.fleet.stop()
+            self.drain_log()
+            self.root.quit()
+            self.root.destroy()
+
+
+def parse_arguments():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description='WiFi摄像头控制系统 - 多发送端总览')
+    add_fleet_arguments(parser)
+    add_log_arguments(parser, "fleet_gui.log")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    fleet, recorders = open_fleet(args)
+    if fleet is None:
+        return
+
+    root = tk.Tk()
+    gui = FleetGUI(root, fleet, args.log_lines, args.log_file, args.log_level)
+    fleet.start()
+
+    try:
+        root.mainloop()
+    except KeyboardInterrupt:
+        print("\n用户中断程序...")
+    finally:
+        fleet.stop()
+        gui.log_panel.close()
+        for recorder in recorders:
+            recorder.close()
+            print(recorder.summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+按行分帧的套接字读取 - 指令、状态和遥测连接共用
+功能：
+1. 用 recv_into 直接接收到预分配的 bytearray，以读偏移取出每一行，不再对剩余数据反复切片复制
+2. 已扫描过的数据不重复查找换行符，整体为线性时间
+3. 单行长度超过上限时抛出 FrameTooLarge，避免对端异常时缓冲区无限增长
+4. 行之后的二进制数据（如图像）可用 take() 直接从缓冲区取出
+
+命令行用法（环回连接上对比旧的逐条切片方式）：
+    python framing.py [--messages 200000] [--size 200] [--batch 64]
+"""
+
+import argparse
+import socket
+import threading
+import time
+
+DEFAULT_BUFFER_SIZE = 64 * 1024  # 初始接收缓冲区
+DEFAULT_MAX_FRAME = 1024 * 1024  # 单行最大长度
+
+
+class FrameTooLarge(ValueError):
+    """单行数据超过长度上限"""
+
+
+class LineReader:
+    """从套接字读取以 \\n 结尾的行"""
+
+    def __init__(self, sock, buffer_size=DEFAULT_BUFFER_SIZE, max_frame=DEFAULT_MAX_FRAME):
+        self.sock = sock
+        self.max_frame = max_frame
+        self.buffer = bytearray(buffer_size)
+        self.view = memoryview(self.buffer)
+        self.start = 0  # 未处理数据的起点
+        self.end = 0  # 已接收数据的终点
+        self.scanned = 0  # start之后已确认没有换行符的位置
+
+    @property
+    def buffered(self):
+        """缓冲区中尚未取出的字节数"""
+        return self.end - self.start
+
+    def _make_room(self):
+        """把未处理数据移到缓冲区开头；缓冲区已满时扩大（不超过单行上限）"""
+        pending = self.end - self.start
+        if pending >= self.max_frame:
+            raise FrameTooLarge(f"单行数据超过 {self.max_frame} 字节")
+        if self.start == 0 and self.end == len(self.buffer):
+            # 换新的缓冲区，之前 take() 返回的数据不受影响
+            buffer = bytearray(min(len(self.buffer) * 2, self.max_frame + 1))
+            buffer[:pending] = self.view[:pending]
+            self.buffer = buffer
+            self.view = memoryview(buffer)
+        elif self.start:
+            self.view[:pending] = self.view[self.start:self.end]
+        self.scanned -= self.start
+        self.start = 0
+        self.end = pending
+
+    def fill(self):
+        """接收一次数据，返回收到的字节数，0表示连接已关闭"""
+        if self.end == len(self.buffer):
+            self._make_room()
+        count = self.sock.recv_into(self.view[self.end:])
+        self.end += count
+        return count
+
+    def _check_frame(self):
+        if self.end - self.start > self.max_frame:
+            raise FrameTooLarge(f"单行数据超过 {self.max_frame} 字节")
+
+    def pop_line(self):
+        """取出缓冲区中的下一行，没有完整的行时返回None（不接收数据，非阻塞套接字在可读时先调用 fill()）"""
+        line_end = self.buffer.find(b'\n', max(self.start, self.scanned), self.end)
+        if line_end < 0:
+            self.scanned = self.end
+            self._check_frame()
+            return None
+        line = bytes(self.view[self.start:line_end])
+        self.start = self.scanned = line_end + 1
+        if self.start == self.end:
+            self.start = self.end = self.scanned = 0
+        return line
+
+    def pop_lines(self):
+        """取出缓冲区中全部完整的行，没有时返回空列表（不接收数据）"""
+        last = self.buffer.rfind(b'\n', max(self.start, self.scanned), self.end)
+        if last < 0:
+            self.scanned = self.end
+            self._check_frame()
+            return []
+        lines = bytes(self.view[self.start:last]).split(b'\n')
+        self.start = self.scanned = last + 1
+        if self.start == self.end:
+            self.start = self.end = self.scanned = 0
+        return lines
+
+    def readline(self):
+        """返回下一行（bytes，不含换行符），连接关闭时返回None"""
+        while True:
+            line = self.pop_line()
+            if line is not None:
+                return line
+            if not self.fill():
+                return None
+
+    def readlines(self):
+        """返回缓冲区中全部完整的行（至少一行，按需接收），连接关闭时返回空列表"""
+        while True:
+            lines = self.pop_lines()
+            if lines:
+                return lines
+            if not self.fill():
+                return []
+
+    def lines(self):
+        """逐行读取直到连接关闭（每次接收后整批切分）"""
+        while True:
+            lines = self.readlines()
+            if not lines:
+                return
+            yield from lines
+
+    def take(self, size):
+        """取出缓冲区中已收到的最多 size 字节（memoryview，不复制），剩余部分由调用方直接从套接字接收"""
+        count = min(size, self.end - self.start)
+        data = self.view[self.start:self.start + count]
+        self.start += count
+        self.scanned = max(self.scanned, self.start)
+        if self.start == self.end:
+            self.start = self.end = self.scanned = 0
+        return data
+
+
+def legacy_lines(sock, recv_size=1024):
+    """旧的读取方式（recv、bytes拼接、逐条切片），仅用于对比测试"""
+    buffer = b''
+    while True:
+        data = sock.recv(recv_size)
+        if not data:
+            return
+        buffer += data
+        while b'\n' in buffer:
+            line_end = buffer.find(b'\n')
+            line = buffer[:line_end]
+            buffer = buffer[line_end+1:]
+            yield line
+
+
+def benchmark(read_lines, messages, size, batch):
+    """环回TCP连接上发送 messages 条 size 字节的消息（每次发送 batch 条），返回每秒处理的消息数"""
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(("127.0.0.1", 0))
+    server.listen(1)
+    line = b'x' * (size - 1) + b'\n'
+    burst = line * batch
+
+    def send_all():
+        conn, _ = server.accept()
+        with conn:
+            for _ in range(messages // batch):
+                conn.sendall(burst)
+            conn.sendall(line * (messages % batch))
+
+    sender = threading.Thread(target=send_all, daemon=True)
+    sender.start()
+    client = socket.create_connection(server.getsockname())
+    client.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1024 * 1024)
+    began = time.perf_counter()
+    received = sum(1 for _ in read_lines(client))
+    elapsed = time.perf_counter() - began
+    client.close()
+    server.close()
+    sender.join()
+    if received != messages:
+        raise RuntimeError(f"收到 {received} 条消息，应为 {messages} 条")
+    return messages / elapsed
+
+
+def parse_arguments():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description='环回连接上测试按行分帧的读取速度')
+    parser.add_argument('--messages', type=int, default=200000, help='消息条数（默认200000）')
+    parser.add_argument('--size', type=int, default=200, help='每条消息字节数（默认200）')
+    parser.add_argument('--batch', type=int, default=64, help='每次发送的消息条数（默认64，模拟突发）')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+
+    for name, read_lines in (("旧方式 (recv(1024) + 切片)", legacy_lines),
+                             ("旧方式 (recv(64K) + 切片)", lambda sock: legacy_lines(sock, DEFAULT_BUFFER_SIZE)),
+                             ("LineReader (recv_into + 读偏移)", lambda sock: LineReader(sock).lines())):
+        rate = benchmark(read_lines, args.messages, args.size, args.batch)
+        print(f"{name}: {rate:,.0f} 条/秒，{rate * args.size / 1e6:.1f} MB/秒")
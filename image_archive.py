@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+"""
+打包图像存档 - 每次记录的所有JPEG追加写入一个数据文件，另有偏移/时间戳索引
+功能：
+1. 追加写入，避免长时间延时摄影产生成千上万个小文件
+2. 按序号或时间随机读取单帧，按时间窗口遍历
+3. 导出为原来的 img_YYYYMMDD_HHMMSS_mmm.jpg 散文件
+
+文件布局（小端）：
+    images_YYYYMMDD_HHMMSS.pack      每帧: b"IMG0" | 长度 uint32 | 时间戳(纳秒) int64 | JPEG数据
+    images_YYYYMMDD_HHMMSS.pack.idx  每帧一条记录: 数据偏移 uint64 | 长度 uint32 | CRC32 uint32 | 时间戳 int64
+先写数据再写索引，索引不会指向不存在的数据；帧头使索引可以从数据文件重建。
+
+命令行用法：
+    python image_archive.py info images_20250101_120000.pack
+    python image_archive.py extract images_20250101_120000.pack [-o 目录] [--start ...] [--end ...]
+    python image_archive.py get images_20250101_120000.pack <序号> [-o img.jpg]
+"""
+
+import argparse
+import bisect
+import datetime
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+
+from segments import parse_time_ns
+
+ARCHIVE_EXTENSION = ".pack"
+INDEX_SUFFIX = ".idx"
+RECORD_MAGIC = b"IMG0"
+RECORD_HEADER = struct.Struct("<4sIq")
+INDEX_RECORD = struct.Struct("<QIIq")
+
+
+def image_filename(timestamp_ns):
+    """与散文件保存方式相同的文件名"""
+    moment = datetime.datetime.fromtimestamp(timestamp_ns / 1e9)
+    return f"img_{moment.strftime('%Y%m%d_%H%M%S_%f')[:-3]}.jpg"
+
+
+class ImageArchiveWriter:
+    """追加写入的图像存档，可被采集线程和控制线程同时使用"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = open(path, "ab")
+        self.index_file = open(path + INDEX_SUFFIX, "ab")
+        self.offset = self.file.tell()
+        self.count = self.index_file.tell() // INDEX_RECORD.size
+        self.bytes_written = 0
+
+    def append(self, image_data, timestamp_ns=None):
+        """追加一帧，返回帧序号"""
+        if timestamp_ns is None:
+            timestamp_ns = time.time_ns()
+        with self.lock:
+            if self.file.closed:
+                raise ValueError("图像存档已关闭")
+            data_offset = self.offset + RECORD_HEADER.size
+            self.file.write(RECORD_HEADER.pack(RECORD_MAGIC, len(image_data), timestamp_ns))
+            self.file.write(image_data)
+            self.file.flush()
+            self.index_file.write(INDEX_RECORD.pack(data_offset, len(image_data),
+                                                    zlib.crc32(image_data), timestamp_ns))
+            self.index_file.flush()
+            self.offset = data_offset + len(image_data)
+            self.bytes_written += RECORD_HEADER.size + len(image_data)
+            index = self.count
+            self.count += 1
+        return index
+
+    def fsync(self):
+        with self.lock:
+            if not self.file.closed:
+                os.fsync(self.file.fileno())
+                os.fsync(self.index_file.fileno())
+
+    def close(self):
+        with self.lock:
+            if self.file.closed:
+                return
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.file.close()
+            self.index_file.close()
+
+
+class ImageArchiveReader:
+    """按索引随机读取图像存档"""
+
+    def __init__(self, path):
+        self.path = path
+        size = os.path.getsize(path)
+        self.offsets = []
+        self.lengths = []
+        self.crcs = []
+        self.timestamps = []
+        with open(path + INDEX_SUFFIX, "rb") as f:
+            index_data = f.read()
+        for i in range(len(index_data) // INDEX_RECORD.size):
+            offset, length, crc, timestamp_ns = INDEX_RECORD.unpack_from(index_data, i * INDEX_RECORD.size)
+            if offset + length > size:
+                # 写入过程中或断电后，数据可能尚未完整落盘
+                break
+            self.offsets.append(offset)
+            self.lengths.append(length)
+            self.crcs.append(crc)
+            self.timestamps.append(timestamp_ns)
+        self.file = open(path, "rb")
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def get(self, index, verify=True):
+        """按序号读取一帧JPEG数据"""
+        self.file.seek(self.offsets[index])
+        data = self.file.read(self.lengths[index])
+        if verify and zlib.crc32(data) != self.crcs[index]:
+            raise ValueError(f"第 {index} 帧校验失败")
+        return data
+
+    def find_time(self, timestamp_ns):
+        """返回时间不晚于 timestamp_ns 的最后一帧的序号（早于第一帧时返回0）"""
+        return max(0, bisect.bisect_right(self.timestamps, timestamp_ns) - 1)
+
+    def get_at_time(self, timestamp_ns):
+        index = self.find_time(timestamp_ns)
+        return self.timestamps[index], self.get(index)
+
+    def iter_images(self, start_ns=None, end_ns=None):
+        """按时间顺序返回 (时间戳, JPEG数据)"""
+        first = 0 if start_ns is None else bisect.bisect_left(self.timestamps, start_ns)
+        last = len(self) if end_ns is None else bisect.bisect_right(self.timestamps, end_ns)
+        for index in range(first, last):
+            yield self.timestamps[index], self.get(index)
+
+    def extract(self, output_dir, start_ns=None, end_ns=None):
+        """导出为 img_*.jpg 散文件，返回导出数量"""
+        os.makedirs(output_dir, exist_ok=True)
+        count = 0
+        for timestamp_ns, data in self.iter_images(start_ns, end_ns):
+            with open(os.path.join(output_dir, image_filename(timestamp_ns)), "wb") as f:
+                f.write(data)
+            count += 1
+        return count
+
+    def close(self):
+        self.file.close()
+
+
+def recover_archive(path):
+    """断电后修复存档：丢弃指向不完整数据的索引记录，按帧头补全缺失的索引，截断末尾不完整的帧
+    只读取索引、帧头和未被索引的帧，返回 (帧数, 补全的索引条数, 截掉的字节数)"""
+    index_path = path + INDEX_SUFFIX
+    size = os.path.getsize(path)
+    entries = []
+    if os.path.exists(index_path):
+        with open(index_path, "rb") as f:
+            index_data = f.read()
+        for i in range(len(index_data) // INDEX_RECORD.size):
+            entry = INDEX_RECORD.unpack_from(index_data, i * INDEX_RECORD.size)
+            if entry[0] + entry[1] > size:
+                break
+            entries.append(entry)
+    valid_end = entries[-1][0] + entries[-1][1] if entries else 0
+
+    # 从最后一条有效索引之后按帧头跳跃扫描
+    rebuilt = []
+    with open(path, "rb") as f:
+        offset = valid_end
+        while offset + RECORD_HEADER.size <= size:
+            f.seek(offset)
+            magic, length, timestamp_ns = RECORD_HEADER.unpack(f.read(RECORD_HEADER.size))
+            data_offset = offset + RECORD_HEADER.size
+            if magic != RECORD_MAGIC or data_offset + length > size:
+                break
+            rebuilt.append((data_offset, length, zlib.crc32(f.read(length)), timestamp_ns))
+            offset = data_offset + length
+    valid_end = offset if rebuilt else valid_end
+    entries.extend(rebuilt)
+
+    with open(index_path, "wb") as f:
+        for entry in entries:
+            f.write(INDEX_RECORD.pack(*entry))
+        f.flush()
+        os.fsync(f.fileno())
+    trailing = size - valid_end
+    if trailing:
+        with open(path, "r+b") as f:
+            f.truncate(valid_end)
+    return len(entries), len(rebuilt), trailing
+
+
+def find_archives(folder):
+    """返回文件夹中的图像存档（按文件名排序）"""
+    return sorted(os.path.join(folder, name) for name in os.listdir(folder or ".")
+                  if name.startswith("images_") and name.endswith(ARCHIVE_EXTENSION))
+
+
+def parse_arguments():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description='打包图像存档工具')
+    parser.add_argument('action', choices=['info', 'extract', 'get'], help='操作')
+    parser.add_argument('archive', help='图像存档 (*.pack)')
+    parser.add_argument('index', nargs='?', type=int, help='帧序号（get）')
+    parser.add_argument('-o', '--output', help='输出目录（extract）或文件（get）')
+    parser.add_argument('--start', help='起始时间，如 "2025-01-01 12:00:00"')
+    parser.add_argument('--end', help='结束时间')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+
+    if not os.path.exists(args.archive):
+        print(f"错误: 文件 {args.archive} 不存在")
+        sys.exit(1)
+
+    reader = ImageArchiveReader(args.archive)
+    if args.action == 'info':
+        print(f"存档: {args.archive}，帧数: {len(reader)}，大小: {os.path.getsize(args.archive)} 字节")
+        if len(reader):
+            first = datetime.datetime.fromtimestamp(reader.timestamps[0] / 1e9)
+            last = datetime.datetime.fromtimestamp(reader.timestamps[-1] / 1e9)
+            print(f"时间范围: {first} ~ {last}")
+    elif args.action == 'extract':
+        output_dir = args.output or os.path.splitext(args.archive)[0]
+        count = reader.extract(output_dir, parse_time_ns(args.start), parse_time_ns(args.end))
+        print(f"已导出 {count} 张图片到: {output_dir}")
+    else:
+        if args.index is None:
+            print("错误: 请指定帧序号")
+            sys.exit(1)
+        data = reader.get(args.index)
+        output = args.output or image_filename(reader.timestamps[args.index])
+        with open(output, "wb") as f:
+            f.write(data)
+        print(f"已保存: {output} ({len(data)} 字节)")
+    reader.close()
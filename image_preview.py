@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+接收端图像预览 - 后台线程解码并缩小，界面线程只负责显示
+功能：
+1. FrameDecoder 在后台线程中解码收到的JPEG并缩小到预览尺寸（先用 draft 让JPEG解码器按1/2、1/4、1/8缩小解码）
+2. 只保留最新的一张：解码跟不上时，等待解码的旧图像直接被新图像替换；解码完成但还没显示的也只保留最新的
+3. PreviewPanel 定期取出解码好的图像显示，并显示解码耗时（最近/平均/最大）、显示数和丢弃数
+4. 需要Pillow，不可用时接收端界面禁用预览按钮
+
+命令行用法（测试解码耗时，不需要显示器）：
+    python image_preview.py img_*.jpg [--size 480x360]
+"""
+
+import argparse
+import io
+import os
+import sys
+import threading
+import time
+import tkinter as tk
+from collections import deque
+
+from PIL import Image, ImageTk
+
+PREVIEW_SIZE = (480, 360)  # 预览最大尺寸（保持宽高比）
+REFRESH_INTERVAL = 100  # 界面取新图像的间隔（毫秒）
+STATS_WINDOW = 100  # 解码耗时统计最近多少张
+
+
+def decode_preview(source, size=PREVIEW_SIZE, draft=True):
+    """解码图像（文件路径或bytes）并缩小到 size 以内，返回 (RGB图像, 原始尺寸)"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    with Image.open(source) as image:
+        original_size = image.size
+        if draft:
+            # 只对JPEG有效：解码时直接按2的幂缩小，不解码完整分辨率
+            image.draft("RGB", size)
+        preview = image.convert("RGB")
+    preview.thumbnail(size)
+    return preview, original_size
+
+
+class DecodedFrame:
+    """解码完成、等待显示的一张图像"""
+
+    def __init__(self, image, original_size, name, decode_time):
+        self.image = image
+        self.original_size = original_size
+        self.name = name
+        self.decode_time = decode_time
+
+
+class FrameDecoder:
+    """后台解码线程；submit() 可在任意线程中调用，take() 在界面线程中调用"""
+
+    def __init__(self, size=PREVIEW_SIZE):
+        self.size = size
+        self.condition = threading.Condition()
+        self.pending = None  # 等待解码的图像（只保留最新的一张）
+        self.ready = None  # 解码完成、等待显示的 DecodedFrame
+        self.running = True
+
+        # 统计
+        self.submitted = 0
+        self.decoded = 0
+        self.dropped = 0  # 还没解码就被新图像替换
+        self.skipped = 0  # 解码完成但还没显示就被新图像替换
+        self.errors = 0
+        self.last_error = ""
+        self.decode_times = deque(maxlen=STATS_WINDOW)
+
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, source):
+        """提交一张图像（文件路径或bytes），立即返回"""
+        with self.condition:
+            if self.pending is not None:
+                self.dropped += 1
+            self.pending = source
+            self.submitted += 1
+            self.condition.notify()
+
+    def take(self):
+        """取出最新解码好的图像，没有新图像时返回None"""
+        with self.condition:
+            frame, self.ready = self.ready, None
+        return frame
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.thread.join(1)
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.running and self.pending is None:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                source, self.pending = self.pending, None
+
+            began = time.perf_counter()
+            try:
+                image, original_size = decode_preview(source, self.size)
+            except Exception as e:
+                with self.condition:
+                    self.errors += 1
+                    self.last_error = str(e)
+                continue
+            elapsed = time.perf_counter() - began
+            name = os.path.basename(source) if isinstance(source, str) else ""
+
+            with self.condition:
+                if self.ready is not None:
+                    self.skipped += 1
+                self.ready = DecodedFrame(image, original_size, name, elapsed)
+                self.decoded += 1
+                self.decode_times.append(elapsed)
+
+    def stats(self):
+        """解码统计，耗时单位为毫秒"""
+        with self.condition:
+            times = list(self.decode_times)
+            return {
+                "submitted": self.submitted,
+                "decoded": self.decoded,
+                "dropped": self.dropped,
+                "skipped": self.skipped,
+                "errors": self.errors,
+                "last_error": self.last_error,
+                "decode_last_ms": round(times[-1] * 1000, 1) if times else 0,
+                "decode_avg_ms": round(sum(times) * 1000 / len(times), 1) if times else 0,
+                "decode_max_ms": round(max(times) * 1000, 1) if times else 0,
+            }
+
+
+class PreviewPanel:
+    """预览图像 + 统计文字"""
+
+    def __init__(self, parent, decoder):
+        self.decoder = decoder
+        self.photo = None  # 保留引用，否则图像会被回收
+        self.shown = 0
+        self.info_text = ""
+        self.stats_text = ""
+        self.frame = tk.Frame(parent)
+        width, height = decoder.size
+        area = tk.Frame(self.frame, width=width, height=height, bg="black")
+        area.pack_propagate(False)
+        area.pack()
+        self.image_label = tk.Label(area, text="等待图像...", bg="black", fg="white")
+        self.image_label.pack(fill="both", expand=True)
+        self.info_label = tk.Label(self.frame, text="", font=("Consolas", 9), anchor="w")
+        self.info_label.pack(fill="x", pady=(5, 0))
+        self.stats_label = tk.Label(self.frame, text="", font=("Consolas", 9), anchor="w")
+        self.stats_label.pack(fill="x")
+
+    def pack(self, **options):
+        self.frame.pack(**options)
+
+    def refresh(self):
+        """显示最新解码好的图像（界面线程中定期调用）"""
+        frame = self.decoder.take()
+        if frame:
+            self.photo = ImageTk.PhotoImage(frame.image)
+            self.image_label.config(image=self.photo, text="")
+            self.shown += 1
+            width, height = frame.original_size
+            self._set_text("info", f"{frame.name}  {width}x{height} -> {frame.image.width}x{frame.image.height}")
+
+        stats = self.decoder.stats()
+        stats_text = (f"解码 {stats['decode_last_ms']} ms（平均 {stats['decode_avg_ms']}，最大 {stats['decode_max_ms']}）  "
+                      f"已显示 {self.shown}  丢弃 {stats['dropped'] + stats['skipped']}")
+        if stats["errors"]:
+            stats_text += f"  解码失败 {stats['errors']}（{stats['last_error']}）"
+        self._set_text("stats", stats_text)
+
+    def _set_text(self, name, text):
+        """文字有变化时才更新标签"""
+        if getattr(self, f"{name}_text") != text:
+            setattr(self, f"{name}_text", text)
+            getattr(self, f"{name}_label").config(text=text)
+
+
+def parse_size(text):
+    width, _, height = text.lower().partition("x")
+    return int(width), int(height)
+
+
+def parse_arguments():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description='测试图像预览的解码耗时（JPEG缩小解码与完整解码对比）')
+    parser.add_argument('images', nargs='+', help='图像文件')
+    parser.add_argument('--size', type=parse_size, default=PREVIEW_SIZE, help='预览尺寸（默认480x360）')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+
+    for path in args.images:
+        if not os.path.exists(path):
+            print(f"错误: 文件 {path} 不存在")
+            sys.exit(1)
+
+    for label, draft in (("完整解码后缩小", False), ("缩小解码 (draft)", True)):
+        began = time.perf_counter()
+        for path in args.images:
+            decode_preview(path, args.size, draft)
+        elapsed = time.perf_counter() - began
+        print(f"{label}: 平均 {elapsed * 1000 / len(args.images):.1f} ms/张（{len(args.images)} 张）")
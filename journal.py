@@ -0,0 +1,400 @@
+# -*- coding: utf-8 -*-
+"""
+记录会话日志与断电恢复
+功能：
+1. 每个结果文件夹一个追加写入的会话日志（session.journal，每行一条JSON）
+2. 记录开始/结束标记、打开和关闭的数据文件、定期检查点，关键记录立即fsync
+3. 启动时检查未正常结束的会话：截断不完整的数据行/数据块/图像帧，重建索引，补全分段清单并标记会话结束
+4. 恢复只读取文件末尾、块头和索引，不重新读取整个数据文件：未压缩CSV从最后一个可用检查点的
+   行数和文件偏移开始，只统计之后新增的行；会话目录按分段清单和文件大小汇总，不重新解析数据
+
+命令行用法：
+    python journal.py [根目录] [--dry-run]
+"""
+
+import argparse
+import datetime
+import glob
+import json
+import os
+import sys
+import threading
+import time
+
+from columnar_format import FILE_EXTENSION as COLUMNAR_EXTENSION, recover_columnar, scan_chunks, header_end
+from compression import FramedReader, recover_framed, split_compression_suffix
+from image_archive import recover_archive, find_archives, INDEX_SUFFIX, INDEX_RECORD
+from segments import MANIFEST_SUFFIX, load_manifest, save_manifest, parse_time_ns
+
+JOURNAL_NAME = "session.journal"
+CHECKPOINT_INTERVAL = 10.0  # 检查点间隔（秒）
+TAIL_READ_SIZE = 64 * 1024
+COUNT_BLOCK_SIZE = 1024 * 1024  # 统计CSV行数时每次读取的字节数
+
+
+class SessionJournal:
+    """结果文件夹的会话日志，采集线程和控制线程都会写入"""
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.path = os.path.join(folder, JOURNAL_NAME)
+        self.lock = threading.Lock()
+        self.session = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        _trim_torn_line(self.path)
+        self.file = open(self.path, "a", encoding="utf-8")
+        self.last_checkpoint = time.time()
+        self.record("start", sync=True)
+
+    def record(self, record_type, sync=False, **fields):
+        """追加一条记录；sync为True时立即fsync"""
+        entry = {"type": record_type, "time_ns": time.time_ns(), "session": self.session}
+        entry.update(fields)
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self.lock:
+            if self.file.closed:
+                return
+            try:
+                self.file.write(line)
+                self.file.flush()
+                if sync:
+                    os.fsync(self.file.fileno())
+            except Exception as e:
+                print(f"写入会话日志错误: {e}")
+
+    def open_file(self, kind, path, **fields):
+        """登记新打开的数据文件（kind: data 为分段清单，images 为图像存档）"""
+        self.record("open", sync=True, kind=kind, file=os.path.basename(path), **fields)
+
+    def close_file(self, kind, path, **fields):
+        """登记正常关闭的数据文件"""
+        self.record("close", sync=True, kind=kind, file=os.path.basename(path), **fields)
+
+    def checkpoint_due(self, now=None):
+        return (now or time.time()) - self.last_checkpoint >= CHECKPOINT_INTERVAL
+
+    def checkpoint(self, files):
+        """记录各数据文件当前进度 {文件名: {...}}"""
+        self.last_checkpoint = time.time()
+        self.record("checkpoint", sync=True, files=files)
+
+    def stop(self):
+        """会话正常结束"""
+        self.record("stop", sync=True, clean=True)
+        with self.lock:
+            self.file.close()
+
+
+def _trim_torn_line(path):
+    """去掉日志末尾写了一半的行，只读取文件末尾"""
+    if not os.path.exists(path):
+        return
+    with open(path, "r+b") as f:
+        size = f.seek(0, os.SEEK_END)
+        if not size:
+            return
+        f.seek(max(0, size - TAIL_READ_SIZE))
+        tail = f.read()
+        if tail.endswith(b"\n"):
+            return
+        cut = tail.rfind(b"\n")
+        f.truncate(size - len(tail) + cut + 1 if cut >= 0 else 0)
+
+
+def read_journal(path):
+    """读取日志全部记录，忽略无法解析的行"""
+    entries = []
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+    return entries
+
+
+def needs_recovery(path):
+    """日志最后一条完整记录不是结束标记时需要恢复（只读取文件末尾）"""
+    with open(path, "rb") as f:
+        size = f.seek(0, os.SEEK_END)
+        f.seek(max(0, size - TAIL_READ_SIZE))
+        lines = f.read().splitlines()
+    for line in reversed(lines):
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            continue
+        return entry.get("type") != "stop"
+    return False
+
+
+def _csv_line_time(line):
+    return parse_time_ns(line.split(b",", 1)[0].decode("utf-8"))
+
+
+def scan_csv_tail(data, at_start):
+    """CSV数据中完整行的长度、行数和首末时间戳"""
+    lines = data[:data.rfind(b"\n") + 1].splitlines(keepends=True)
+    first = 1 if at_start else 0
+    # 丢弃末尾无法解析的行（写入中断产生的乱码）
+    while len(lines) > first:
+        try:
+            last_ns = _csv_line_time(lines[-1].strip())
+            break
+        except ValueError:
+            lines.pop()
+    keep = sum(len(line) for line in lines)
+    if len(lines) <= first:
+        return keep, 0, 0, 0
+    return keep, len(lines) - first, _csv_line_time(lines[first].strip()), last_ns
+
+
+def scan_columnar_tail(data, at_start):
+    """列式数据中完整数据块的长度、行数和首末时间戳"""
+    offset = header_end(data) if at_start else 0
+    if offset is None:
+        return 0, 0, 0, 0
+    return scan_chunks(data, offset)
+
+
+def count_lines(f, start, length):
+    """按块统计文件 [start, length) 字节中的换行数"""
+    f.seek(start)
+    length -= start
+    count = 0
+    while length > 0:
+        block = f.read(min(length, COUNT_BLOCK_SIZE))
+        if not block:
+            break
+        count += block.count(b"\n")
+        length -= len(block)
+    return count
+
+
+def _usable_checkpoint(f, checkpoints, valid_length):
+    """最后一个偏移仍在文件中且正好位于行尾的检查点（检查点之后的数据可能未写入磁盘）"""
+    for checkpoint in reversed(checkpoints):
+        offset = checkpoint.get("offset")
+        if offset is None or not 0 < offset <= valid_length:
+            continue
+        f.seek(offset - 1)
+        if f.read(1) == b"\n":
+            return checkpoint
+    return None
+
+
+def recover_csv(path, checkpoints=()):
+    """截断未压缩CSV末尾不完整的一行，读取文件开头和末尾得到首末时间戳
+    行数从最后一个可用检查点开始只统计之后的部分，没有可用检查点时按块统计整个文件
+    返回 (截掉的字节数, 数据行数, 首行时间戳, 末行时间戳)"""
+    with open(path, "r+b") as f:
+        head = f.read(TAIL_READ_SIZE).split(b"\n")
+        size = f.seek(0, os.SEEK_END)
+        valid_length = 0
+        last_line = None
+        end = size
+        while end > 0:
+            start = max(0, end - TAIL_READ_SIZE)
+            f.seek(start)
+            block = f.read(end - start)
+            cut = block.rfind(b"\n")
+            if cut >= 0:
+                valid_length = start + cut + 1
+                last_line = block[:cut].rsplit(b"\n", 1)[-1]
+                break
+            end = start
+        if valid_length < size:
+            f.truncate(valid_length)
+        checkpoint = _usable_checkpoint(f, checkpoints, valid_length)
+        if checkpoint:
+            rows = checkpoint["segment_rows"] + count_lines(f, checkpoint["offset"], valid_length)
+        else:
+            # 第一行为表头
+            rows = max(0, count_lines(f, 0, valid_length) - 1)
+
+    first_ns = last_ns = None
+    # 表头之后至少有一行完整数据
+    if len(head) > 2 and valid_length > len(head[0]) + 1:
+        try:
+            first_ns = _csv_line_time(head[1].strip())
+            last_ns = _csv_line_time(last_line.strip())
+        except ValueError:
+            pass
+    return size - valid_length, rows, first_ns, last_ns
+
+
+def recover_data_file(path, checkpoints=()):
+    """修复一个数据文件，返回 {rows, start_ns, end_ns, discarded}（未知的项为None）
+    checkpoints 为该文件的检查点（按时间顺序），用于未压缩CSV的行数"""
+    inner_path, compression = split_compression_suffix(path)
+    columnar = inner_path.endswith(COLUMNAR_EXTENSION)
+    if compression:
+        _, discarded = recover_framed(path, scan_columnar_tail if columnar else scan_csv_tail)
+        frames = [frame for frame in FramedReader(path).frames if frame[3]]
+        return {"rows": sum(frame[3] for frame in frames),
+                "start_ns": frames[0][4] if frames else None,
+                "end_ns": frames[-1][5] if frames else None,
+                "discarded": discarded}
+    if columnar:
+        rows, discarded, first_ns, last_ns = recover_columnar(path)
+        return {"rows": rows, "start_ns": first_ns, "end_ns": last_ns, "discarded": discarded}
+    discarded, rows, first_ns, last_ns = recover_csv(path, checkpoints)
+    return {"rows": rows, "start_ns": first_ns, "end_ns": last_ns, "discarded": discarded}
+
+
+def recover_recording(folder, manifest_name, checkpoints=()):
+    """修复一次数据记录的未完成分段并补全分段清单，返回修复信息列表"""
+    manifest_path = os.path.join(folder, manifest_name)
+    manifest = load_manifest(manifest_path)
+    results = []
+    for segment in manifest["segments"]:
+        if segment["complete"]:
+            continue
+        path = os.path.join(folder, segment["file"])
+        if os.path.exists(path):
+            info = recover_data_file(path, [checkpoint for checkpoint in checkpoints
+                                            if checkpoint.get("file") == segment["file"]])
+            for key in ("rows", "start_ns", "end_ns"):
+                if info[key] is not None:
+                    segment[key] = info[key]
+            segment["bytes"] = os.path.getsize(path)
+            results.append((segment["file"], info))
+        segment["complete"] = True
+    manifest["complete"] = True
+    manifest["recovered"] = True
+    save_manifest(manifest_path, manifest)
+    return results
+
+
+def recover_session(folder, dry_run=False):
+    """修复文件夹中最后一个未正常结束的会话，返回修复摘要"""
+    journal_path = os.path.join(folder, JOURNAL_NAME)
+    entries = read_journal(journal_path)
+    starts = [i for i, entry in enumerate(entries) if entry.get("type") == "start"]
+    session_entries = entries[starts[-1]:] if starts else entries
+
+    # 已打开但未正常关闭的文件，以及各数据记录的检查点（按时间顺序）
+    open_files = {}
+    checkpoints = {}
+    for entry in session_entries:
+        if entry.get("type") == "open":
+            open_files[entry["file"]] = entry["kind"]
+        elif entry.get("type") == "close":
+            open_files.pop(entry["file"], None)
+        elif entry.get("type") == "checkpoint":
+            for name, progress in entry.get("files", {}).items():
+                checkpoints.setdefault(name, []).append(progress)
+
+    summary = {"folder": folder, "files": []}
+    if dry_run:
+        summary["files"] = sorted(open_files)
+        return summary
+
+    for name, kind in open_files.items():
+        try:
+            if kind == "data":
+                if os.path.exists(os.path.join(folder, name)):
+                    for file_name, info in recover_recording(folder, name, checkpoints.get(name, ())):
+                        summary["files"].append({"file": file_name, **info})
+            elif kind == "images":
+                path = os.path.join(folder, name)
+                if os.path.exists(path):
+                    frames, rebuilt, discarded = recover_archive(path)
+                    summary["files"].append({"file": name, "frames": frames,
+                                             "rebuilt": rebuilt, "discarded": discarded})
+        except Exception as e:
+            print(f"恢复 {os.path.join(folder, name)} 失败: {e}")
+            summary["files"].append({"file": name, "error": str(e)})
+
+    summary["totals"] = session_totals(folder)
+    if summary["totals"]["started_ns"] is None and session_entries:
+        # 没有数据行（只录制了图像）时按会话日志的时间
+        summary["totals"]["started_ns"] = session_entries[0].get("time_ns")
+        summary["totals"]["ended_ns"] = session_entries[-1].get("time_ns")
+
+    _trim_torn_line(journal_path)
+    with open(journal_path, "a", encoding="utf-8") as f:
+        session = session_entries[0].get("session") if session_entries else None
+        for record_type, fields in (("recovered", {"files": summary["files"]}), ("stop", {"clean": False})):
+            entry = {"type": record_type, "time_ns": time.time_ns(), "session": session}
+            entry.update(fields)
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    return summary
+
+
+def session_totals(folder):
+    """按分段清单、图像索引和文件大小汇总会话（恢复后写入会话目录），不读取数据文件"""
+    totals = {"samples": 0, "started_ns": None, "ended_ns": None,
+              "images": 0, "data_bytes": 0, "image_bytes": 0}
+    for manifest_path in glob.glob(os.path.join(folder, "data_*" + MANIFEST_SUFFIX)):
+        for segment in load_manifest(manifest_path)["segments"]:
+            totals["samples"] += segment["rows"] or 0
+            if segment["start_ns"] is not None:
+                if totals["started_ns"] is None or segment["start_ns"] < totals["started_ns"]:
+                    totals["started_ns"] = segment["start_ns"]
+            if segment["end_ns"] is not None:
+                if totals["ended_ns"] is None or segment["end_ns"] > totals["ended_ns"]:
+                    totals["ended_ns"] = segment["end_ns"]
+    for archive_path in find_archives(folder):
+        index_path = archive_path + INDEX_SUFFIX
+        if os.path.exists(index_path):
+            totals["images"] += os.path.getsize(index_path) // INDEX_RECORD.size
+    for entry in os.scandir(folder):
+        if not entry.is_file():
+            continue
+        if entry.name.startswith(("img_", "images_")):
+            totals["image_bytes"] += entry.stat().st_size
+            if entry.name.startswith("img_"):
+                totals["images"] += 1
+        else:
+            totals["data_bytes"] += entry.stat().st_size
+    return totals
+
+
+def recover_all(root=".", dry_run=False):
+    """检查根目录下所有结果文件夹，修复未正常结束的会话"""
+    summaries = []
+    for journal_path in sorted(glob.glob(os.path.join(root, "result_*", JOURNAL_NAME))):
+        try:
+            if needs_recovery(journal_path):
+                summaries.append(recover_session(os.path.dirname(journal_path), dry_run))
+        except Exception as e:
+            print(f"检查会话日志 {journal_path} 失败: {e}")
+    return summaries
+
+
+def print_summary(summary):
+    print(f"会话恢复: {summary['folder']}")
+    for item in summary["files"]:
+        if isinstance(item, str):
+            print(f"   待恢复: {item}")
+        elif "error" in item:
+            print(f"   {item['file']}: 失败 ({item['error']})")
+        elif "frames" in item:
+            print(f"   {item['file']}: {item['frames']} 帧，补全索引 {item['rebuilt']} 条，截掉 {item['discarded']} 字节")
+        else:
+            rows = "?" if item["rows"] is None else item["rows"]
+            print(f"   {item['file']}: {rows} 行，丢弃 {item['discarded']} 字节")
+
+
+def parse_arguments():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description='检查并恢复未正常结束的记录会话')
+    parser.add_argument('root', nargs='?', default='.', help='结果文件夹所在目录（默认当前目录）')
+    parser.add_argument('--dry-run', action='store_true', help='只列出需要恢复的会话')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+
+    if not os.path.isdir(args.root):
+        print(f"错误: 目录 {args.root} 不存在")
+        sys.exit(1)
+
+    summaries = recover_all(args.root, args.dry_run)
+    if not summaries:
+        print("所有会话均已正常结束")
+    for summary in summaries:
+        print_summary(summary)
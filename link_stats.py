@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+连接和吞吐量统计 - 发送端和接收端共用的轻量计数器和直方图，不依赖tkinter
+功能：
+1. RateMeter 按整秒分桶累加消息数和字节数，给出最近 RATE_WINDOW 秒的平均速率（条/秒、字节/秒）
+2. Histogram 固定分桶的耗时直方图（图像传输时间、消息间隔、发送耗时），记录次数、平均、最大和近似百分位
+3. 发送端用 get_link_stats 指令返回 LINK_STATS 消息（各客户端发送速率、丢弃数量、图像发送耗时等），
+   接收端把它与本机的接收统计一起显示在连接统计面板中
+4. format_*/describe_* 函数把统计转为文字，供连接统计面板（link_stats_panel.py）显示
+
+计数只在已有的锁内或单个线程中累加，每条消息只增加一次加法和一次 bisect，不影响发送/接收速度
+"""
+
+import bisect
+import threading
+import time
+from collections import deque
+
+RATE_WINDOW = 10  # 速率统计窗口（秒）
+STATS_REQUEST_INTERVAL = 2  # 连接统计面板向发送端请求统计的间隔（秒）
+
+# 直方图分桶上限（毫秒），最后一桶为超过最大上限的值
+IMAGE_TIME_BOUNDS = (50, 100, 200, 500, 1000, 2000, 5000, 10000)  # 一张图像的传输时间
+MESSAGE_GAP_BOUNDS = (20, 50, 100, 200, 500, 1000, 2000, 5000)  # 相邻两次收到消息的间隔
+SEND_TIME_BOUNDS = (1, 5, 20, 50, 100, 500, 2000)  # 一次 sendall 的耗时（发送缓冲区满时变长）
+
+
+class RateMeter:
+    """最近 window 秒的消息速率和字节速率"""
+
+    def __init__(self, window=RATE_WINDOW):
+        self.window = window
+        self.started = time.time()
+        self.slots = deque()  # [整秒, 条数, 字节数]
+        self.lock = threading.Lock()
+
+    def add(self, count=1, nbytes=0, now=None):
+        second = int(now or time.time())
+        with self.lock:
+            if self.slots and self.slots[-1][0] == second:
+                slot = self.slots[-1]
+                slot[1] += count
+                slot[2] += nbytes
+            else:
+                self.slots.append([second, count, nbytes])
+                self._trim(second)
+
+    def _trim(self, second):
+        while self.slots and self.slots[0][0] <= second - self.window:
+            self.slots.popleft()
+
+    def rates(self, now=None):
+        """返回 (条/秒, 字节/秒)；刚开始统计时按已经过的时间计算"""
+        now = now or time.time()
+        with self.lock:
+            self._trim(int(now))
+            count = sum(slot[1] for slot in self.slots)
+            nbytes = sum(slot[2] for slot in self.slots)
+        elapsed = min(self.window, now - self.started)
+        if elapsed <= 0:
+            return 0.0, 0.0
+        return count / elapsed, nbytes / elapsed
+
+
+class Histogram:
+    """固定分桶的直方图，bounds 为各桶上限（升序）"""
+
+    def __init__(self, bounds):
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = None
+        self.lock = threading.Lock()
+
+    def add(self, value):
+        with self.lock:
+            self.counts[bisect.bisect_left(self.bounds, value)] += 1
+            self.count += 1
+            self.total += value
+            self.max = max(self.max, value)
+            self.last = value
+
+    def percentile(self, fraction):
+        """近似百分位：所在桶的上限（最后一桶为最大值）"""
+        if not self.count:
+            return None
+        target = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= target:
+                return min(self.bounds[index], self.max) if index < len(self.bounds) else self.max
+        return self.max
+
+    def snapshot(self):
+        """可JSON序列化的统计"""
+        with self.lock:
+            return {
+                "count": self.count,
+                "last": _round(self.last),
+                "avg": _round(self.total / self.count) if self.count else None,
+                "max": _round(self.max),
+                "p50": _round(self.percentile(0.5)),
+                "p90": _round(self.percentile(0.9)),
+                "bounds": list(self.bounds),
+                "counts": list(self.counts),
+            }
+
+
+def _round(value):
+    return round(value, 2) if value is not None else None
+
+
+def format_bytes(count):
+    """字节数 -> 可读文字"""
+    for unit in ("B", "KB", "MB"):
+        if abs(count) < 1024:
+            return f"{count:.0f} {unit}" if unit == "B" else f"{count:.1f} {unit}"
+        count /= 1024
+    return f"{count:.2f} GB"
+
+
+def format_histogram(snapshot, unit="ms"):
+    """直方图统计 -> 一行文字，例如 “12次 平均 85 最大 230 P90≤200 ms”"""
+    if not snapshot or not snapshot.get("count"):
+        return "无数据"
+    return (f"{snapshot['count']}次 最近 {snapshot['last']:g} 平均 {snapshot['avg']:g} "
+            f"P50≤{snapshot['p50']:g} P90≤{snapshot['p90']:g} 最大 {snapshot['max']:g} {unit}")
+
+
+def format_buckets(snapshot):
+    """直方图各桶的次数，例如 “≤50:3 ≤100:7 >10000:0”，省略为0的桶"""
+    if not snapshot or not snapshot.get("count"):
+        return ""
+    bounds = snapshot["bounds"]
+    labels = [f"≤{bound:g}" for bound in bounds] + [f">{bounds[-1]:g}"]
+    return " ".join(f"{label}:{count}" for label, count in zip(labels, snapshot["counts"]) if count)
+
+
+def describe_receiver(stats):
+    """接收端统计（SenderSession.stats）-> [(标题, 文字)]"""
+    age = stats.get("last_message_age_s")
+    connection = "已连接" if stats.get("connected") else "未连接"
+    connection += f"  重连 {stats.get('reconnects', 0)} 次  断开 {stats.get('disconnects', 0)} 次"
+    if age is not None:
+        connection += f"  最后消息 {age:g} 秒前"
+    return [
+        ("连接", connection),
+        ("接收速率", f"{stats.get('recent_messages_per_s', 0):.1f} 条/秒  "
+                    f"{format_bytes(stats.get('recent_bytes_per_s', 0))}/秒  "
+                    f"（累计 {stats.get('messages', 0)} 条, {format_bytes(stats.get('bytes_received', 0))}）"),
+        ("消息间隔", format_histogram(stats.get("message_gap_ms"))),
+        ("数据丢失", f"缺失遥测 {stats.get('missing_telemetry', 0)}  重复 {stats.get('duplicates', 0)}  "
+                    f"图像不完整 {stats.get('incomplete_images', 0)}"),
+        ("图像接收", f"{stats.get('images', 0)} 张  {format_bytes(stats.get('image_bytes', 0))}"),
+        ("图像传输时间", format_histogram(stats.get("image_time_ms"))),
+        ("时间分布", format_buckets(stats.get("image_time_ms"))),
+    ]
+
+
+def describe_sender(stats):
+    """发送端 LINK_STATS -> [(标题, 文字)]；channel 为本接收端的发送通道"""
+    channel = stats.get("channel") or {}
+    images = stats.get("images") or {}
+    return [
+        ("连接", f"客户端 {stats.get('clients', 0)} 个  累计连接 {stats.get('connections', 0)} 次  "
+                f"断开 {stats.get('disconnects', 0)} 次  运行 {stats.get('uptime_s', 0):.0f} 秒"),
+        ("发送速率", f"本机 {channel.get('messages_per_s', 0):.1f} 条/秒 {format_bytes(channel.get('bytes_per_s', 0))}/秒  "
+                    f"全部 {stats.get('messages_per_s', 0):.1f} 条/秒 {format_bytes(stats.get('bytes_per_s', 0))}/秒"),
+        ("发送队列", f"{channel.get('queue_depth', 0)}/{channel.get('max_queue', 0)}  "
+                    f"最大 {channel.get('max_queue_depth', 0)}  策略 {channel.get('policy', '-')}"),
+        ("丢弃", f"本机 {channel.get('dropped', 0)}（合并 {channel.get('coalesced', 0)}）  "
+                f"全部 {stats.get('dropped', 0)}  发送错误 {channel.get('send_errors', 0)}"),
+        ("发送耗时", format_histogram(channel.get("send_ms"))),
+        ("图像发送", f"{images.get('sent', 0)} 张  失败 {images.get('failed', 0)}  "
+                    f"{format_bytes(images.get('bytes', 0))}  平均 {format_bytes(images.get('bytes_per_s', 0))}/秒  "
+                    f"图像连接 {images.get('connects', 0)} 次"),
+        ("图像发送耗时", format_histogram(images.get("time_ms"))),
+    ]
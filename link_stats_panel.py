@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+连接统计面板 - 实时显示接收端和发送端的连接与吞吐量统计，用于现场排查WiFi瓶颈
+功能：
+1. 接收端（本机）：连接/重连次数、最近的接收速率、消息间隔分布、缺失遥测、图像传输时间
+2. 发送端：每 STATS_REQUEST_INTERVAL 秒发送 get_link_stats 查询，显示发送速率、发送队列、丢弃数量、
+   sendall 耗时和图像发送耗时（发送耗时变长说明WiFi发送缓冲区已满）
+3. 只读取计数器和直方图的快照，文字有变化时才更新标签
+"""
+
+import time
+import tkinter as tk
+
+from link_stats import describe_receiver, describe_sender, STATS_REQUEST_INTERVAL
+
+REFRESH_INTERVAL = 1000  # 面板刷新间隔（毫秒）
+
+
+class LinkStatsPanel:
+    """两栏统计：接收端（本机）和发送端，每项一行"""
+
+    def __init__(self, parent, session):
+        self.session = session
+        self.last_request = 0.0
+        self.texts = {}  # 标签 -> 当前显示的文字
+        self.labels = {}
+        self.frame = tk.Frame(parent)
+        self.receiver_frame = self._create_section("接收端（本机）", describe_receiver(session.stats()))
+        self.sender_frame = self._create_section("发送端", describe_sender({}))
+        self.sender_age_label = tk.Label(self.sender_frame, text="", font=("Arial", 9), anchor="w", fg="gray")
+        self.sender_age_label.grid(row=self.sender_frame.grid_size()[1], column=0, columnspan=2, sticky="w")
+
+    def _create_section(self, title, lines):
+        frame = tk.LabelFrame(self.frame, text=title, font=("Arial", 10, "bold"))
+        frame.pack(fill="x", pady=5)
+        for row, (name, _) in enumerate(lines):
+            tk.Label(frame, text=f"{name}:", font=("Arial", 9), anchor="w").grid(row=row, column=0, sticky="w", padx=5)
+            label = tk.Label(frame, text="", font=("Consolas", 9), anchor="w")
+            label.grid(row=row, column=1, sticky="w")
+            self.labels[(title, name)] = label
+        return frame
+
+    def pack(self, **options):
+        self.frame.pack(**options)
+
+    def refresh(self):
+        """读取统计快照并更新文字（界面线程中定期调用），到时间时向发送端查询统计"""
+        now = time.time()
+        if now - self.last_request >= STATS_REQUEST_INTERVAL:
+            self.last_request = now
+            self.session.request_link_stats()
+
+        for name, text in describe_receiver(self.session.stats()):
+            self._set_text(("接收端（本机）", name), text)
+
+        state = self.session.state
+        if state.sender_stats_time:
+            for name, text in describe_sender(state.sender_stats):
+                self._set_text(("发送端", name), text)
+            age = now - state.sender_stats_time
+            age_text = f"{age:.0f} 秒前更新" if age >= STATS_REQUEST_INTERVAL * 3 else ""
+        elif state.command_connected:
+            age_text = "等待发送端回复（旧版本发送端不支持 get_link_stats）"
+        else:
+            age_text = "未连接到发送端"
+        self._set_text("age", age_text, self.sender_age_label)
+
+    def _set_text(self, key, text, label=None):
+        """文字有变化时才更新标签"""
+        if self.texts.get(key) != text:
+            self.texts[key] = text
+            (label or self.labels[key]).config(text=text)
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+有界日志面板 - 连续运行几天日志区也不会无限增长
+功能：
+1. 日志保存在固定长度的环形缓冲区（deque），界面最多显示 max_lines 行
+2. 任意线程只负责生成日志记录并入队，GUI主线程每帧把新日志合并为一次插入，超出的旧行从顶部一次删除
+   （行数在Python中计数，不再每次读取整个文本框）
+3. 按级别（调试/信息/警告/错误）着色和过滤，切换级别时从缓冲区重建显示
+4. 全部日志写入按大小轮换的日志文件（receiver_gui.log、receiver_gui.log.1 ...），界面中删掉的旧日志仍可在文件中查到
+5. 只有滚动条在底部时才自动滚动，查看历史日志时不会被新日志打断
+
+客户端库的日志只有文字，没有级别，classify() 按关键字判断级别（每张图像的日志为调试级别，默认不显示）
+"""
+
+import datetime
+import os
+import time
+import tkinter as tk
+from collections import deque
+from tkinter import ttk, scrolledtext
+
+DEFAULT_MAX_LINES = 2000  # 界面和缓冲区保留的日志行数
+DEFAULT_LOG_FILE_BYTES = 5 * 1024 * 1024  # 日志文件大小上限，超过后轮换
+DEFAULT_LOG_BACKUPS = 3  # 保留的旧日志文件个数
+
+LEVELS = ["DEBUG", "INFO", "WARNING", "ERROR"]
+LEVEL_ORDER = {level: index for index, level in enumerate(LEVELS)}
+LEVEL_NAMES = {"DEBUG": "调试", "INFO": "信息", "WARNING": "警告", "ERROR": "错误"}
+LEVEL_COLORS = {"DEBUG": "gray", "INFO": "black", "WARNING": "darkorange", "ERROR": "red"}
+
+# 按顺序匹配，先匹配到的级别生效
+LEVEL_KEYWORDS = [
+    ("ERROR", ("失败", "错误", "出错", "无法")),
+    ("WARNING", ("断开", "丢弃", "缺失", "不完整", "未连接", "警告")),
+    ("DEBUG", ("图像保存为", "准备接收图像", "图像接收完成", "等待发送端连接")),
+]
+
+
+def classify(message):
+    """按关键字判断日志级别"""
+    for level, keywords in LEVEL_KEYWORDS:
+        if any(keyword in message for keyword in keywords):
+            return level
+    return "INFO"
+
+
+def make_record(message, level=None):
+    """日志记录 (级别, 时间戳, 文字)，可在任意线程中生成"""
+    return (level or classify(message), time.time(), message)
+
+
+class RotatingLogFile:
+    """按大小轮换的日志文件：写满后 path -> path.1 -> path.2 ...，只保留 backups 个旧文件"""
+
+    def __init__(self, path, max_bytes=DEFAULT_LOG_FILE_BYTES, backups=DEFAULT_LOG_BACKUPS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.file = open(path, "ab")
+        self.size = self.file.tell()
+
+    def write(self, records):
+        """写入一批日志记录"""
+        data = "".join(f"{datetime.datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]} "
+                       f"[{level}] {message}\n" for level, timestamp, message in records).encode("utf-8")
+        if self.size and self.size + len(data) > self.max_bytes:
+            self.rotate()
+        self.file.write(data)
+        self.file.flush()
+        self.size += len(data)
+
+    def rotate(self):
+        self.file.close()
+        for index in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{index}"):
+                os.replace(f"{self.path}.{index}", f"{self.path}.{index + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        self.file = open(self.path, "wb")
+        self.size = 0
+
+    def close(self):
+        self.file.close()
+
+
+class LogPanel:
+    """日志区：工具栏（级别过滤、清空、警告/错误计数）+ 文本框"""
+
+    def __init__(self, parent, max_lines=DEFAULT_MAX_LINES, log_file=None, min_level="INFO",
+                 title="系统日志:", height=15):
+        self.max_lines = max(1, max_lines)
+        self.entries = deque(maxlen=self.max_lines)
+        self.min_level = LEVEL_ORDER[min_level]
+        self.shown = 0  # 文本框中的行数
+        self.counts = {level: 0 for level in LEVELS}
+        self.counts_text = ""
+        self.log_file = None
+        if log_file:
+            try:
+                self.log_file = RotatingLogFile(log_file)
+            except OSError as e:
+                print(f"无法打开日志文件 {log_file}: {e}")
+
+        self.frame = tk.Frame(parent)
+        toolbar = tk.Frame(self.frame)
+        toolbar.pack(fill="x", pady=(10, 5))
+        tk.Label(toolbar, text=title, font=("Arial", 10, "bold")).pack(side=tk.LEFT)
+        self.level_var = tk.StringVar(value=LEVEL_NAMES[min_level])
+        level_box = ttk.Combobox(toolbar, textvariable=self.level_var, state="readonly", width=6,
+                                 values=[LEVEL_NAMES[level] for level in LEVELS])
+        level_box.bind("<<ComboboxSelected>>", lambda event: self.set_level(self.level_from_name(self.level_var.get())))
+        tk.Button(toolbar, text="清空", command=self.clear).pack(side=tk.RIGHT)
+        level_box.pack(side=tk.RIGHT, padx=5)
+        tk.Label(toolbar, text="显示级别:").pack(side=tk.RIGHT)
+        self.counts_label = tk.Label(toolbar, text="", fg="darkorange")
+        self.counts_label.pack(side=tk.RIGHT, padx=10)
+
+        self.text = scrolledtext.ScrolledText(self.frame, height=height, width=80, font=("Consolas", 9))
+        self.text.pack(fill="both", expand=True)
+        for level, color in LEVEL_COLORS.items():
+            self.text.tag_configure(level, foreground=color)
+
+    @staticmethod
+    def level_from_name(name):
+        return next(level for level, label in LEVEL_NAMES.items() if label == name)
+
+    def pack(self, **options):
+        self.frame.pack(**options)
+
+    def extend(self, records):
+        """添加一批日志记录（GUI主线程中调用）"""
+        if not records:
+            return
+        self.entries.extend(records)
+        if self.log_file:
+            try:
+                self.log_file.write(records)
+            except OSError as e:
+                print(f"写入日志文件失败: {e}，不再写入日志文件")
+                self.log_file = None
+        for level, _, _ in records:
+            self.counts[level] += 1
+        visible = [record for record in records if LEVEL_ORDER[record[0]] >= self.min_level]
+        self._insert(visible[-self.max_lines:])
+        self._update_counts()
+
+    def _insert(self, records):
+        """合并为一次插入，超出 max_lines 的旧行一次删除"""
+        if not records:
+            return
+        at_bottom = self.text.yview()[1] >= 0.999
+        chunks = []
+        for level, timestamp, message in records:
+            # 每条记录占一行，行数计数才准确
+            message = message.replace("\n", " ")
+            chunks += [f"[{time.strftime('%H:%M:%S', time.localtime(timestamp))}] {message}\n", level]
+        self.text.insert(tk.END, *chunks)
+        self.shown += len(records)
+        if self.shown > self.max_lines:
+            self.text.delete("1.0", f"{self.shown - self.max_lines + 1}.0")
+            self.shown = self.max_lines
+        if at_bottom:
+            self.text.see(tk.END)
+
+    def _update_counts(self):
+        counts_text = "  ".join(f"{LEVEL_NAMES[level]} {self.counts[level]}"
+                                for level in ("WARNING", "ERROR") if self.counts[level])
+        if counts_text != self.counts_text:
+            self.counts_text = counts_text
+            self.counts_label.config(text=counts_text)
+
+    def set_level(self, level):
+        """修改显示级别，从缓冲区重建显示"""
+        self.min_level = LEVEL_ORDER[level]
+        self.text.delete("1.0", tk.END)
+        self.shown = 0
+        self._insert([record for record in self.entries if LEVEL_ORDER[record[0]] >= self.min_level])
+        self.text.see(tk.END)
+
+    def clear(self):
+        """清空显示和缓冲区（日志文件不受影响）"""
+        self.entries.clear()
+        self.text.delete("1.0", tk.END)
+        self.shown = 0
+
+    def close(self):
+        if self.log_file:
+            self.log_file.close()
+            self.log_file = None
+
+
+def add_log_arguments(parser, default_file):
+    """接收端GUI共用的日志参数"""
+    parser.add_argument('--log-lines', type=int, default=DEFAULT_MAX_LINES,
+                        help=f'日志区保留的行数（默认{DEFAULT_MAX_LINES}）')
+    parser.add_argument('--log-file', default=default_file,
+                        help=f'日志文件，超过5MB轮换（默认 {default_file}，空字符串表示不写文件）')
+    parser.add_argument('--log-level', choices=LEVELS, default="INFO",
+                        help='日志区默认显示的最低级别（默认INFO，每张图像的日志为DEBUG）')
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""
+MJPEG 实时预览服务 - 在发送端提供 multipart/x-mixed-replace 视频流
+功能：
+1. 浏览器访问 http://<发送端IP>:<端口>/ 即可实时预览
+2. 所有预览客户端共享 CameraManager 中已编码的同一帧，每帧只编码一次
+3. 可配置最大帧率，无人观看时不占用摄像头
+"""
+
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+BOUNDARY = "FRAME"
+
+INDEX_PAGE = """<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8"><title>实时预览</title></head>
+<body style="margin:0;background:#000;text-align:center">
+<img src="/stream.mjpg" style="max-width:100%;max-height:100vh">
+</body>
+</html>
+"""
+
+
+class MJPEGRequestHandler(BaseHTTPRequestHandler):
+    """处理预览页面、MJPEG流和单帧快照请求"""
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path in ("/", "/index.html"):
+            self._send_index()
+        elif url.path == "/stream.mjpg":
+            query = parse_qs(url.query)
+            fps = self.server.stream_server.max_fps
+            try:
+                if "fps" in query:
+                    fps = min(float(query["fps"][0]), fps)
+            except ValueError:
+                pass
+            self._send_stream(fps)
+        elif url.path == "/snapshot.jpg":
+            self._send_snapshot()
+        else:
+            self.send_error(404)
+
+    def _send_index(self):
+        content = INDEX_PAGE.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def _send_snapshot(self):
+        stream_server = self.server.stream_server
+        frame = stream_server.get_snapshot()
+        if not frame:
+            self.send_error(503, "摄像头不可用")
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Length", str(len(frame)))
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(frame)
+
+    def _send_stream(self, fps):
+        stream_server = self.server.stream_server
+        camera_manager = stream_server.camera_manager
+        min_interval = 1.0 / fps if fps > 0 else 0
+
+        self.send_response(200)
+        self.send_header("Content-Type", f"multipart/x-mixed-replace; boundary={BOUNDARY}")
+        self.send_header("Cache-Control", "no-cache, private")
+        self.send_header("Pragma", "no-cache")
+        self.end_headers()
+
+        stream_server.add_viewer()
+        try:
+            frame_id = 0
+            last_sent = 0
+            while stream_server.running:
+                # 只取最新帧，客户端较慢时自动跳过中间帧
+                new_id, frame = camera_manager.wait_for_frame(frame_id, timeout=1.0)
+                if frame is None:
+                    continue
+                frame_id = new_id
+
+                wait = min_interval - (time.time() - last_sent)
+                if wait > 0:
+                    time.sleep(wait)
+                    # 等待期间可能已有更新的帧
+                    frame_id, frame = camera_manager.get_latest_frame()
+
+                header = (f"--{BOUNDARY}\r\n"
+                          f"Content-Type: image/jpeg\r\n"
+                          f"Content-Length: {len(frame)}\r\n\r\n").encode("ascii")
+                self.wfile.write(header)
+                self.wfile.write(frame)
+                self.wfile.write(b"\r\n")
+                last_sent = time.time()
+        except (BrokenPipeError, ConnectionResetError, ConnectionAbortedError):
+            pass
+        finally:
+            stream_server.remove_viewer()
+
+    def log_message(self, format, *args):
+        # 预览请求较频繁，不输出默认的访问日志
+        pass
+
+
+class MJPEGStreamServer:
+    """MJPEG实时预览服务器，按需驱动摄像头采集并向所有客户端广播同一帧"""
+
+    def __init__(self, camera_manager, host='0.0.0.0', port=8080, max_fps=5.0):
+        self.camera_manager = camera_manager
+        self.host = host
+        self.port = port
+        self.max_fps = max_fps
+        self.running = False
+        self.viewer_count = 0
+        self.viewer_lock = threading.Lock()
+        self.viewer_event = threading.Event()
+        self.httpd = None
+
+    def start(self):
+        """启动HTTP服务线程和采集线程"""
+        try:
+            self.httpd = ThreadingHTTPServer((self.host, self.port), MJPEGRequestHandler)
+        except Exception as e:
+            print(f"实时预览服务启动失败: {e}")
+            return False
+
+        self.httpd.daemon_threads = True
+        self.httpd.stream_server = self
+        self.running = True
+
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        threading.Thread(target=self._capture_loop, daemon=True).start()
+        print(f"实时预览服务启动: http://{self.host}:{self.port}/ （最大帧率 {self.max_fps} fps）")
+        return True
+
+    def stop(self):
+        """停止服务"""
+        self.running = False
+        self.viewer_event.set()
+        if self.httpd:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
+
+    def set_max_fps(self, fps):
+        """设置最大帧率"""
+        self.max_fps = max(0.1, float(fps))
+
+    def add_viewer(self):
+        with self.viewer_lock:
+            self.viewer_count += 1
+            print(f"实时预览客户端连接，当前观看数: {self.viewer_count}")
+            self.viewer_event.set()
+
+    def remove_viewer(self):
+        with self.viewer_lock:
+            self.viewer_count -= 1
+            print(f"实时预览客户端断开，当前观看数: {self.viewer_count}")
+            if self.viewer_count <= 0:
+                self.viewer_event.clear()
+
+    def get_snapshot(self):
+        """返回一帧JPEG，优先复用足够新的缓存帧"""
+        _, frame = self.camera_manager.get_latest_frame(max_age=1.0 / self.max_fps)
+        if frame is None:
+            frame = self.camera_manager.capture_image(verbose=False)
+        return frame
+
+    def _capture_loop(self):
+        """有客户端观看时按最大帧率采集，帧由CameraManager统一编码并缓存"""
+        while self.running:
+            if not self.viewer_event.wait(timeout=1.0):
+                continue
+
+            start = time.time()
+            interval = 1.0 / self.max_fps
+            # 录像线程刚采集过的帧同样可以直接复用
+            _, frame = self.camera_manager.get_latest_frame(max_age=interval)
+            if frame is None:
+                if not self.camera_manager.capture_image(verbose=False):
+                    # 摄像头不可用时降低重试频率
+                    time.sleep(1.0)
+                    continue
+
+            elapsed = time.time() - start
+            if elapsed < interval:
+                time.sleep(interval - elapsed)
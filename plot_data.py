@@ -7,14 +7,22 @@ import sys
 import argparse
 import cv2
 import glob
+import io
 from PIL import Image
+from compression import split_compression_suffix, read_data_bytes
+from image_archive import ImageArchiveReader, find_archives
+from columnar_format import ColumnarReader, FILE_EXTENSION as COLUMNAR_EXTENSION
+from calibration import apply_calibration, needs_calibration, find_calibration
+from segments import MANIFEST_SUFFIX, segment_paths, parse_time_ns, load_manifest
 
 def parse_arguments():
     """
     解析命令行参数
     """
     parser = argparse.ArgumentParser(description='处理CSV数据并生成图表，可选择生成视频')
-    parser.add_argument('csv_file', help='CSV文件路径')
+    parser.add_argument('csv_file', help='CSV、列式数据文件(.scol)、压缩文件(.gz/.zst)或分段清单(.manifest.json)路径')
+    parser.add_argument('--start', help='只绘制该时间之后的数据，如 "2025-01-01 12:00:00"（清单文件只加载覆盖的分段）')
+    parser.add_argument('--end', help='只绘制该时间之前的数据')
     parser.add_argument('-v', '--video', choices=['y', 'n'], default='n', 
                        help='是否处理图片为视频 (y/n，默认为n)')
     
@@ -74,31 +82,65 @@ def remove_outliers(df, column, method='jump', threshold=3):
     
     return outlier_mask
 
+def data_file_prefix(data_file):
+    """
+    数据文件名前缀（不含扩展名），分段清单去掉 .manifest.json
+    """
+    name = os.path.basename(data_file)
+    if name.endswith(MANIFEST_SUFFIX):
+        return name[:-len(MANIFEST_SUFFIX)]
+    return os.path.splitext(name)[0]
+
+def iter_archive_images(readers):
+    """
+    按时间顺序解码图像存档中的所有帧
+    """
+    for reader in readers:
+        try:
+            for index in range(len(reader)):
+                yield f"{os.path.basename(reader.path)}#{index}", cv2.imdecode(
+                    np.frombuffer(reader.get(index), dtype=np.uint8), cv2.IMREAD_COLOR)
+        finally:
+            reader.close()
+
 def create_video_from_images(csv_file):
     """
-    将CSV文件同目录下的JPG图片合并成MP4视频
+    将CSV文件同目录下的图像存档或JPG图片合并成MP4视频
     
     Parameters:
     csv_file: CSV文件路径
     """
     # 获取CSV文件所在目录和文件名前缀
     csv_dir = os.path.dirname(csv_file)
-    csv_prefix = os.path.splitext(os.path.basename(csv_file))[0]
+    csv_prefix = data_file_prefix(csv_file)
     
-    # 查找同目录下以img开头的jpg文件
-    jpg_pattern = os.path.join(csv_dir, "img*.jpg")
-    jpg_files = glob.glob(jpg_pattern)
+    # 优先使用打包的图像存档，其次查找同目录下以img开头的jpg文件
+    archive_paths = find_archives(csv_dir)
+    if archive_paths:
+        readers = [ImageArchiveReader(path) for path in archive_paths]
+        total = sum(len(reader) for reader in readers)
+        print(f"找到 {len(readers)} 个图像存档，共 {total} 帧")
+        images = iter_archive_images(readers)
+    else:
+        jpg_pattern = os.path.join(csv_dir, "img*.jpg")
+        jpg_files = glob.glob(jpg_pattern)
+        
+        if not jpg_files:
+            print("未找到以img开头的JPG文件，跳过视频生成")
+            return
+        
+        # 按文件名排序
+        jpg_files.sort()
+        total = len(jpg_files)
+        print(f"找到 {total} 个以img开头的JPG文件")
+        images = ((jpg_file, cv2.imread(jpg_file)) for jpg_file in jpg_files)
     
-    if not jpg_files:
-        print("未找到以img开头的JPG文件，跳过视频生成")
+    if not total:
+        print("图像存档为空，跳过视频生成")
         return
     
-    # 按文件名排序
-    jpg_files.sort()
-    print(f"找到 {len(jpg_files)} 个以img开头的JPG文件")
-    
     # 读取第一张图片获取尺寸
-    first_image = cv2.imread(jpg_files[0])
+    _, first_image = next(images)
     if first_image is None:
         print("无法读取第一张图片")
         return
@@ -120,42 +162,105 @@ def create_video_from_images(csv_file):
         return
     
     # 逐帧写入视频
-    for i, jpg_file in enumerate(jpg_files):
-        image = cv2.imread(jpg_file)
+    video_writer.write(first_image)
+    for i, (image_name, image) in enumerate(images, start=1):
         if image is not None:
             # 确保图片尺寸一致
             if image.shape[:2] != (height, width):
                 image = cv2.resize(image, (width, height))
             video_writer.write(image)
             if (i + 1) % 10 == 0:  # 每10帧打印一次进度
-                print(f"已处理 {i + 1}/{len(jpg_files)} 张图片")
+                print(f"已处理 {i + 1}/{total} 张图片")
         else:
-            print(f"无法读取图片: {jpg_file}")
+            print(f"无法读取图片: {image_name}")
     
     # 释放资源
     video_writer.release()
     print(f"视频已保存: {output_video}")
 
-def plot_csv_data(csv_file):
+def ns_to_local_time(timestamps_ns):
+    """
+    整数纳秒时间戳转换为本地时间（不带时区），与CSV中的文本时间一致
+    """
+    local_tz = datetime.now().astimezone().tzinfo
+    timestamps = pd.to_datetime(timestamps_ns, unit='ns', utc=True)
+    return timestamps.dt.tz_convert(local_tz).dt.tz_localize(None)
+
+def load_data_file(data_file, start_ns=None, end_ns=None, calibration=None):
+    """
+    读取CSV或列式数据文件为DataFrame，timestamp列转换为datetime对象
+    压缩文件自动解压，只解压覆盖时间窗口的帧
+    只记录原始值的文件按标定参数换算出电压/电流列（列式文件使用文件头中的参数）
+    """
+    inner_path, compression = split_compression_suffix(data_file)
+    if inner_path.endswith(COLUMNAR_EXTENSION):
+        reader = ColumnarReader(data_file, start_ns, end_ns)
+        df = reader.to_dataframe()
+        reader.close()
+        df.insert(0, 'timestamp', ns_to_local_time(df.pop('timestamp_ns')))
+    else:
+        if compression:
+            # 正在写入的文件末尾可能有不完整的一行
+            data = read_data_bytes(data_file, start_ns, end_ns)
+            df = pd.read_csv(io.BytesIO(data[:data.rfind(b'\n') + 1]))
+        else:
+            df = pd.read_csv(data_file)
+        if 'timestamp_ns' in df.columns:
+            # 整数时间戳只在这里转换为时间，不经过字符串解析
+            df.insert(0, 'timestamp', ns_to_local_time(df.pop('timestamp_ns')))
+        else:
+            df['timestamp'] = pd.to_datetime(df['timestamp'])
+        if needs_calibration(df):
+            calibration = calibration or find_calibration(data_file)
+            if calibration is None:
+                print(f"警告: 未找到 {data_file} 的标定参数，使用默认参数换算")
+            apply_calibration(df, calibration)
+    return df
+
+def load_data(data_file, start=None, end=None):
+    """
+    读取数据文件；分段清单只加载覆盖时间窗口的分段并按时间拼接
+    """
+    start_ns = parse_time_ns(start)
+    end_ns = parse_time_ns(end)
+    if data_file.endswith(MANIFEST_SUFFIX):
+        paths = [path for path in segment_paths(data_file, start_ns, end_ns) if os.path.exists(path)]
+        if not paths:
+            raise ValueError("没有覆盖该时间窗口的分段")
+        print(f"加载 {len(paths)} 个分段")
+        calibration = load_manifest(data_file).get("metadata", {}).get("calibration")
+        df = pd.concat([load_data_file(path, start_ns, end_ns, calibration) for path in paths],
+                       ignore_index=True)
+    else:
+        df = load_data_file(data_file, start_ns, end_ns)
+    
+    if start_ns is not None:
+        df = df[df['timestamp'] >= pd.Timestamp(datetime.fromtimestamp(start_ns / 1e9))]
+    if end_ns is not None:
+        df = df[df['timestamp'] <= pd.Timestamp(datetime.fromtimestamp(end_ns / 1e9))]
+    return df.reset_index(drop=True)
+
+def plot_csv_data(csv_file, start=None, end=None):
     """
     读取CSV文件并为每一列绘制单独的图像
     横坐标为时间，第一帧为0秒，后面按照秒计算
     """
-    # 读取CSV文件
-    df = pd.read_csv(csv_file)
-    
-    # 转换时间戳为datetime对象
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    # 读取数据文件并转换时间戳
+    df = load_data(csv_file, start, end)
     
-    # 计算相对时间（从第一帧开始的秒数）
-    first_time = df['timestamp'].iloc[0]
-    df['relative_time'] = (df['timestamp'] - first_time).dt.total_seconds()
+    # 计算相对时间（从第一帧开始的秒数）；有单调时钟列时使用单调时钟，不受系统时间调整影响
+    if 'monotonic_ns' in df.columns:
+        df['relative_time'] = (df['monotonic_ns'] - df['monotonic_ns'].iloc[0]) / 1e9
+    else:
+        first_time = df['timestamp'].iloc[0]
+        df['relative_time'] = (df['timestamp'] - first_time).dt.total_seconds()
     
-    # 获取除了timestamp和relative_time之外的所有数据列，排除raw开头的列
-    data_columns = [col for col in df.columns if col not in ['timestamp', 'relative_time'] and not col.startswith('raw')]
+    # 获取除了时间列之外的所有数据列，排除raw开头的列
+    data_columns = [col for col in df.columns
+                    if col not in ['timestamp', 'relative_time', 'monotonic_ns'] and not col.startswith('raw')]
     
     # 获取CSV文件名前缀（不包括扩展名）和所在目录
-    csv_prefix = os.path.splitext(os.path.basename(csv_file))[0]
+    csv_prefix = data_file_prefix(csv_file)
     csv_dir = os.path.dirname(csv_file)
     
     # 为每一列创建单独的图像
@@ -208,7 +313,7 @@ if __name__ == "__main__":
     print(f"正在处理文件: {csv_file}")
     
     # 绘制数据图表
-    plot_csv_data(csv_file)
+    plot_csv_data(csv_file, args.start, args.end)
     
     # 根据命令行参数决定是否创建视频
     if create_video:
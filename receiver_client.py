@@ -0,0 +1,783 @@
+# -*- coding: utf-8 -*-
+"""
+接收端客户端库 - 与发送端的连接管理、状态同步和图像接收，不依赖tkinter
+功能：
+1. ReceiverClient 在后台线程中维护指令连接（断线重连、遥测补发）和图像服务器
+2. 解析发送端消息，维护 ReceiverState（连接状态、最新传感器数据、各记录模式及开始时间）
+3. 日志、状态变化、传感器样本、记录模式变化和新图像通过监听回调通知使用者（GUI或无界面守护进程）
+4. 统计接收的消息数、字节数、图像数和重连次数，最近的接收速率，消息间隔和图像传输时间的直方图
+5. request_link_stats() 向发送端查询连接统计（LINK_STATS：发送速率、丢弃数量、图像发送耗时），保存在 state.sender_stats
+
+监听回调 listener(event, value) 在网络线程中调用，GUI需要自行转到主线程：
+    ClientEvent.LOG     value为日志文字
+    ClientEvent.STATE   连接/运行状态已变化，value为None
+    ClientEvent.SENSOR  每个传感器样本 (time_ns, 字段)，字段为嵌套字典或展开后的 {"adc_data.channel0_voltage": 值}
+    ClientEvent.MODE    记录模式变化 (模式名, 是否开启)
+    ClientEvent.IMAGE   新保存的图像文件路径
+
+命令行用法（无界面守护进程，保存图像并定期输出统计）：
+    python receiver_client.py [发送端IP] [--image-dir 目录] [--stats-file receiver_stats.json] [--command start_monitoring]
+                              [--record 目录] [--rotate-mb 64] [--rotate-minutes 60]
+"""
+
+import argparse
+import datetime
+import json
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+
+from framing import LineReader
+from link_stats import RateMeter, Histogram, IMAGE_TIME_BOUNDS, MESSAGE_GAP_BOUNDS
+from telemetry import unflatten_fields
+
+# 图像接收配置
+IMAGE_HOST = '0.0.0.0'
+IMAGE_PORT = 8888
+
+# 指令发送配置
+SENDER_IP = '192.168.1.205'  # 发送端的IP地址，需要根据实际情况修改
+COMMAND_PORT = 8889
+
+IMAGE_RECV_BUFFER = 256 * 1024  # 图像连接接收缓冲区（字节）
+IMAGE_MEMORY_LIMIT = 8 * 1024 * 1024  # 超过该大小的图像边接收边写入磁盘
+RECONNECT_DELAY = 3  # 连接失败后重试间隔（秒）
+STATS_INTERVAL = 10  # 守护进程输出统计的间隔（秒）
+
+
+# 消息类型定义
+class MessageType:
+    STATUS = "STATUS"
+    RUNTIME_STATUS = "RUNTIME_STATUS"
+    GPIO_DATA = "GPIO_DATA"
+    TEMP_HUMIDITY = "TEMP_HUMIDITY"
+    SYSTEM_INFO = "SYSTEM_INFO"
+    TELEMETRY_STATS = "TELEMETRY_STATS"
+    TELEMETRY = "TELEMETRY"  # 订阅后按字段/频率聚合的遥测
+    LINK_STATS = "LINK_STATS"  # 发送端的连接和吞吐量统计
+
+
+# 客户端通知的事件类型
+class ClientEvent:
+    LOG = "LOG"
+    STATE = "STATE"
+    SENSOR = "SENSOR"
+    MODE = "MODE"
+    IMAGE = "IMAGE"
+
+
+# 记录模式 -> (开启指令, 停止指令)
+MODE_COMMANDS = {
+    "monitoring": ("start_monitoring", "stop_monitoring"),
+    "data_recording": ("cb", "cs"),
+    "combined": ("rcb", "rcs"),
+}
+
+# 发送端状态消息 -> (记录模式, 是否开启)
+STATUS_MODES = {
+    "DATA_MONITORING_STARTED": ("monitoring", True),
+    "DATA_MONITORING_STOPPED": ("monitoring", False),
+    "GPIO_MONITORING_STARTED": ("data_recording", True),
+    "GPIO_MONITORING_STOPPED": ("data_recording", False),
+    "TIMELAPSE_RECORDING_AND_GPIO_STARTED": ("combined", True),
+    "TIMELAPSE_RECORDING_AND_GPIO_STOPPED": ("combined", False),
+}
+
+
+class ReceiverState:
+    """一个发送端的连接和运行状态"""
+
+    def __init__(self):
+        self.command_connected = False
+        self.image_connected = False
+        self.last_runtime_status = ""
+        self.last_gpio_data = ""
+        self.last_temp_humidity = ""
+        self.latest_sensor_data = None  # 存储最新的传感器数据
+        self.latest_telemetry_window = None  # 订阅模式下最近一个聚合窗口的数据
+        self.telemetry_stats = {}  # 发送端上报的遥测发送统计（丢弃数量等）
+        self.sender_stats = {}  # 发送端的连接统计（get_link_stats 查询结果）
+        self.sender_stats_time = None  # 收到 sender_stats 的时间
+
+        # 遥测序号（跨重连保留，用于断线后请求补发）
+        self.telemetry_stream_id = ""
+        self.last_telemetry_seq = -1
+        self.missing_telemetry = 0  # 序号不连续的条数（发送端丢弃或超出补发范围）
+
+        # 各记录模式是否开启及开始时间
+        self.modes = {mode: False for mode in MODE_COMMANDS}
+        self.mode_start_times = {mode: None for mode in MODE_COMMANDS}
+
+    def reset_modes(self):
+        """重新连接后清空记录状态，等待发送端同步"""
+        for mode in MODE_COMMANDS:
+            self.modes[mode] = False
+            self.mode_start_times[mode] = None
+
+
+class SenderSession:
+    """一个发送端的会话：连接状态、消息处理、记录模式和统计，不涉及套接字的读写方式
+    子类负责连接，把收到的消息行交给 handle_lines()，并实现 write_command()"""
+
+    def __init__(self, sender_ip=SENDER_IP, command_port=COMMAND_PORT, image_dir="."):
+        self.sender_ip = sender_ip
+        self.command_port = command_port
+        self.image_dir = image_dir
+        self.state = ReceiverState()
+        self.listeners = []
+        self.connect_commands = []  # 每次连接成功后发送的指令
+
+        # 统计
+        self.started = None
+        self.connections = 0
+        self.messages = 0
+        self.bytes_received = 0
+        self.images = 0
+        self.image_bytes = 0
+        self.last_message_time = None
+        self.disconnects = 0
+        self.duplicates = 0  # 重复收到的遥测（补发与实时消息重叠）
+        self.incomplete_images = 0
+        self.traffic = RateMeter()
+        self.message_gaps = Histogram(MESSAGE_GAP_BOUNDS)  # 相邻两批消息的间隔（毫秒），WiFi卡顿时变长
+        self.image_times = Histogram(IMAGE_TIME_BOUNDS)  # 收到IMG_START到图像保存的时间（毫秒）
+
+    # ---- 通知 ----
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def emit(self, event, value=None):
+        for listener in self.listeners:
+            try:
+                listener(event, value)
+            except Exception as e:
+                print(f"接收端事件处理错误: {e}")
+
+    def log(self, message):
+        self.emit(ClientEvent.LOG, message)
+
+    # ---- 指令 ----
+
+    def send_command(self, command):
+        """发送指令到发送端，返回是否发送成功"""
+        if self.state.command_connected:
+            try:
+                self.write_command(f"{command}\n".encode())
+                self.log(f"已发送指令: {command}")
+                return True
+            except Exception as e:
+                self.log(f"发送指令失败: {e}，连接可能已断开")
+                self.state.command_connected = False
+                self.emit(ClientEvent.STATE)
+        else:
+            self.log("未连接到发送端，无法发送指令")
+        return False
+
+    def write_command(self, data):
+        """发送一条已编码的指令（含换行符），由子类实现"""
+        raise NotImplementedError
+
+    def request_link_stats(self):
+        """查询发送端的连接统计（定期调用，不写日志），返回是否已发送"""
+        if not self.state.command_connected:
+            return False
+        try:
+            self.write_command(b"get_link_stats\n")
+            return True
+        except Exception:
+            return False
+
+    def set_mode(self, mode, active, preserve_time=False):
+        """更新记录模式；preserve_time为True时保留已有的开始时间（状态同步），返回是否有变化"""
+        if self.state.modes[mode] == active:
+            return False
+        self.state.modes[mode] = active
+        if active:
+            if not preserve_time or not self.state.mode_start_times[mode]:
+                self.state.mode_start_times[mode] = datetime.datetime.now()
+        elif not preserve_time:
+            self.state.mode_start_times[mode] = None
+        self.emit(ClientEvent.MODE, (mode, active))
+        return True
+
+    def toggle_mode(self, mode):
+        """发送开启/停止指令并切换记录模式，返回切换后的状态"""
+        active = not self.state.modes[mode]
+        self.send_command(MODE_COMMANDS[mode][0 if active else 1])
+        self.set_mode(mode, active)
+        return active
+
+    # ---- 消息处理 ----
+
+    def handle_lines(self, lines):
+        """处理收到的一批消息行（bytes，不含换行符）"""
+        now = time.time()
+        nbytes = sum(len(line) for line in lines) + len(lines)
+        if self.last_message_time:
+            self.message_gaps.add((now - self.last_message_time) * 1000)
+        self.messages += len(lines)
+        self.bytes_received += nbytes
+        self.last_message_time = now
+        self.traffic.add(len(lines), nbytes, now)
+        for line in lines:
+            message = line.decode('utf-8').strip()
+
+            # 尝试解析JSON格式的消息
+            try:
+                msg_obj = json.loads(message)
+                self.process_structured_message(msg_obj)
+            except json.JSONDecodeError:
+                # 处理旧格式的消息
+                self.process_legacy_message(message)
+
+    def track_telemetry_seq(self, stream_id, seq, first_seq=None):
+        """记录最新遥测序号，返回False表示该消息已处理过；聚合消息覆盖first_seq到seq"""
+        state = self.state
+        if stream_id != state.telemetry_stream_id:
+            # 首次连接或发送端已重启，重新开始计数
+            state.telemetry_stream_id = stream_id
+            state.last_telemetry_seq = seq
+            return True
+
+        if seq <= state.last_telemetry_seq:
+            self.duplicates += 1
+            return False
+
+        first_seq = seq if first_seq is None else first_seq
+        if first_seq > state.last_telemetry_seq + 1:
+            state.missing_telemetry += first_seq - state.last_telemetry_seq - 1
+        state.last_telemetry_seq = seq
+        return True
+
+    def process_structured_message(self, msg_obj):
+        """处理结构化的JSON消息"""
+        state = self.state
+        msg_type = msg_obj.get("type", "")
+        data = msg_obj.get("data", {})
+
+        # 带序号的遥测消息：跳过重复，统计缺失
+        seq = msg_obj.get("seq")
+        first_seq = data.get("first_seq") if isinstance(data, dict) else None
+        if seq is not None and not self.track_telemetry_seq(msg_obj.get("stream", ""), seq, first_seq):
+            return
+
+        if msg_type == MessageType.RUNTIME_STATUS:
+            # 运行时状态信息 - 也包含传感器数据，更新latest_sensor_data
+            state.latest_sensor_data = data
+            self.emit(ClientEvent.SENSOR, (msg_obj.get("time_ns"), data))
+
+            data_recording = data.get("data_recording", "未知")
+            combined = data.get("combined", "未知")
+            i2c_str = "可用" if data.get("i2c_available", False) else "不可用"
+            state.last_runtime_status = f"数据记录:{data_recording}, 录像+数据:{combined}, I2C:{i2c_str}"
+
+            # 根据运行时状态同步记录状态
+            if data_recording == "是" and self.set_mode("data_recording", True, preserve_time=True):
+                self.log("[状态同步] 检测到正在记录数据，已同步按钮状态")
+            elif data_recording == "否":
+                self.set_mode("data_recording", False)
+
+            if combined == "是" and self.set_mode("combined", True, preserve_time=True):
+                self.log("[状态同步] 检测到正在录像+数据记录，已同步按钮状态")
+            elif combined == "否":
+                self.set_mode("combined", False)
+
+            # 同步数据监测状态（如果有任何数据记录在进行，通常数据监测也是开启的）
+            if (data_recording == "是" or combined == "是") and self.set_mode("monitoring", True, preserve_time=True):
+                self.log("[状态同步] 检测到数据监测已开启，已同步按钮状态")
+            self.emit(ClientEvent.STATE)
+
+        elif msg_type == MessageType.GPIO_DATA:
+            # GPIO数据信息（现在包含传感器数据）- 更新latest_sensor_data
+            state.latest_sensor_data = data
+            self.emit(ClientEvent.SENSOR, (msg_obj.get("time_ns"), data))
+
+            adc_data = data.get("adc_data", {})
+            env_data = data.get("env_data", {})
+
+            voltage = adc_data.get("channel0_voltage", 0) if adc_data else 0
+            current = adc_data.get("channel1_current", 0) if adc_data else 0
+            temperature = env_data.get("temperature") if env_data else None
+            humidity = env_data.get("humidity") if env_data else None
+
+            temp_str = f"{temperature:.1f}°C" if temperature is not None else "N/A"
+            hum_str = f"{humidity:.1f}%" if humidity is not None else "N/A"
+
+            state.last_gpio_data = f"电压:{voltage:.2f}V, 电流:{current:.2f}A, 温度:{temp_str}, 湿度:{hum_str}"
+            self.emit(ClientEvent.STATE)
+
+        elif msg_type == MessageType.STATUS:
+            # 处理状态变更消息，同步记录状态
+            status_data = data
+
+            # 在状态同步时，不更新开始时间，保持原有的记录时间连续性
+            preserve_time = False
+            if isinstance(status_data, str) and status_data.endswith("_SYNC"):
+                preserve_time = True
+                status_data = status_data.replace("_SYNC", "")
+
+            if status_data in STATUS_MODES:
+                mode, active = STATUS_MODES[status_data]
+                self.set_mode(mode, active, preserve_time)
+            self.emit(ClientEvent.STATE)
+
+            # 一般状态信息（同步状态时只提示已恢复，避免重复信息）
+            if not preserve_time:
+                self.log(f"[状态] {status_data}")
+            else:
+                self.log(f"[状态同步] 已恢复状态: {status_data}")
+
+        elif msg_type == MessageType.TEMP_HUMIDITY:
+            # 温湿度数据
+            temperature = data.get("temperature")
+            humidity = data.get("humidity")
+            temp_str = f"{temperature:.1f}°C" if temperature is not None else "N/A"
+            hum_str = f"{humidity:.1f}%" if humidity is not None else "N/A"
+            state.last_temp_humidity = f"温度:{temp_str}, 湿度:{hum_str}"
+            self.emit(ClientEvent.STATE)
+
+        elif msg_type == MessageType.TELEMETRY:
+            # 订阅模式的遥测：最新值/平均值可直接用于显示，最小最大值只保存窗口数据
+            state.latest_telemetry_window = data
+            self.emit(ClientEvent.SENSOR, (msg_obj.get("time_ns"), data.get("fields", {})))
+            if data.get("aggregate") != "minmax":
+                values = unflatten_fields(data.get("fields", {}))
+                merged = dict(state.latest_sensor_data or {})
+                for key, value in values.items():
+                    if isinstance(value, dict) and isinstance(merged.get(key), dict):
+                        merged[key] = {**merged[key], **value}
+                    else:
+                        merged[key] = value
+                state.latest_sensor_data = merged
+
+        elif msg_type == MessageType.TELEMETRY_STATS:
+            # 发送端遥测队列统计，网络拥塞丢弃数据时提示
+            previous_dropped = state.telemetry_stats.get("dropped", 0) if state.telemetry_stats else 0
+            state.telemetry_stats = data or {}
+            dropped = state.telemetry_stats.get("dropped", 0)
+            if dropped > previous_dropped:
+                self.log(f"[遥测] 网络拥塞，发送端丢弃 {dropped - previous_dropped} 条数据"
+                         f"（累计 {dropped}，策略: {state.telemetry_stats.get('policy')}）")
+
+        elif msg_type == MessageType.LINK_STATS:
+            # 发送端连接统计，由连接统计面板读取
+            state.sender_stats = data or {}
+            state.sender_stats_time = time.time()
+
+    def process_legacy_message(self, message):
+        """处理旧格式的消息（兼容性）"""
+        if message.startswith("STATUS:"):
+            status = message.split(":", 1)[1]
+            if status.startswith("RUNTIME_STATUS:"):
+                # 运行时状态信息
+                self.state.last_runtime_status = status.split(":", 1)[1]
+                self.emit(ClientEvent.STATE)
+            else:
+                # 其他状态信息
+                self.log(f"[状态] {status}")
+        elif message == "SENDER_READY":
+            self.log("[状态] 发送端已准备就绪")
+
+    # ---- 图像 ----
+
+    def image_path(self):
+        """图像文件路径，使用日期格式命名"""
+        current_time = datetime.datetime.now()
+        return os.path.join(self.image_dir, f'img_{current_time.strftime("%Y%m%d_%H%M%S")}.jpg')
+
+    def save_image(self, data):
+        """保存图像文件（data 可以是 bytes/bytearray/memoryview，不复制）"""
+        filename = self.image_path()
+        with open(filename, 'wb') as f:
+            f.write(data)
+        self.log(f"图像保存为: {filename}")
+        return filename
+
+    def note_image(self, filename, size, elapsed=None):
+        """统计并通知新保存的图像，elapsed 为传输时间（秒）"""
+        self.images += 1
+        self.image_bytes += size
+        if elapsed is not None:
+            self.image_times.add(elapsed * 1000)
+        self.emit(ClientEvent.IMAGE, filename)
+
+    # ---- 统计 ----
+
+    def stats(self):
+        """连接和接收统计"""
+        now = time.time()
+        uptime = now - self.started if self.started else 0
+        messages_per_s, bytes_per_s = self.traffic.rates(now)
+        return {
+            "sender": f"{self.sender_ip}:{self.command_port}",
+            "connected": self.state.command_connected,
+            "image_server": self.state.image_connected,
+            "uptime_s": round(uptime, 1),
+            "connections": self.connections,
+            "reconnects": max(0, self.connections - 1),
+            "disconnects": self.disconnects,
+            "messages": self.messages,
+            "bytes_received": self.bytes_received,
+            "messages_per_s": round(self.messages / uptime, 2) if uptime else 0,
+            "recent_messages_per_s": round(messages_per_s, 2),
+            "recent_bytes_per_s": round(bytes_per_s),
+            "message_gap_ms": self.message_gaps.snapshot(),
+            "last_message_age_s": round(now - self.last_message_time, 1) if self.last_message_time else None,
+            "missing_telemetry": self.state.missing_telemetry,
+            "duplicates": self.duplicates,
+            "images": self.images,
+            "image_bytes": self.image_bytes,
+            "incomplete_images": self.incomplete_images,
+            "image_time_ms": self.image_times.snapshot(),
+            "modes": dict(self.state.modes),
+            "sender_link": self.state.sender_stats,
+        }
+
+
+class ReceiverClient(SenderSession):
+    """连接一个发送端：指令/状态连接 + 图像服务器，均在后台线程中运行"""
+
+    def __init__(self, sender_ip=SENDER_IP, command_port=COMMAND_PORT,
+                 image_host=IMAGE_HOST, image_port=IMAGE_PORT, image_dir="."):
+        super().__init__(sender_ip, command_port, image_dir)
+        self.image_host = image_host
+        self.image_port = image_port
+        self.running = False
+        self.command_socket = None
+        self.server_socket = None
+        self.send_lock = threading.Lock()
+
+    # ---- 启动/停止 ----
+
+    def start(self):
+        """启动连接线程和图像服务器线程"""
+        self.running = True
+        self.started = time.time()
+        threading.Thread(target=self._connect_loop, daemon=True).start()
+        threading.Thread(target=self._image_loop, daemon=True).start()
+
+    def stop(self):
+        """停止后台线程并关闭连接（不向发送端发送退出指令）"""
+        self.running = False
+        for sock in (self.command_socket, self.server_socket):
+            if sock:
+                try:
+                    sock.close()
+                except Exception:
+                    pass
+
+    def write_command(self, data):
+        sock = self.command_socket
+        if not sock:
+            raise OSError("指令连接已关闭")
+        with self.send_lock:
+            sock.sendall(data)
+
+    # ---- 指令连接 ----
+
+    def _connect_loop(self):
+        """连接到发送端的指令接口，不停重试直到连接成功"""
+        while self.running:
+            if self.state.command_connected:
+                time.sleep(1)  # 已连接时等待1秒再检查
+                continue
+            sock = None
+            try:
+                self.log(f"正在尝试连接发送端指令接口 {self.sender_ip}:{self.command_port}...")
+                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                sock.settimeout(5)  # 设置连接超时
+
+                # 优化TCP参数以提高传输性能
+                try:
+                    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1024*1024)  # 1MB接收缓冲区
+                    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)  # 启用keepalive
+                    # TCP_NODELAY在某些系统上可能不可用
+                    try:
+                        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)  # 禁用Nagle算法
+                        tcp_optimized = True
+                    except Exception:
+                        tcp_optimized = False
+                except Exception:
+                    tcp_optimized = False
+
+                sock.connect((self.sender_ip, self.command_port))
+                self.command_socket = sock
+                self.state.command_connected = True
+                self.connections += 1
+
+                # 立即请求补发断线期间的遥测数据（首次连接时序号为-1，不补发）
+                sock.sendall(f"resume:{self.state.telemetry_stream_id or '-'}:{self.state.last_telemetry_seq}\n".encode())
+                self.log(f"已成功连接到发送端指令接口 {self.sender_ip}:{self.command_port}")
+                if tcp_optimized:
+                    self.log("TCP参数已优化: 1MB缓冲区, Keepalive, 无延迟")
+                else:
+                    self.log("TCP基础连接已建立")
+
+                # 连接成功后，清空运行状态并重置记录状态，准备从发送端同步最新状态
+                self.state.last_runtime_status = ""
+                self.state.reset_modes()
+                self.emit(ClientEvent.STATE)
+
+                # 监听状态消息
+                threading.Thread(target=self._listen_status, args=(sock,), daemon=True).start()
+
+                # 请求发送端当前状态更新
+                self.log("正在同步发送端状态...")
+                threading.Thread(target=self._request_status_sync, args=(sock,), daemon=True).start()
+
+            except Exception as e:
+                if not self.running:
+                    break
+                self.log(f"连接发送端失败: {e}，{RECONNECT_DELAY}秒后重试...")
+                self.state.command_connected = False
+                self.emit(ClientEvent.STATE)
+                if sock:
+                    try:
+                        sock.close()
+                    except Exception:
+                        pass
+                self.command_socket = None
+                time.sleep(RECONNECT_DELAY)
+
+    def _request_status_sync(self, sock):
+        """给发送端一点时间建立连接，然后请求状态同步并发送预设指令"""
+        time.sleep(1)  # 等待1秒确保连接稳定
+        if self.state.command_connected and self.command_socket is sock:
+            try:
+                # 请求状态同步（发送端会发送当前状态）
+                with self.send_lock:
+                    sock.sendall("sync_status\n".encode())
+            except Exception:
+                return
+            for command in self.connect_commands:
+                self.send_command(command)
+
+    def _listen_status(self, sock):
+        """监听发送端的状态消息"""
+        reader = LineReader(sock)
+
+        while self.running and self.state.command_connected:
+            try:
+                lines = reader.readlines()
+                if not lines:
+                    self.log("发送端断开连接，将尝试重新连接...")
+                    break
+
+                self.handle_lines(lines)
+
+            except Exception as e:
+                if self.running:
+                    self.log(f"状态监听错误: {e}，连接断开，将尝试重新连接...")
+                break
+
+        # 连接断开，设置状态
+        if self.command_socket is sock:
+            self.state.command_connected = False
+            self.command_socket = None
+            self.disconnects += 1
+            self.emit(ClientEvent.STATE)
+        try:
+            sock.close()
+        except Exception:
+            pass
+
+    # ---- 图像服务器 ----
+
+    def receive_image(self, conn, size, pending):
+        """接收 IMG_START 之后的 size 字节图像数据并保存，返回文件名，连接断开时返回None
+        pending 为接收缓冲区中已经收到的图像数据。小图像直接接收到预分配的 bytearray，大图像边接收边写入磁盘。"""
+        began = time.perf_counter()
+        if size <= IMAGE_MEMORY_LIMIT:
+            image = bytearray(size)
+            view = memoryview(image)
+            received = len(pending)
+            view[:received] = pending
+            while received < size and self.running:
+                count = conn.recv_into(view[received:])
+                if not count:
+                    break
+                received += count
+            if received < size:
+                self.incomplete_images += 1
+                return None
+            filename = self.save_image(image)
+        else:
+            filename = self.image_path()
+            temp_path = filename + ".part"
+            chunk_view = memoryview(bytearray(IMAGE_RECV_BUFFER))
+            received = len(pending)
+            with open(temp_path, 'wb') as f:
+                f.write(pending)
+                while received < size and self.running:
+                    count = conn.recv_into(chunk_view[:min(len(chunk_view), size - received)])
+                    if not count:
+                        break
+                    f.write(chunk_view[:count])
+                    received += count
+            if received < size:
+                os.remove(temp_path)
+                self.incomplete_images += 1
+                return None
+            os.replace(temp_path, filename)
+            self.log(f"图像保存为: {filename}（边接收边写入 {size} 字节）")
+
+        self.note_image(filename, size, time.perf_counter() - began)
+        return filename
+
+    def _setup_image_server(self):
+        """设置图像服务器，重试5次"""
+        retry_count = 0
+        while self.running and retry_count < 5:
+            server_socket = None
+            try:
+                self.log(f"正在设置图像服务器，监听端口: {self.image_port}...")
+                server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                server_socket.bind((self.image_host, self.image_port))
+                server_socket.listen(1)
+                server_socket.settimeout(1.0)  # 定期检查是否停止
+                self.state.image_connected = True
+                self.emit(ClientEvent.STATE)
+                self.log(f"图像服务器已启动，监听端口: {self.image_port}")
+                return server_socket
+            except Exception as e:
+                self.log(f"图像服务器启动失败: {e}，{RECONNECT_DELAY}秒后重试...")
+                if server_socket:
+                    server_socket.close()
+                time.sleep(RECONNECT_DELAY)
+                retry_count += 1
+        return None
+
+    def _image_loop(self):
+        """处理图像连接"""
+        self.server_socket = self._setup_image_server()
+        if not self.server_socket:
+            self.log("无法启动图像服务器")
+            return
+
+        waiting = True
+        while self.running:
+            try:
+                if waiting:
+                    self.log("等待发送端连接图像服务器...")
+                    waiting = False
+                try:
+                    conn, addr = self.server_socket.accept()
+                except socket.timeout:
+                    continue
+                waiting = True
+                self.log(f"发送端已连接: {addr}")
+                with conn:
+                    self._receive_images(conn)
+            except Exception as e:
+                if self.running:
+                    self.log(f"图像服务器接受连接时出错: {e}")
+                    time.sleep(1)
+
+        self.state.image_connected = False
+        self.emit(ClientEvent.STATE)
+
+    def _receive_images(self, conn):
+        """读取一个图像连接直到断开"""
+        # 头部行和与其一起收到的图像数据都在同一个接收缓冲区中
+        reader = LineReader(conn, IMAGE_RECV_BUFFER, max_frame=IMAGE_RECV_BUFFER)
+        while self.running:
+            try:
+                raw_line = reader.readline()
+                if raw_line is None:
+                    self.log("图像连接断开，等待重新连接...")
+                    return
+                line = raw_line.decode().strip()
+
+                if line.startswith("IMG_START:"):
+                    size = int(line.split(":")[1])
+                    self.log(f"准备接收图像，共 {size} 字节")
+                    # 与头部一起收到的图像数据先从缓冲区取出
+                    if self.receive_image(conn, size, reader.take(size)) is None:
+                        if self.running:
+                            self.log("图像连接断开，图像接收不完整，等待重新连接...")
+                        return
+                elif line == "IMG_END":
+                    self.log("图像接收完成")
+
+            except Exception as e:
+                if self.running:
+                    self.log(f"接收图像数据时出错: {e}，连接断开，等待重新连接...")
+                return
+
+
+def write_stats(path, stats):
+    """写入临时文件后原子替换，供监控程序读取"""
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(stats, f, ensure_ascii=False, indent=1)
+    os.replace(temp_path, path)
+
+
+def parse_arguments():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description='无界面接收端：连接发送端，保存图像并输出统计')
+    parser.add_argument('sender', nargs='?', default=SENDER_IP, help=f'发送端IP（默认 {SENDER_IP}）')
+    parser.add_argument('--port', type=int, default=COMMAND_PORT, help='发送端指令端口')
+    parser.add_argument('--image-port', type=int, default=IMAGE_PORT, help='本机图像服务器端口')
+    parser.add_argument('--image-dir', default='.', help='图像保存目录（默认当前目录）')
+    parser.add_argument('--stats-file', help='定期写入统计信息的JSON文件')
+    parser.add_argument('--stats-interval', type=float, default=STATS_INTERVAL, help='统计输出间隔（秒）')
+    parser.add_argument('--command', action='append', default=[],
+                        help='每次连接成功后发送的指令，可重复，如 --command start_monitoring')
+    parser.add_argument('--quiet', action='store_true', help='不输出连接和图像日志')
+    add_record_arguments(parser)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    from telemetry_recorder import add_record_arguments, open_recorder
+
+    args = parse_arguments()
+
+    if not os.path.isdir(args.image_dir):
+        print(f"错误: 目录 {args.image_dir} 不存在")
+        sys.exit(1)
+
+    client = ReceiverClient(args.sender, args.port, IMAGE_HOST, args.image_port, args.image_dir)
+    client.connect_commands = args.command
+
+    def print_event(event, value):
+        if event == ClientEvent.LOG and not args.quiet:
+            print(f"[{datetime.datetime.now().strftime('%H:%M:%S')}] {value}", flush=True)
+
+    client.add_listener(print_event)
+    recorder = open_recorder(args, args.sender)
+    if recorder is False:
+        sys.exit(1)
+    if recorder:
+        client.add_listener(recorder.on_client_event)
+    signal.signal(signal.SIGTERM, lambda signum, frame: client.stop())
+    client.start()
+
+    try:
+        while client.running:
+            # 顺便查询发送端的连接统计，下一次输出时写入统计文件（sender_link）
+            client.request_link_stats()
+            time.sleep(args.stats_interval)
+            stats = client.stats()
+            if recorder:
+                stats["recorder"] = recorder.stats()
+            print(f"[统计] 连接:{'是' if stats['connected'] else '否'} 重连:{stats['reconnects']} "
+                  f"消息:{stats['messages']} ({stats['recent_messages_per_s']}/秒, {stats['recent_bytes_per_s']}字节/秒) "
+                  f"图像:{stats['images']} 缺失遥测:{stats['missing_telemetry']}", flush=True)
+            if recorder:
+                print(f"[统计] {recorder.summary()}", flush=True)
+            if args.stats_file:
+                write_stats(args.stats_file, stats)
+    except KeyboardInterrupt:
+        print("\n用户中断程序...")
+    finally:
+        client.stop()
+        if recorder:
+            recorder.close()
+            print(recorder.summary())
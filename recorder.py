@@ -0,0 +1,456 @@
+# -*- coding: utf-8 -*-
+"""
+传感器数据记录器 - 后台线程批量写入CSV或二进制列式文件
+功能：
+1. 采集线程只把数据行放入队列，由后台线程写文件
+2. 可配置的持久化策略：每N行刷新、每T毫秒刷新、或仅在停止时刷新
+3. 可选的定期fsync，保证掉电时最多丢失一个周期的数据
+4. 统计写入吞吐量和刷新耗时
+5. 按大小/时长/行数自动切换分段文件，并维护分段清单
+6. 可选gzip/zstd分帧流式压缩
+7. 可只记录原始ADC值，标定参数写入文件头和分段清单
+"""
+
+import csv
+import datetime
+import io
+import os
+import threading
+import time
+from collections import deque
+
+from compression import FramedCompressedWriter, COMPRESSIONS
+from columnar_format import ColumnarWriter, SENSOR_SCHEMA, CSV_TIMESTAMP_FORMAT
+from segments import SegmentManifest, manifest_path_for, segment_path_for
+
+DEFAULT_FLUSH_ROWS = 50           # 每50行刷新一次（0表示不按行数刷新）
+DEFAULT_FLUSH_INTERVAL_MS = 1000  # 每1000毫秒刷新一次（0表示不按时间刷新）
+DEFAULT_FSYNC_INTERVAL = 0        # fsync间隔（秒），0表示仅在停止时fsync
+DEFAULT_ROTATE_BYTES = 64 * 1024 * 1024  # 分段大小上限（字节），0表示不按大小切换
+DEFAULT_ROTATE_SECONDS = 3600     # 分段时长上限（秒），0表示不按时长切换
+DEFAULT_ROTATE_ROWS = 0           # 分段行数上限，0表示不按行数切换
+WRITE_BUFFER_SIZE = 64 * 1024
+COLUMNAR_CHUNK_ROWS = 4096        # 列式文件每个数据块的最大行数
+
+
+class BufferedRecorder:
+    """后台线程写入的记录器基类，按持久化策略分组提交，子类负责文件格式"""
+
+    # 数据行第一列使用的时间戳字段（sensor_data中的键）
+    timestamp_key = "timestamp"
+    data_format = None
+
+    def __init__(self, path, headers, flush_rows=DEFAULT_FLUSH_ROWS,
+                 flush_interval_ms=DEFAULT_FLUSH_INTERVAL_MS, fsync_interval=DEFAULT_FSYNC_INTERVAL,
+                 rotate_bytes=0, rotate_seconds=0, rotate_rows=0, compression=None,
+                 row_indices=None, metadata=None):
+        # 未启用分段时只写一个文件 path；启用后写 path_0001、path_0002 ...
+        # 启用压缩时每个文件再加上 .gz / .zst 扩展名
+        self.base_path = path
+        self.path = path
+        self.headers = headers
+        # 只记录输入行中的部分列（与headers对应），None表示全部
+        self.row_indices = row_indices
+        self.compression = compression
+        self.compress_suffix = COMPRESSIONS[compression] if compression else ""
+        self.condition = threading.Condition()
+        self.pending = deque()
+        self.closed = False
+        self.set_policy(flush_rows, flush_interval_ms, fsync_interval)
+
+        # 统计
+        self.start_time = time.time()
+        self.rows_written = 0
+        self.bytes_written = 0
+        self.flush_count = 0
+        self.flush_time_total = 0.0
+        self.flush_time_max = 0.0
+        self.fsync_count = 0
+        self.fsync_time_total = 0.0
+        self.fsync_time_max = 0.0
+        self.max_pending = 0
+        self.write_errors = 0
+
+        # 分段
+        self.rotate_bytes = max(0, int(rotate_bytes))
+        self.rotate_seconds = max(0, float(rotate_seconds))
+        self.rotate_rows = max(0, int(rotate_rows))
+        self.rotating = bool(self.rotate_bytes or self.rotate_seconds or self.rotate_rows)
+        self.rotate_failed = False
+        manifest_metadata = dict(metadata or {})
+        if compression:
+            manifest_metadata["compression"] = compression
+        self.manifest = SegmentManifest(manifest_path_for(path), self.data_format, self.describe_rotation(),
+                                        manifest_metadata or None)
+        self.segment_index = 0
+        self._begin_segment()
+
+        self.last_flush_time = time.time()
+        self.last_fsync_time = time.time()
+        self.rows_since_flush = 0
+        self.dirty_since_fsync = False
+
+        self.thread = threading.Thread(target=self._writer_loop, daemon=True)
+        self.thread.start()
+
+    def set_policy(self, flush_rows=None, flush_interval_ms=None, fsync_interval=None):
+        """修改持久化策略，未指定的参数保持不变"""
+        with self.condition:
+            if flush_rows is not None:
+                self.flush_rows = max(0, int(flush_rows))
+            if flush_interval_ms is not None:
+                self.flush_interval = max(0, float(flush_interval_ms)) / 1000.0
+            if fsync_interval is not None:
+                self.fsync_interval = max(0, float(fsync_interval))
+            self.condition.notify_all()
+
+    def describe_policy(self):
+        return {"flush_rows": self.flush_rows,
+                "flush_interval_ms": int(self.flush_interval * 1000),
+                "fsync_interval": self.fsync_interval}
+
+    def describe_rotation(self):
+        return {"bytes": self.rotate_bytes,
+                "seconds": self.rotate_seconds,
+                "rows": self.rotate_rows}
+
+    def write_row(self, row):
+        """数据行入队，立即返回"""
+        if self.row_indices:
+            row = [row[index] for index in self.row_indices]
+        with self.condition:
+            if self.closed:
+                return False
+            self.pending.append(row)
+            if len(self.pending) > self.max_pending:
+                self.max_pending = len(self.pending)
+            self.condition.notify_all()
+        return True
+
+    def close(self):
+        """写完队列中剩余的数据，刷新并fsync后关闭文件（切换分段失败后也等待写入线程结束）"""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.thread.join()
+
+    def stats(self):
+        """返回吞吐量和刷新耗时统计"""
+        elapsed = max(time.time() - self.start_time, 1e-6)
+        with self.condition:
+            pending = len(self.pending)
+        return {
+            "path": self.path,
+            "rows_written": self.rows_written,
+            "bytes_written": self.bytes_written,
+            "rows_per_sec": round(self.rows_written / elapsed, 2),
+            "pending": pending,
+            "max_pending": self.max_pending,
+            "flush_count": self.flush_count,
+            "flush_avg_ms": round(self.flush_time_total * 1000 / self.flush_count, 3) if self.flush_count else 0,
+            "flush_max_ms": round(self.flush_time_max * 1000, 3),
+            "fsync_count": self.fsync_count,
+            "fsync_avg_ms": round(self.fsync_time_total * 1000 / self.fsync_count, 3) if self.fsync_count else 0,
+            "fsync_max_ms": round(self.fsync_time_max * 1000, 3),
+            "write_errors": self.write_errors,
+            "policy": self.describe_policy(),
+            "segment": self.segment_index,
+            "manifest": self.manifest.path,
+            "rotation": self.describe_rotation()
+        }
+
+    def _next_deadline(self, now):
+        """距离下一次按时间刷新或fsync的秒数"""
+        timeouts = [0.5]
+        if self.rows_since_flush and self.flush_interval:
+            timeouts.append(self.last_flush_time + self.flush_interval - now)
+        if self.dirty_since_fsync and self.fsync_interval:
+            timeouts.append(self.last_fsync_time + self.fsync_interval - now)
+        return max(0.0, min(timeouts))
+
+    def _writer_loop(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.closed or self.pending,
+                                        self._next_deadline(time.time()))
+                rows = list(self.pending)
+                self.pending.clear()
+                closing = self.closed
+
+            if rows and not self.rotate_failed:
+                self._write_batch(rows)
+            if self.rotate_failed:
+                # 之前的分段已完整关闭，不再写入；清单标记为结束
+                self._save_manifest(finished=True)
+                break
+
+            now = time.time()
+            if closing:
+                self._end_segment(now)
+                self._save_manifest(finished=True)
+                break
+
+            if self.segment_rows and self._rotation_due(now):
+                self._rotate(now)
+                continue
+
+            flush_due = (self.rows_since_flush and
+                         ((self.flush_rows and self.rows_since_flush >= self.flush_rows) or
+                          (self.flush_interval and now - self.last_flush_time >= self.flush_interval)))
+            if flush_due:
+                self._flush(now)
+            if (self.fsync_interval and self.dirty_since_fsync
+                    and now - self.last_fsync_time >= self.fsync_interval):
+                self._fsync(now)
+
+    def _begin_segment(self):
+        """打开下一个分段文件并登记到清单"""
+        self.segment_index += 1
+        path = segment_path_for(self.base_path, self.segment_index) if self.rotating else self.base_path
+        self.path = path + self.compress_suffix
+        self.segment_rows = 0
+        self.segment_start_bytes = self.bytes_written
+        self.segment_opened = time.time()
+        self.segment_first_ns = None
+        self.flushed = None
+        self._open_file()
+        self.manifest.begin_segment(self.path, self.segment_index)
+        self._save_manifest()
+
+    def _end_segment(self, now):
+        """刷新并关闭当前分段"""
+        self._flush(now)
+        self._fsync(now)
+        self._close_file()
+        self.manifest.update_segment(bytes=self.bytes_written - self.segment_start_bytes, complete=True)
+
+    def _rotate(self, now):
+        self._end_segment(now)
+        try:
+            self._begin_segment()
+        except Exception as e:
+            # 无法创建新分段（如磁盘已满）时停止记录，剩余数据计入写入错误
+            self.write_errors += 1
+            print(f"切换分段文件错误，停止记录: {e}")
+            self.rotate_failed = True
+            with self.condition:
+                self.closed = True
+            return
+        print(f"记录切换到分段 {self.segment_index}: {self.path}")
+
+    def _rotation_due(self, now):
+        return ((self.rotate_rows and self.segment_rows >= self.rotate_rows) or
+                (self.rotate_bytes and self.bytes_written - self.segment_start_bytes >= self.rotate_bytes) or
+                (self.rotate_seconds and now - self.segment_opened >= self.rotate_seconds))
+
+    def _write_batch(self, rows):
+        """写入一批数据行，按行数切分时批次可能跨越多个分段"""
+        while rows:
+            if self.rotate_rows:
+                room = max(1, self.rotate_rows - self.segment_rows)
+                batch, rows = rows[:room], rows[room:]
+            else:
+                batch, rows = rows, []
+            self._write_rows(batch)
+            self._note_rows(batch)
+            if rows:
+                self._rotate(time.time())
+                if self.rotate_failed:
+                    break
+
+    def _note_rows(self, rows):
+        """更新当前分段的行数和时间范围"""
+        self.segment_rows += len(rows)
+        try:
+            if self.segment_first_ns is None:
+                self.segment_first_ns = self._row_time_ns(rows[0])
+            self.manifest.update_segment(start_ns=self.segment_first_ns,
+                                         end_ns=self._row_time_ns(rows[-1]),
+                                         rows=self.segment_rows,
+                                         bytes=self.bytes_written - self.segment_start_bytes)
+        except (ValueError, TypeError) as e:
+            print(f"无法解析数据行时间戳: {e}")
+
+    def _save_manifest(self, finished=False):
+        try:
+            if finished:
+                self.manifest.finish()
+            else:
+                self.manifest.save()
+        except Exception as e:
+            self.write_errors += 1
+            print(f"保存分段清单错误: {e}")
+
+    def _row_time_ns(self, row):
+        raise NotImplementedError
+
+    def _open_output(self):
+        """打开当前分段的底层输出文件（普通文件或分帧压缩文件）"""
+        if self.compression:
+            return FramedCompressedWriter(self.path, self.compression)
+        return open(self.path, 'wb', buffering=WRITE_BUFFER_SIZE)
+
+    def _end_header(self):
+        """文件头写完后单独成帧，按时间窗口读取时总能取到文件头"""
+        if self.compression:
+            self.output.end_frame()
+
+    def _frame_rows(self, rows):
+        """登记刚写入底层文件的数据行，压缩时每满一帧结束该帧"""
+        if not self.compression or not rows:
+            return
+        self.output.note_rows(len(rows), self._row_time_ns(rows[0]), self._row_time_ns(rows[-1]))
+        if self.output.frame_full():
+            self.output.end_frame()
+
+    def _open_file(self):
+        raise NotImplementedError
+
+    def _close_file(self):
+        self.file.close()
+
+    def _write_rows(self, rows):
+        raise NotImplementedError
+
+    def _before_flush(self):
+        """刷新前写出仍在内存中的数据"""
+        pass
+
+    def _flushed_offset(self):
+        """刷新后完整数据行结束处的文件偏移，恢复时从这里开始统计行数；不适用时为None"""
+        return None
+
+    def _flush(self, now):
+        if not self.rows_since_flush:
+            return
+        start = time.perf_counter()
+        try:
+            self._before_flush()
+            self.file.flush()
+        except Exception as e:
+            self.write_errors += 1
+            print(f"刷新记录文件错误: {e}")
+            return
+        elapsed = time.perf_counter() - start
+        self.flush_count += 1
+        self.flush_time_total += elapsed
+        self.flush_time_max = max(self.flush_time_max, elapsed)
+        self.rows_since_flush = 0
+        self.last_flush_time = now
+        self.dirty_since_fsync = True
+        # 已写入文件的进度（分段文件名, 分段行数, 文件偏移），供会话日志检查点使用
+        self.flushed = (os.path.basename(self.path), self.segment_rows, self._flushed_offset())
+
+    def _fsync(self, now):
+        if not self.dirty_since_fsync:
+            return
+        start = time.perf_counter()
+        try:
+            os.fsync(self.file.fileno())
+        except Exception as e:
+            self.write_errors += 1
+            print(f"同步记录文件到磁盘错误: {e}")
+            return
+        elapsed = time.perf_counter() - start
+        self.fsync_count += 1
+        self.fsync_time_total += elapsed
+        self.fsync_time_max = max(self.fsync_time_max, elapsed)
+        self.dirty_since_fsync = False
+        self.last_fsync_time = now
+        # 数据已落盘，同步更新清单中的行数和时间范围
+        self._save_manifest()
+
+
+class CSVRecorder(BufferedRecorder):
+    """CSV格式记录器；integer_timestamps为True时第一列为整数纳秒时间戳（timestamp_ns），不做时间格式化"""
+
+    data_format = "csv"
+
+    def __init__(self, path, headers, integer_timestamps=False, **options):
+        if integer_timestamps:
+            self.timestamp_key = "timestamp_ns"
+        super().__init__(path, headers, **options)
+
+    def _open_file(self):
+        # 每批数据行先格式化到内存缓冲区，再一次性写入文件
+        self.text_buffer = io.StringIO()
+        self.writer = csv.writer(self.text_buffer)
+        self.output = self.file = self._open_output()
+        self.writer.writerow(self.headers)
+        self.file.write(self._take_text())
+        self._end_header()
+        self.file.flush()
+
+    def _row_time_ns(self, row):
+        if self.timestamp_key == "timestamp_ns":
+            return int(row[0])
+        moment = datetime.datetime.strptime(row[0], CSV_TIMESTAMP_FORMAT)
+        return int(round(moment.timestamp() * 1000)) * 1000000
+
+    def _flushed_offset(self):
+        # 压缩文件按帧索引恢复行数，不需要偏移
+        return None if self.compression else self.file.tell()
+
+    def _take_text(self):
+        data = self.text_buffer.getvalue().encode('utf-8')
+        self.text_buffer.seek(0)
+        self.text_buffer.truncate()
+        return data
+
+    def _write_rows(self, rows):
+        try:
+            self.writer.writerows(rows)
+            data = self._take_text()
+            self.file.write(data)
+            self.bytes_written += len(data)
+            self.rows_written += len(rows)
+            self.rows_since_flush += len(rows)
+            self._frame_rows(rows)
+        except Exception as e:
+            self.write_errors += 1
+            print(f"保存CSV数据错误: {e}")
+
+
+class ColumnarRecorder(BufferedRecorder):
+    """二进制列式格式记录器（.scol），每次刷新写出一个完整数据块"""
+
+    timestamp_key = "timestamp_ns"
+    data_format = "columnar"
+
+    def __init__(self, path, schema=SENSOR_SCHEMA, metadata=None, **options):
+        self.schema = schema
+        self.metadata = metadata
+        self.chunk_rows = []
+        super().__init__(path, [name for name, _ in schema], metadata=metadata, **options)
+
+    def _row_time_ns(self, row):
+        return int(row[0])
+
+    def _open_file(self):
+        self.output = self._open_output()
+        self.file = ColumnarWriter(self.path, self.schema, self.metadata, fileobj=self.output)
+        self._end_header()
+        self.file.flush()
+
+    def _write_chunk(self):
+        rows, self.chunk_rows = self.chunk_rows, []
+        try:
+            self.bytes_written += self.file.write_chunk(rows)
+            self._frame_rows(rows)
+        except Exception as e:
+            self.write_errors += 1
+            print(f"保存列式数据错误: {e}")
+
+    def _write_rows(self, rows):
+        self.chunk_rows.extend(rows)
+        self.rows_written += len(rows)
+        self.rows_since_flush += len(rows)
+        while len(self.chunk_rows) >= COLUMNAR_CHUNK_ROWS:
+            rest = self.chunk_rows[COLUMNAR_CHUNK_ROWS:]
+            self.chunk_rows = self.chunk_rows[:COLUMNAR_CHUNK_ROWS]
+            self._write_chunk()
+            self.chunk_rows = rest
+
+    def _before_flush(self):
+        if self.chunk_rows:
+            self._write_chunk()
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+记录分段清单 - 长时间记录按大小/时长/行数切分为多个分段文件
+功能：
+1. 记录器每切换一个分段就更新清单文件（原子替换，断电时不会留下半个JSON）
+2. 清单列出每个分段的文件名、时间范围（纳秒）、行数和字节数
+3. 下游工具按时间窗口只加载覆盖该窗口的分段
+
+文件命名（启用分段时）：
+    data_YYYYMMDD_HHMMSS_0001.csv, data_YYYYMMDD_HHMMSS_0002.csv, ...
+    data_YYYYMMDD_HHMMSS.manifest.json
+
+命令行用法：
+    python segments.py data_20250101_120000.manifest.json [--start "2025-01-01 12:00:00"] [--end ...]
+"""
+
+import argparse
+import datetime
+import json
+import os
+import sys
+
+MANIFEST_SUFFIX = ".manifest.json"
+MANIFEST_VERSION = 1
+TIME_FORMATS = ("%Y-%m-%d %H:%M:%S.%f", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d")
+
+
+def manifest_path_for(base_path):
+    """数据文件基础路径（不含分段序号）对应的清单路径"""
+    return os.path.splitext(base_path)[0] + MANIFEST_SUFFIX
+
+
+def segment_path_for(base_path, index):
+    """第index个分段的文件路径"""
+    stem, ext = os.path.splitext(base_path)
+    return f"{stem}_{index:04d}{ext}"
+
+
+def parse_time_ns(text):
+    """将本地时间字符串或纳秒整数解析为纳秒时间戳"""
+    if text is None:
+        return None
+    text = str(text).strip()
+    if text.isdigit():
+        return int(text)
+    for fmt in TIME_FORMATS:
+        try:
+            moment = datetime.datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+        return int(round(moment.timestamp() * 1000)) * 1000000
+    raise ValueError(f"无法解析时间: {text}")
+
+
+def format_time_ns(timestamp_ns):
+    if timestamp_ns is None:
+        return "-"
+    return datetime.datetime.fromtimestamp(timestamp_ns / 1e9).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+
+
+class SegmentManifest:
+    """一次记录的分段清单，由记录器线程维护"""
+
+    def __init__(self, path, data_format, rotation=None, metadata=None):
+        self.path = path
+        self.data = {
+            "version": MANIFEST_VERSION,
+            "format": data_format,
+            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+            "rotation": rotation or {},
+            "complete": False,
+            "segments": [],
+        }
+        if metadata:
+            self.data["metadata"] = metadata
+
+    @property
+    def segments(self):
+        return self.data["segments"]
+
+    def begin_segment(self, segment_path, index):
+        """登记新分段（尚未完成）"""
+        self.segments.append({
+            "index": index,
+            "file": os.path.basename(segment_path),
+            "start_ns": None,
+            "end_ns": None,
+            "rows": 0,
+            "bytes": 0,
+            "complete": False,
+        })
+
+    def update_segment(self, **fields):
+        """更新当前分段的统计信息（不立即保存）"""
+        self.segments[-1].update(fields)
+
+    def finish(self):
+        """记录正常结束"""
+        self.data["complete"] = True
+        self.save()
+
+    def save(self):
+        save_manifest(self.path, self.data)
+
+
+def save_manifest(path, data):
+    """写入临时文件后原子替换"""
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=1)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+def load_manifest(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def select_segments(manifest, start_ns=None, end_ns=None):
+    """返回与时间窗口 [start_ns, end_ns] 有重叠的分段"""
+    selected = []
+    for segment in manifest["segments"]:
+        if segment["start_ns"] is None:
+            # 未完成的分段可能尚未记录时间范围，无法排除时保留；已完成且没有时间范围的分段没有数据
+            # （行数可能未知，不用于判断分段是否为空）
+            if segment["complete"]:
+                continue
+        else:
+            # 未完成分段的实际数据可能晚于清单中记录的结束时间
+            if start_ns is not None and segment["complete"] and segment["end_ns"] < start_ns:
+                continue
+            if end_ns is not None and segment["start_ns"] > end_ns:
+                continue
+        selected.append(segment)
+    return selected
+
+
+def segment_paths(manifest_path, start_ns=None, end_ns=None):
+    """返回覆盖时间窗口的分段文件路径（按顺序）"""
+    manifest = load_manifest(manifest_path)
+    folder = os.path.dirname(manifest_path)
+    return [os.path.join(folder, segment["file"])
+            for segment in select_segments(manifest, start_ns, end_ns)]
+
+
+def parse_arguments():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description='查看记录分段清单')
+    parser.add_argument('manifest', help='清单文件 (*.manifest.json)')
+    parser.add_argument('--start', help='起始时间，如 "2025-01-01 12:00:00"')
+    parser.add_argument('--end', help='结束时间')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+
+    if not os.path.exists(args.manifest):
+        print(f"错误: 文件 {args.manifest} 不存在")
+        sys.exit(1)
+
+    manifest = load_manifest(args.manifest)
+    segments = select_segments(manifest, parse_time_ns(args.start), parse_time_ns(args.end))
+    print(f"格式: {manifest['format']}，分段: {len(manifest['segments'])}，"
+          f"{'已正常结束' if manifest['complete'] else '未正常结束'}")
+    for segment in segments:
+        print(f"{segment['file']}: {format_time_ns(segment['start_ns'])} ~ {format_time_ns(segment['end_ns'])}, "
+              f"{segment['rows']} 行, {segment['bytes']} 字节{'' if segment['complete'] else ' (未完成)'}")
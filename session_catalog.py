@@ -0,0 +1,473 @@
+# -*- coding: utf-8 -*-
+"""
+记录会话目录 - 本地SQLite数据库，快速查找历史记录
+功能：
+1. 发送端在记录过程中维护每个会话（结果文件夹）的起止时间、采样数、图像数、文件大小；
+   记录过程中的更新由后台线程通过一个长期连接写入，采集线程不等待数据库
+2. 每个通道的最小值/最大值/平均值在采集时增量统计，无需重新读取数据文件
+3. 可通过指令（query_sessions）或命令行查询，也可扫描已有结果文件夹重建目录
+
+命令行用法：
+    python session_catalog.py list [--since ...] [--until ...] [--min-samples N] [--channel temperature --above 30]
+    python session_catalog.py show result_20250101_120000
+    python session_catalog.py rebuild [根目录]
+"""
+
+import argparse
+import csv
+import glob
+import io
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+from calibration import apply_calibration, find_calibration
+from columnar_format import ColumnarReader, SENSOR_SCHEMA, FILE_EXTENSION as COLUMNAR_EXTENSION
+from compression import split_compression_suffix, read_data_bytes
+from image_archive import ImageArchiveReader, find_archives
+from journal import JOURNAL_NAME, needs_recovery
+from segments import MANIFEST_SUFFIX, load_manifest, parse_time_ns, format_time_ns
+
+CATALOG_NAME = "sessions.db"
+DEFAULT_QUERY_LIMIT = 20
+
+# 统计的通道（数据行中的位置, 名称），不包括时间戳和ADC原始值
+CHANNEL_COLUMNS = [(index, name) for index, (name, _) in enumerate(SENSOR_SCHEMA)
+                   if index and not name.startswith("raw")]
+CHANNELS = [name for _, name in CHANNEL_COLUMNS]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    folder TEXT PRIMARY KEY,
+    started_ns INTEGER,
+    ended_ns INTEGER,
+    samples INTEGER NOT NULL DEFAULT 0,
+    images INTEGER NOT NULL DEFAULT 0,
+    data_bytes INTEGER NOT NULL DEFAULT 0,
+    image_bytes INTEGER NOT NULL DEFAULT 0,
+    status TEXT,
+    updated_ns INTEGER
+);
+CREATE TABLE IF NOT EXISTS channel_stats (
+    folder TEXT NOT NULL,
+    channel TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    min REAL,
+    max REAL,
+    mean REAL,
+    PRIMARY KEY (folder, channel)
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_started ON sessions (started_ns);
+CREATE INDEX IF NOT EXISTS idx_channel_max ON channel_stats (channel, max);
+CREATE INDEX IF NOT EXISTS idx_channel_min ON channel_stats (channel, min);
+"""
+
+
+class SessionStats:
+    """一个会话的增量统计，由采集线程更新"""
+
+    def __init__(self, folder):
+        self.folder = os.path.basename(os.path.normpath(folder))
+        self.path = folder
+        self.started_ns = None
+        self.ended_ns = None
+        self.samples = 0
+        self.images = 0
+        self.image_bytes = 0
+        self.data_bytes = None  # 由调用方按已登记的写入量设置；None表示写入时扫描文件夹
+        self.channels = {}  # 通道名 -> [数量, 最小值, 最大值, 总和]
+
+    def _touch(self, timestamp_ns):
+        if self.started_ns is None or timestamp_ns < self.started_ns:
+            self.started_ns = timestamp_ns
+        if self.ended_ns is None or timestamp_ns > self.ended_ns:
+            self.ended_ns = timestamp_ns
+
+    def _add_value(self, name, count, low, high, total):
+        stats = self.channels.get(name)
+        if stats is None:
+            self.channels[name] = [count, low, high, total]
+        else:
+            stats[0] += count
+            stats[1] = min(stats[1], low)
+            stats[2] = max(stats[2], high)
+            stats[3] += total
+
+    def add_row(self, row, timestamp_ns=None):
+        """登记一行数据（列顺序与记录文件相同）"""
+        self._touch(timestamp_ns or time.time_ns())
+        self.samples += 1
+        for index, name in CHANNEL_COLUMNS:
+            value = row[index]
+            if value is None or value == "":
+                continue
+            value = float(value)
+            self._add_value(name, 1, value, value, value)
+
+    def add_columns(self, columns):
+        """登记一个列式数据块 {列名: NumPy数组}"""
+        timestamps = columns["timestamp_ns"]
+        if not len(timestamps):
+            return
+        self._touch(int(timestamps[0]))
+        self._touch(int(timestamps[-1]))
+        self.samples += len(timestamps)
+        for name in CHANNELS:
+            values = columns[name]
+            self._add_value(name, len(values), float(values.min()), float(values.max()),
+                            float(values.sum(dtype="f8")))
+
+    def add_image(self, size, timestamp_ns=None):
+        self._touch(timestamp_ns or time.time_ns())
+        self.images += 1
+        self.image_bytes += size
+
+    def snapshot(self):
+        """当前统计的副本，交给后台线程写入"""
+        return {"folder": self.folder, "path": self.path, "started_ns": self.started_ns,
+                "ended_ns": self.ended_ns, "samples": self.samples, "images": self.images,
+                "data_bytes": self.data_bytes, "image_bytes": self.image_bytes,
+                "channels": [(name, *values) for name, values in list(self.channels.items())]}
+
+
+def folder_sizes(path):
+    """返回 (数据文件字节数, 图像字节数)，按文件夹中的实际文件统计；文件夹不存在时为0"""
+    data_bytes = image_bytes = 0
+    try:
+        for entry in os.scandir(path):
+            if not entry.is_file():
+                continue
+            if entry.name.startswith(("img_", "images_")):
+                image_bytes += entry.stat().st_size
+            else:
+                data_bytes += entry.stat().st_size
+    except FileNotFoundError:
+        pass
+    return data_bytes, image_bytes
+
+
+def _connect(path):
+    connection = sqlite3.connect(path, timeout=5.0, check_same_thread=False)
+    connection.row_factory = sqlite3.Row
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.executescript(SCHEMA)
+    return connection
+
+
+class SessionCatalog:
+    """会话目录数据库；所有操作共用一个长期连接（加锁），可在任意线程调用
+    submit() 只把统计快照交给后台线程，同一会话未写入的更新只保留最新的一次"""
+
+    def __init__(self, path=CATALOG_NAME):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = None
+        self.condition = threading.Condition()
+        self.pending = {}  # 会话文件夹 -> (统计快照, 状态)
+        self.writing = False
+        self.worker = None
+
+    def _connection(self):
+        """返回长期连接（调用方持有 self.lock）"""
+        if self.connection is None:
+            self.connection = _connect(self.path)
+        return self.connection
+
+    def close(self):
+        """写完后台队列中的更新并关闭连接"""
+        self.flush()
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+
+    def submit(self, stats, status="recording"):
+        """在后台线程写入会话统计，立即返回"""
+        snapshot = stats.snapshot()
+        with self.condition:
+            self.pending[snapshot["folder"]] = (snapshot, status)
+            if self.worker is None:
+                self.worker = threading.Thread(target=self._worker_loop, daemon=True)
+                self.worker.start()
+            self.condition.notify_all()
+
+    def flush(self, timeout=10.0):
+        """等待后台队列中的更新写完"""
+        with self.condition:
+            return self.condition.wait_for(lambda: not self.pending and not self.writing, timeout)
+
+    def _worker_loop(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.pending)
+                updates = list(self.pending.values())
+                self.pending.clear()
+                self.writing = True
+            for snapshot, status in updates:
+                try:
+                    self._write(snapshot, status)
+                except Exception as e:
+                    print(f"更新会话目录错误: {e}")
+            with self.condition:
+                self.writing = False
+                self.condition.notify_all()
+
+    def update(self, stats, status="recording"):
+        """写入会话统计（插入或更新），在调用线程中等待写入完成"""
+        self._write(stats.snapshot(), status)
+
+    def _write(self, stats, status):
+        if stats["data_bytes"] is None:
+            data_bytes, image_bytes = folder_sizes(stats["path"])
+            image_bytes = max(image_bytes, stats["image_bytes"])
+        else:
+            data_bytes, image_bytes = stats["data_bytes"], stats["image_bytes"]
+        with self.lock:
+            connection = self._connection()
+            with connection:
+                connection.execute(
+                    "INSERT INTO sessions (folder, started_ns, ended_ns, samples, images, data_bytes, "
+                    "image_bytes, status, updated_ns) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(folder) DO UPDATE SET started_ns=excluded.started_ns, "
+                    "ended_ns=excluded.ended_ns, samples=excluded.samples, images=excluded.images, "
+                    "data_bytes=excluded.data_bytes, image_bytes=excluded.image_bytes, "
+                    "status=excluded.status, updated_ns=excluded.updated_ns",
+                    (stats["folder"], stats["started_ns"], stats["ended_ns"], stats["samples"], stats["images"],
+                     data_bytes, image_bytes, status, time.time_ns()))
+                connection.executemany(
+                    "INSERT OR REPLACE INTO channel_stats (folder, channel, count, min, max, mean) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    [(stats["folder"], name, count, low, high, total / count)
+                     for name, count, low, high, total in stats["channels"] if count])
+
+    def update_totals(self, folder, totals, status):
+        """按汇总值（会话恢复后的分段清单和文件大小）写入会话，保留已有的通道统计；
+        totals 中为None的时间范围保留原值"""
+        with self.lock:
+            connection = self._connection()
+            with connection:
+                connection.execute(
+                    "INSERT INTO sessions (folder, started_ns, ended_ns, samples, images, data_bytes, "
+                    "image_bytes, status, updated_ns) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(folder) DO UPDATE SET "
+                    "started_ns=COALESCE(excluded.started_ns, started_ns), "
+                    "ended_ns=COALESCE(excluded.ended_ns, ended_ns), samples=excluded.samples, "
+                    "images=excluded.images, data_bytes=excluded.data_bytes, "
+                    "image_bytes=excluded.image_bytes, status=excluded.status, updated_ns=excluded.updated_ns",
+                    (os.path.basename(os.path.normpath(folder)), totals["started_ns"], totals["ended_ns"],
+                     totals["samples"], totals["images"], totals["data_bytes"], totals["image_bytes"],
+                     status, time.time_ns()))
+
+    def set_status(self, folder, status):
+        with self.lock:
+            connection = self._connection()
+            with connection:
+                connection.execute("UPDATE sessions SET status=?, updated_ns=? WHERE folder=?",
+                                   (status, time.time_ns(), os.path.basename(os.path.normpath(folder))))
+
+    def update_sizes(self, folder, status=None):
+        """按文件夹中的实际文件更新大小（清理压缩或删除之后），可同时更新状态"""
+        data_bytes, image_bytes = folder_sizes(folder)
+        with self.lock:
+            connection = self._connection()
+            with connection:
+                connection.execute("UPDATE sessions SET data_bytes=?, image_bytes=?, status=COALESCE(?, status), "
+                                   "updated_ns=? WHERE folder=?",
+                                   (data_bytes, image_bytes, status, time.time_ns(),
+                                    os.path.basename(os.path.normpath(folder))))
+
+    def query(self, since=None, until=None, min_samples=None, has_images=None,
+              channel=None, above=None, below=None, limit=DEFAULT_QUERY_LIMIT):
+        """按条件查询会话，按开始时间倒序
+        channel + above：该通道最大值不小于above；channel + below：该通道最小值不大于below"""
+        sql = "SELECT s.*"
+        joins = ""
+        conditions = []
+        params = []
+        if channel:
+            sql += ", c.min AS channel_min, c.max AS channel_max, c.mean AS channel_mean"
+            joins = " JOIN channel_stats c ON c.folder = s.folder AND c.channel = ?"
+            params.append(channel)
+            if above is not None:
+                conditions.append("c.max >= ?")
+                params.append(float(above))
+            if below is not None:
+                conditions.append("c.min <= ?")
+                params.append(float(below))
+        if since is not None:
+            conditions.append("s.ended_ns >= ?")
+            params.append(parse_time_ns(since))
+        if until is not None:
+            conditions.append("s.started_ns <= ?")
+            params.append(parse_time_ns(until))
+        if min_samples is not None:
+            conditions.append("s.samples >= ?")
+            params.append(int(min_samples))
+        if has_images is not None:
+            conditions.append("s.images > 0" if has_images else "s.images = 0")
+        sql += " FROM sessions s" + joins
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY s.started_ns DESC LIMIT ?"
+        params.append(int(limit))
+
+        with self.lock:
+            connection = self._connection()
+            return [dict(row) for row in connection.execute(sql, params)]
+
+    def get(self, folder):
+        """返回单个会话及全部通道统计，不存在时返回None"""
+        folder = os.path.basename(os.path.normpath(folder))
+        with self.lock:
+            connection = self._connection()
+            row = connection.execute("SELECT * FROM sessions WHERE folder=?", (folder,)).fetchone()
+            if row is None:
+                return None
+            session = dict(row)
+            session["channels"] = {
+                r["channel"]: {"count": r["count"], "min": r["min"], "max": r["max"], "mean": r["mean"]}
+                for r in connection.execute("SELECT * FROM channel_stats WHERE folder=?", (folder,))}
+            return session
+
+
+def _data_files(folder):
+    """结果文件夹中的数据文件（优先按分段清单）"""
+    manifests = sorted(glob.glob(os.path.join(folder, "data_*" + MANIFEST_SUFFIX)))
+    if manifests:
+        files = []
+        for manifest_path in manifests:
+            for segment in load_manifest(manifest_path)["segments"]:
+                path = os.path.join(folder, segment["file"])
+                if os.path.exists(path):
+                    files.append(path)
+        return files
+    return sorted(path for path in glob.glob(os.path.join(folder, "data_*"))
+                  if not path.endswith((".idx", ".json", ".tmp")))
+
+
+def scan_folder(folder):
+    """读取结果文件夹中的全部数据，生成会话统计（用于重建目录）"""
+    stats = SessionStats(folder)
+    for path in _data_files(folder):
+        inner_path, _ = split_compression_suffix(path)
+        if inner_path.endswith(COLUMNAR_EXTENSION):
+            reader = ColumnarReader(path)
+            for chunk in reader.iter_chunks():
+                stats.add_columns(chunk)
+            reader.close()
+        elif inner_path.endswith(".csv"):
+            import numpy as np
+            data = read_data_bytes(path)
+            text = data[:data.rfind(b"\n") + 1].decode("utf-8", errors="replace")
+            reader = csv.reader(io.StringIO(text))
+            header = next(reader, None) or []
+            timestamps, values = [], []
+            for row in reader:
+                if len(row) < len(header):
+                    continue
+                try:
+                    values.append([float(value or 0) for value in row[1:len(header)]])
+                    timestamps.append(parse_time_ns(row[0]))
+                except ValueError:
+                    if len(values) > len(timestamps):
+                        values.pop()
+            table = np.array(values, dtype="f8").reshape(-1, max(len(header) - 1, 0))
+            columns = {name: table[:, index] for index, name in enumerate(header[1:])}
+            columns["timestamp_ns"] = np.array(timestamps, dtype="i8")
+            # 只记录原始值的CSV按分段清单中的标定参数换算
+            stats.add_columns(apply_calibration(columns, find_calibration(path)))
+    for archive_path in find_archives(folder):
+        reader = ImageArchiveReader(archive_path)
+        for timestamp_ns, length in zip(reader.timestamps, reader.lengths):
+            stats.add_image(length, timestamp_ns)
+        reader.close()
+    for path in glob.glob(os.path.join(folder, "img_*.jpg")):
+        stats.add_image(os.path.getsize(path), int(os.path.getmtime(path) * 1e9))
+    return stats
+
+
+def rebuild(catalog, root="."):
+    """扫描根目录下所有结果文件夹并写入目录，返回会话数"""
+    count = 0
+    for folder in sorted(glob.glob(os.path.join(root, "result_*"))):
+        if not os.path.isdir(folder):
+            continue
+        try:
+            stats = scan_folder(folder)
+        except Exception as e:
+            print(f"扫描 {folder} 失败: {e}")
+            continue
+        journal_path = os.path.join(folder, JOURNAL_NAME)
+        status = "incomplete" if os.path.exists(journal_path) and needs_recovery(journal_path) else "complete"
+        catalog.update(stats, status)
+        count += 1
+        print(f"{stats.folder}: {stats.samples} 条数据, {stats.images} 张图像")
+    return count
+
+
+def format_session(session):
+    duration = ((session["ended_ns"] - session["started_ns"]) / 1e9
+                if session["started_ns"] and session["ended_ns"] else 0)
+    text = (f"{session['folder']}  {format_time_ns(session['started_ns'])} ~ {format_time_ns(session['ended_ns'])} "
+            f"({duration:.0f}秒)  数据 {session['samples']} 条  图像 {session['images']} 张  "
+            f"{(session['data_bytes'] + session['image_bytes']) / 1024 / 1024:.1f}MB  [{session['status']}]")
+    if "channel_max" in session:
+        text += (f"  min={session['channel_min']:.3f} max={session['channel_max']:.3f} "
+                 f"mean={session['channel_mean']:.3f}")
+    return text
+
+
+def parse_arguments():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description='查询记录会话目录')
+    parser.add_argument('action', choices=['list', 'show', 'rebuild'], help='操作')
+    parser.add_argument('target', nargs='?', help='会话文件夹（show）或根目录（rebuild）')
+    parser.add_argument('--db', default=CATALOG_NAME, help=f'数据库文件（默认 {CATALOG_NAME}）')
+    parser.add_argument('--since', help='结束时间不早于，如 "2025-01-01 12:00:00"')
+    parser.add_argument('--until', help='开始时间不晚于')
+    parser.add_argument('--min-samples', type=int, help='最少数据条数')
+    parser.add_argument('--images', choices=['y', 'n'], help='是否有图像')
+    parser.add_argument('--channel', choices=CHANNELS, help='按通道筛选')
+    parser.add_argument('--above', type=float, help='通道最大值不小于')
+    parser.add_argument('--below', type=float, help='通道最小值不大于')
+    parser.add_argument('--limit', type=int, default=DEFAULT_QUERY_LIMIT, help='最多显示条数')
+    parser.add_argument('--json', action='store_true', help='以JSON格式输出')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    catalog = SessionCatalog(args.db)
+
+    if args.action == 'rebuild':
+        print(f"已写入 {rebuild(catalog, args.target or '.')} 个会话")
+    elif args.action == 'show':
+        if not args.target:
+            print("错误: 请指定会话文件夹")
+            sys.exit(1)
+        session = catalog.get(args.target)
+        if session is None:
+            print(f"目录中没有会话: {args.target}")
+            sys.exit(1)
+        if args.json:
+            print(json.dumps(session, ensure_ascii=False, indent=1))
+        else:
+            print(format_session(session))
+            for name, channel in sorted(session["channels"].items()):
+                print(f"   {name}: min={channel['min']:.3f} max={channel['max']:.3f} "
+                      f"mean={channel['mean']:.3f} ({channel['count']} 条)")
+    else:
+        start = time.perf_counter()
+        sessions = catalog.query(args.since, args.until, args.min_samples,
+                                 None if args.images is None else args.images == 'y',
+                                 args.channel, args.above, args.below, args.limit)
+        elapsed = (time.perf_counter() - start) * 1000
+        if args.json:
+            print(json.dumps(sessions, ensure_ascii=False, indent=1))
+        else:
+            for session in sessions:
+                print(format_session(session))
+            print(f"共 {len(sessions)} 个会话（查询耗时 {elapsed:.1f} ms）")
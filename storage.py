@@ -0,0 +1,387 @@
+# -*- coding: utf-8 -*-
+"""
+SD卡存储空间管理 - 记录配额、保留策略和低空间保护
+功能：
+1. 启动时统计一次结果文件夹的占用，之后按写入量增量累计；定期读取文件系统剩余空间校正
+2. 可用空间 = min(配额 - 已用, 文件系统剩余空间)
+3. 可用空间低于警告线时通知客户端，并按保留策略在后台清理最早的会话：
+   none     不自动清理（默认，只警告并按第4条暂停保存）
+   oldest   删除最早的结果文件夹
+   compress 先把最早会话中未压缩的数据文件压缩为gzip，空间仍不足时再删除最早的文件夹
+4. 空间继续减少时先暂停图像保存，最后才暂停传感器数据记录；空间恢复后自动继续
+
+命令行用法：
+    python storage.py status [根目录] [--quota-mb N]
+    python storage.py clean [根目录] --free-mb N [--retention oldest|compress] [--dry-run]
+"""
+
+import argparse
+import glob
+import os
+import shutil
+import sys
+import threading
+import time
+
+from compression import FramedCompressedWriter, COMPRESSIONS, split_compression_suffix
+from journal import JOURNAL_NAME, needs_recovery
+from segments import MANIFEST_SUFFIX, load_manifest, save_manifest
+
+MB = 1024 * 1024
+RETENTION_POLICIES = ("none", "oldest", "compress")
+DEFAULT_WARN_BYTES = 512 * MB          # 低于此值警告客户端并开始清理
+DEFAULT_IMAGE_RESERVE_BYTES = 256 * MB  # 低于此值暂停图像保存
+DEFAULT_DATA_RESERVE_BYTES = 32 * MB   # 低于此值暂停传感器数据记录
+RESUME_MARGIN_BYTES = 16 * MB          # 恢复时需要超过阈值的余量，避免反复切换
+DISK_CHECK_INTERVAL = 5.0              # 读取文件系统剩余空间的间隔（秒）
+COMPRESS_BLOCK_SIZE = 256 * 1024
+
+# 存储状态（按严重程度排序）
+LEVEL_OK = "ok"
+LEVEL_WARN = "warn"
+LEVEL_IMAGES_PAUSED = "images_paused"
+LEVEL_DATA_PAUSED = "data_paused"
+LEVELS = (LEVEL_OK, LEVEL_WARN, LEVEL_IMAGES_PAUSED, LEVEL_DATA_PAUSED)
+
+
+def folder_size(path):
+    """文件夹中所有文件的字节数"""
+    total = 0
+    for folder, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(folder, name))
+            except OSError:
+                continue
+    return total
+
+
+def result_folders(root="."):
+    """根目录下的结果文件夹，按创建时间（文件夹名）从早到晚排序"""
+    return sorted(path for path in glob.glob(os.path.join(root, "result_*")) if os.path.isdir(path))
+
+
+def _plain_data_files(folder):
+    """文件夹中尚未压缩的数据文件 [(路径, 所属清单路径或None)]"""
+    files = []
+    listed = set()
+    for manifest_path in sorted(glob.glob(os.path.join(folder, "data_*" + MANIFEST_SUFFIX))):
+        for segment in load_manifest(manifest_path)["segments"]:
+            listed.add(segment["file"])
+            path = os.path.join(folder, segment["file"])
+            if segment["complete"] and not split_compression_suffix(path)[1] and os.path.exists(path):
+                files.append((path, manifest_path))
+    # 早期版本没有分段清单的CSV文件
+    for path in sorted(glob.glob(os.path.join(folder, "data_*.csv"))):
+        if os.path.basename(path) not in listed:
+            files.append((path, None))
+    return files
+
+
+def compress_data_file(path, manifest_path=None, codec="gzip"):
+    """把已完成的数据文件压缩为分帧压缩文件并删除原文件，返回节省的字节数
+    顺序：写完并fsync压缩文件 -> 原子更新分段清单 -> 删除原文件，任何一步中断都不会丢失数据"""
+    compressed_path = path + COMPRESSIONS[codec]
+    original_size = os.path.getsize(path)
+    writer = FramedCompressedWriter(compressed_path, codec)
+    try:
+        with open(path, "rb") as f:
+            while True:
+                block = f.read(COMPRESS_BLOCK_SIZE)
+                if not block:
+                    break
+                writer.write(block)
+                if writer.frame_full():
+                    writer.end_frame()
+        writer.end_frame()
+        writer.file.flush()
+        os.fsync(writer.fileno())
+    finally:
+        writer.close()
+    compressed_size = os.path.getsize(compressed_path) + os.path.getsize(compressed_path + ".idx")
+
+    if manifest_path:
+        manifest = load_manifest(manifest_path)
+        name = os.path.basename(path)
+        for segment in manifest["segments"]:
+            if segment["file"] == name:
+                segment["file"] = os.path.basename(compressed_path)
+                segment["bytes"] = os.path.getsize(compressed_path)
+        save_manifest(manifest_path, manifest)
+    os.remove(path)
+    return original_size - compressed_size
+
+
+class StorageManager:
+    """结果文件夹的空间管理，由采集线程定期调用check()，清理在后台线程进行"""
+
+    def __init__(self, root=".", quota_bytes=0, retention="none",
+                 warn_bytes=DEFAULT_WARN_BYTES, image_reserve_bytes=DEFAULT_IMAGE_RESERVE_BYTES,
+                 data_reserve_bytes=DEFAULT_DATA_RESERVE_BYTES):
+        if retention not in RETENTION_POLICIES:
+            raise ValueError(f"未知的保留策略: {retention}")
+        self.root = root
+        self.quota_bytes = quota_bytes
+        self.retention = retention
+        self.warn_bytes = warn_bytes
+        self.image_reserve_bytes = image_reserve_bytes
+        self.data_reserve_bytes = data_reserve_bytes
+        self.lock = threading.Lock()
+
+        # 启动时统计一次，之后增量累计
+        self.folders = {os.path.basename(path): folder_size(path) for path in result_folders(root)}
+        self.usage = sum(self.folders.values())
+        self.tracked = {}  # 记录器/存档 -> 已计入的字节数
+        self.active = set()  # 正在记录的文件夹，不会被清理
+
+        self.disk_free = None
+        self.last_disk_check = 0
+        self.level = LEVEL_OK
+        self.cleaning = False
+        self.cleaned_folders = 0
+        self.compressed_files = 0
+        self.freed_bytes = 0
+        self.on_delete = None    # 回调(文件夹路径)，文件夹被删除后调用
+        self.on_compress = None  # 回调(文件夹路径)，文件夹中的数据文件被压缩后调用
+
+    def set_policy(self, quota_bytes=None, retention=None, warn_bytes=None,
+                   image_reserve_bytes=None, data_reserve_bytes=None):
+        if retention is not None and retention not in RETENTION_POLICIES:
+            raise ValueError(f"未知的保留策略: {retention}")
+        with self.lock:
+            if quota_bytes is not None:
+                self.quota_bytes = quota_bytes
+            if retention is not None:
+                self.retention = retention
+            if warn_bytes is not None:
+                self.warn_bytes = warn_bytes
+            if image_reserve_bytes is not None:
+                self.image_reserve_bytes = image_reserve_bytes
+            if data_reserve_bytes is not None:
+                self.data_reserve_bytes = data_reserve_bytes
+            self.last_disk_check = 0
+
+    def add(self, folder, nbytes):
+        """登记写入文件夹的字节数"""
+        if nbytes <= 0:
+            return
+        folder = os.path.basename(os.path.normpath(folder))
+        with self.lock:
+            self.folders[folder] = self.folders.get(folder, 0) + nbytes
+            self.usage += nbytes
+            if self.disk_free is not None:
+                self.disk_free -= nbytes
+
+    def track(self, key, folder, total):
+        """登记记录器等累计写入量 total，只计入增加的部分"""
+        with self.lock:
+            delta = total - self.tracked.get(key, 0)
+            self.tracked[key] = total
+        self.add(folder, delta)
+
+    def folder_usage(self, folder):
+        """已登记的文件夹占用（字节），不读取文件系统"""
+        with self.lock:
+            return self.folders.get(os.path.basename(os.path.normpath(folder)), 0)
+
+    def untrack(self, key):
+        with self.lock:
+            self.tracked.pop(key, None)
+
+    def open_folder(self, folder):
+        """开始在文件夹中记录（记录期间不会被清理）"""
+        with self.lock:
+            self.active.add(os.path.basename(os.path.normpath(folder)))
+
+    def close_folder(self, folder):
+        """记录结束：按实际文件大小校正该文件夹的占用（压缩文件的实际大小小于原始写入量）"""
+        name = os.path.basename(os.path.normpath(folder))
+        size = folder_size(folder)
+        with self.lock:
+            self.active.discard(name)
+            self.usage += size - self.folders.get(name, 0)
+            self.folders[name] = size
+
+    def remaining(self):
+        """当前可用空间（字节）"""
+        with self.lock:
+            candidates = []
+            if self.quota_bytes:
+                candidates.append(self.quota_bytes - self.usage)
+            if self.disk_free is not None:
+                candidates.append(self.disk_free)
+        return min(candidates) if candidates else float("inf")
+
+    def _thresholds(self):
+        return {LEVEL_WARN: self.warn_bytes, LEVEL_IMAGES_PAUSED: self.image_reserve_bytes,
+                LEVEL_DATA_PAUSED: self.data_reserve_bytes}
+
+    def _level_for(self, remaining):
+        thresholds = self._thresholds()
+        current = LEVELS.index(self.level)
+        level = LEVEL_OK
+        for index, candidate in enumerate(LEVELS[1:], 1):
+            # 离开已进入的状态时需要超过阈值加余量
+            limit = thresholds[candidate] + (RESUME_MARGIN_BYTES if index <= current else 0)
+            if remaining < limit:
+                level = candidate
+        return level
+
+    def check(self, now=None):
+        """更新存储状态，返回 (之前的状态, 新状态)；状态未变化时返回None"""
+        now = now or time.time()
+        if now - self.last_disk_check >= DISK_CHECK_INTERVAL:
+            self.last_disk_check = now
+            try:
+                free = shutil.disk_usage(self.root).free
+                with self.lock:
+                    self.disk_free = free
+            except OSError as e:
+                print(f"读取磁盘空间错误: {e}")
+
+        remaining = self.remaining()
+        if remaining < self.warn_bytes and self.retention != "none" and not self.cleaning:
+            self.cleaning = True
+            threading.Thread(target=self._cleanup_worker, args=(self.warn_bytes - remaining,),
+                             daemon=True).start()
+
+        level = self._level_for(remaining)
+        if level == self.level:
+            return None
+        previous, self.level = self.level, level
+        return previous, level
+
+    @property
+    def images_paused(self):
+        return LEVELS.index(self.level) >= LEVELS.index(LEVEL_IMAGES_PAUSED)
+
+    @property
+    def data_paused(self):
+        return self.level == LEVEL_DATA_PAUSED
+
+    def _cleanup_worker(self, needed):
+        try:
+            self.cleanup(needed + RESUME_MARGIN_BYTES)
+        except Exception as e:
+            print(f"存储清理错误: {e}")
+        finally:
+            self.last_disk_check = 0
+            self.cleaning = False
+
+    def candidates(self):
+        """可清理的结果文件夹（最早的在前），跳过正在记录和未恢复的会话"""
+        folders = []
+        for path in result_folders(self.root):
+            name = os.path.basename(path)
+            with self.lock:
+                if name in self.active:
+                    continue
+            journal_path = os.path.join(path, JOURNAL_NAME)
+            if os.path.exists(journal_path) and needs_recovery(journal_path):
+                continue
+            folders.append(path)
+        return folders
+
+    def cleanup(self, needed, dry_run=False):
+        """按保留策略释放至少 needed 字节，返回 [(操作, 路径, 字节数)]"""
+        actions = []
+        freed = 0
+        folders = self.candidates()
+        if self.retention == "compress":
+            for folder in folders:
+                if freed >= needed:
+                    break
+                compressed = False
+                for path, manifest_path in _plain_data_files(folder):
+                    if freed >= needed:
+                        break
+                    saved = os.path.getsize(path) if dry_run else compress_data_file(path, manifest_path)
+                    freed += saved
+                    actions.append(("compress", path, saved))
+                    compressed = True
+                if compressed and not dry_run:
+                    self._forget(folder, deleted=False)
+                    if self.on_compress:
+                        self.on_compress(folder)
+        if self.retention in ("oldest", "compress"):
+            for folder in folders:
+                if freed >= needed:
+                    break
+                size = folder_size(folder)
+                if not dry_run:
+                    shutil.rmtree(folder)
+                    self._forget(folder, deleted=True)
+                    if self.on_delete:
+                        self.on_delete(folder)
+                freed += size
+                actions.append(("delete", folder, size))
+        if not dry_run:
+            with self.lock:
+                self.freed_bytes += freed
+                self.cleaned_folders += sum(1 for action in actions if action[0] == "delete")
+                self.compressed_files += sum(1 for action in actions if action[0] == "compress")
+        for action, path, size in actions:
+            print(f"存储清理: {'删除' if action == 'delete' else '压缩'} {path}，释放 {size / MB:.1f}MB")
+        return actions
+
+    def _forget(self, folder, deleted):
+        """清理后更新文件夹占用"""
+        name = os.path.basename(folder)
+        size = 0 if deleted else folder_size(folder)
+        with self.lock:
+            self.usage += size - self.folders.pop(name, 0)
+            if not deleted:
+                self.folders[name] = size
+
+    def status(self):
+        """返回存储状态"""
+        remaining = self.remaining()
+        with self.lock:
+            return {
+                "level": self.level,
+                "usage_mb": round(self.usage / MB, 1),
+                "quota_mb": round(self.quota_bytes / MB, 1) if self.quota_bytes else 0,
+                "disk_free_mb": round(self.disk_free / MB, 1) if self.disk_free is not None else None,
+                "remaining_mb": round(remaining / MB, 1) if remaining != float("inf") else None,
+                "retention": self.retention,
+                "warn_mb": round(self.warn_bytes / MB, 1),
+                "image_reserve_mb": round(self.image_reserve_bytes / MB, 1),
+                "data_reserve_mb": round(self.data_reserve_bytes / MB, 1),
+                "folders": len(self.folders),
+                "cleaning": self.cleaning,
+                "cleaned_folders": self.cleaned_folders,
+                "compressed_files": self.compressed_files,
+                "freed_mb": round(self.freed_bytes / MB, 1),
+            }
+
+
+def parse_arguments():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description='结果文件夹存储空间管理')
+    parser.add_argument('action', choices=['status', 'clean'], help='操作')
+    parser.add_argument('root', nargs='?', default='.', help='结果文件夹所在目录（默认当前目录）')
+    parser.add_argument('--quota-mb', type=float, default=0, help='结果文件夹总配额（MB，0表示不限制）')
+    parser.add_argument('--free-mb', type=float, default=0, help='需要释放的空间（clean，MB）')
+    parser.add_argument('--retention', choices=['oldest', 'compress'], default='oldest', help='保留策略')
+    parser.add_argument('--dry-run', action='store_true', help='只列出将要清理的内容')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+
+    if not os.path.isdir(args.root):
+        print(f"错误: 目录 {args.root} 不存在")
+        sys.exit(1)
+
+    manager = StorageManager(args.root, int(args.quota_mb * MB), args.retention)
+    if args.action == 'status':
+        manager.check()
+        for key, value in manager.status().items():
+            print(f"{key}: {value}")
+    else:
+        actions = manager.cleanup(int(args.free_mb * MB), args.dry_run)
+        if not actions:
+            print("没有需要清理的内容")
+        elif args.dry_run:
+            print(f"共 {len(actions)} 项（未执行）")
@@ -0,0 +1,312 @@
+# -*- coding: utf-8 -*-
+"""
+接收端实时曲线 - 固定大小的NumPy环形缓存 + 按屏幕宽度的最小/最大值抽取
+功能：
+1. 网络线程把每个样本写入环形缓存，内存占用固定，写满后覆盖最旧的数据
+2. 绘图时按像素列对时间窗口内的样本取最小/最大值，1小时100Hz的数据也只画几百个点
+3. 坐标轴、网格只创建一次，每次刷新只更新曲线和刻度文字（Canvas局部重绘），没有新数据时不重绘
+
+命令行用法（测试抽取耗时，不需要显示器）：
+    python strip_chart.py [--rate 100] [--minutes 60] [--width 700]
+"""
+
+import argparse
+import threading
+import time
+import tkinter as tk
+
+import numpy as np
+
+from telemetry import flatten_fields
+
+DEFAULT_CAPACITY = 1 << 19  # 约87分钟的100Hz数据（9个通道float32约19MB）
+REFRESH_INTERVAL = 200  # 曲线刷新间隔（毫秒）
+CHART_WIDTH = 700
+CHART_HEIGHT = 150
+SMALL_CHART_HEIGHT = 90  # 单个环境通道的曲线图高度
+MARGIN_LEFT = 60
+
+# 可绘制的通道：(展开后的字段名, 显示名称)
+CHART_CHANNELS = [
+    ("adc_data.channel0_voltage", "通道0电压"),
+    ("adc_data.channel1_current", "通道1电流"),
+    ("adc_data.channel2_voltage", "通道2电压"),
+    ("adc_data.channel3_voltage", "通道3电压"),
+    ("env_data.lux", "光照强度"),
+    ("env_data.temperature", "温度"),
+    ("env_data.pressure", "气压"),
+    ("env_data.humidity", "湿度"),
+    ("env_data.altitude", "海拔"),
+]
+CHANNEL_INDEX = {field: index for index, (field, _) in enumerate(CHART_CHANNELS)}
+
+# 曲线图：(标题, 单位, [(字段名, 颜色)], 高度)
+# 光照、气压、海拔的量级相差很大，各用一个纵轴
+CHART_LAYOUT = [
+    ("电压", "V", [("adc_data.channel0_voltage", "darkblue"),
+                  ("adc_data.channel2_voltage", "green"),
+                  ("adc_data.channel3_voltage", "purple")], CHART_HEIGHT),
+    ("电流", "A", [("adc_data.channel1_current", "red")], CHART_HEIGHT),
+    ("温湿度", "°C / %", [("env_data.temperature", "orangered"),
+                        ("env_data.humidity", "blue")], CHART_HEIGHT),
+    ("光照强度", "lux", [("env_data.lux", "darkorange")], SMALL_CHART_HEIGHT),
+    ("气压", "Pa", [("env_data.pressure", "purple")], SMALL_CHART_HEIGHT),
+    ("海拔", "m", [("env_data.altitude", "brown")], SMALL_CHART_HEIGHT),
+]
+
+# 可选的时间窗口（秒），None 表示缓存中的全部数据
+TIME_WINDOWS = {"1分钟": 60, "10分钟": 600, "1小时": 3600, "全部": None}
+
+
+class RingBuffer:
+    """固定容量的样本缓存：时间戳(纳秒) int64 + 各通道数值 float32，缺失的通道为NaN"""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, channels=len(CHART_CHANNELS)):
+        self.capacity = capacity
+        self.times = np.zeros(capacity, dtype=np.int64)
+        self.values = np.full((capacity, channels), np.nan, dtype=np.float32)
+        self.count = 0  # 累计写入的样本数
+        self.version = 0  # 每次写入递增，绘图端据此判断是否需要重绘
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def append(self, time_ns, row):
+        """写入一个样本；早于缓存中最新样本的数据（如重复补发）被忽略"""
+        with self.lock:
+            if self.count and time_ns < self.times[(self.count - 1) % self.capacity]:
+                return False
+            index = self.count % self.capacity
+            self.times[index] = time_ns
+            self.values[index] = row
+            self.count += 1
+            self.version += 1
+        return True
+
+    def segments(self):
+        """按时间顺序返回缓存中的数据段（最多两段，不复制数据），调用方需持有lock"""
+        if self.count <= self.capacity:
+            return [(self.times[:self.count], self.values[:self.count])]
+        split = self.count % self.capacity
+        return [(self.times[split:], self.values[split:]), (self.times[:split], self.values[:split])]
+
+    def time_range(self):
+        """缓存中最早和最新的时间戳，没有数据时返回None"""
+        with self.lock:
+            if not self.count:
+                return None
+            first = self.times[self.count % self.capacity if self.count > self.capacity else 0]
+            return int(first), int(self.times[(self.count - 1) % self.capacity])
+
+    def minmax(self, start_ns, end_ns, width, channels=None):
+        """时间窗口 [start_ns, end_ns] 内按 width 个像素列取各通道最小/最大值
+        返回 (lo, hi)，形状为 (width, 通道数)，没有样本的列为NaN"""
+        channels = list(range(self.values.shape[1])) if channels is None else list(channels)
+        lo = np.full((width, len(channels)), np.nan, dtype=np.float32)
+        hi = np.full((width, len(channels)), np.nan, dtype=np.float32)
+        span = max(end_ns - start_ns, 1)
+        with self.lock:
+            for times, values in self.segments():
+                first = np.searchsorted(times, start_ns, side="left")
+                last = np.searchsorted(times, end_ns, side="right")
+                if first >= last:
+                    continue
+                columns, seg_lo, seg_hi = minmax_columns(times[first:last], values[first:last, channels],
+                                                         start_ns, span, width)
+                lo[columns] = np.fmin(lo[columns], seg_lo)
+                hi[columns] = np.fmax(hi[columns], seg_hi)
+        return lo, hi
+
+
+def minmax_columns(times, values, start_ns, span_ns, width):
+    """已排序样本按像素列分组，返回 (列号, 每列最小值, 每列最大值)；NaN不参与比较"""
+    columns = ((times - start_ns) * width // span_ns).astype(np.intp)
+    np.clip(columns, 0, width - 1, out=columns)
+    starts = np.flatnonzero(np.r_[True, columns[1:] != columns[:-1]])
+    return (columns[starts],
+            np.fmin.reduceat(values, starts, axis=0),
+            np.fmax.reduceat(values, starts, axis=0))
+
+
+def sample_rows(fields):
+    """展开后的遥测字段 -> 要写入缓存的行；最小最大值聚合的 [min, max] 拆成两行"""
+    row_min = np.full(len(CHART_CHANNELS), np.nan, dtype=np.float32)
+    row_max = row_min.copy()
+    found = paired = False
+    for field, value in fields.items():
+        index = CHANNEL_INDEX.get(field)
+        if index is None:
+            # 最小最大值聚合时列表会被展开为 field.0 / field.1
+            base, _, position = field.rpartition(".")
+            index = CHANNEL_INDEX.get(base)
+            if index is None or position not in ("0", "1"):
+                continue
+            paired = True
+            (row_min if position == "0" else row_max)[index] = value
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            row_min[index] = row_max[index] = value
+        else:
+            continue
+        found = True
+    if not found:
+        return []
+    return [row_min, row_max] if paired else [row_min]
+
+
+def record_sample(buffer, time_ns, data):
+    """把一条消息中的传感器数据写入缓存，data 可以是嵌套或展开后的字段"""
+    rows = sample_rows(flatten_fields(data))
+    time_ns = time_ns or time.time_ns()
+    for row in rows:
+        buffer.append(time_ns, row)
+    return len(rows)
+
+
+def _format_tick(value):
+    if abs(value) >= 1000:
+        return f"{value:.0f}"
+    if abs(value) >= 10:
+        return f"{value:.1f}"
+    return f"{value:.3f}"
+
+
+class StripChart:
+    """一个Tk Canvas曲线图，多个通道共用纵轴，纵轴按窗口内数据自动缩放"""
+
+    def __init__(self, parent, title, unit, channels, width=CHART_WIDTH, height=CHART_HEIGHT):
+        self.width = width
+        self.height = height
+        self.plot_width = width - MARGIN_LEFT
+        self.channels = [CHANNEL_INDEX[field] for field, _ in channels]
+        self.canvas = tk.Canvas(parent, width=width, height=height, bg="white", highlightthickness=0)
+        self.texts = {}
+
+        # 坐标轴、网格和图例只创建一次
+        self.canvas.create_line(MARGIN_LEFT, 0, MARGIN_LEFT, height, fill="gray")
+        for fraction in (0.25, 0.5, 0.75):
+            y = height * fraction
+            self.canvas.create_line(MARGIN_LEFT, y, width, y, fill="#e0e0e0", dash=(2, 4))
+        x = MARGIN_LEFT + 5
+        item = self.canvas.create_text(x, 2, anchor="nw", font=("Arial", 8, "bold"), text=f"{title} ({unit})")
+        for index, (_, color) in zip(self.channels, channels):
+            x = self.canvas.bbox(item)[2] + 10
+            item = self.canvas.create_text(x, 2, anchor="nw", font=("Arial", 8), fill=color,
+                                           text=CHART_CHANNELS[index][1])
+        self.lines = [self.canvas.create_line(0, 0, 0, 0, fill=color, width=1) for _, color in channels]
+        self.top_text = self.canvas.create_text(MARGIN_LEFT - 4, 2, anchor="ne", font=("Arial", 8))
+        self.bottom_text = self.canvas.create_text(MARGIN_LEFT - 4, height - 2, anchor="se", font=("Arial", 8))
+        self.span_text = self.canvas.create_text(width - 4, height - 2, anchor="se", font=("Arial", 8), fill="gray")
+
+    def pack(self, **options):
+        self.canvas.pack(**options)
+
+    def _set_text(self, item, text):
+        if self.texts.get(item) != text:
+            self.canvas.itemconfigure(item, text=text)
+            self.texts[item] = text
+
+    def redraw(self, lo, hi, span_seconds):
+        """用抽取后的各列最小/最大值（列为 CHART_CHANNELS 中的全部通道）更新曲线和刻度"""
+        lo = lo[:, self.channels]
+        hi = hi[:, self.channels]
+        finite = np.isfinite(lo)
+        if finite.any():
+            low, high = float(np.min(lo[finite])), float(np.max(hi[finite]))
+            padding = (high - low) * 0.05 or max(abs(high) * 0.05, 1e-3)
+            low, high = low - padding, high + padding
+        else:
+            low, high = 0.0, 1.0
+        scale = (self.height - 4) / (high - low)
+
+        x = np.arange(self.plot_width, dtype=np.float32) + MARGIN_LEFT
+        for column, item in enumerate(self.lines):
+            valid = np.flatnonzero(finite[:, column])
+            if len(valid) < 2:
+                self.canvas.coords(item, 0, 0, 0, 0)
+                continue
+            # 每个像素列先画最大值再画最小值，折线覆盖整列的取值范围
+            points = np.empty((len(valid) * 2, 2), dtype=np.float32)
+            points[0::2, 0] = points[1::2, 0] = x[valid]
+            points[0::2, 1] = self.height - 2 - (hi[valid, column] - low) * scale
+            points[1::2, 1] = self.height - 2 - (lo[valid, column] - low) * scale
+            self.canvas.coords(item, points.ravel().tolist())
+
+        self._set_text(self.top_text, _format_tick(high))
+        self._set_text(self.bottom_text, _format_tick(low))
+        self._set_text(self.span_text, f"{span_seconds:.0f} 秒")
+
+
+class ChartPanel:
+    """一组曲线图和时间窗口选择，所有曲线共用一次抽取"""
+
+    def __init__(self, parent, buffer, layout=CHART_LAYOUT, width=CHART_WIDTH):
+        self.buffer = buffer
+        self.drawn = None  # 上次绘制时的 (缓存版本, 时间窗口)
+        self.frame = tk.Frame(parent)
+
+        control_frame = tk.Frame(self.frame)
+        control_frame.pack(fill="x", pady=2)
+        tk.Label(control_frame, text="时间窗口:", font=("Arial", 9)).pack(side="left")
+        self.window_var = tk.StringVar(value=next(iter(TIME_WINDOWS)))
+        tk.OptionMenu(control_frame, self.window_var, *TIME_WINDOWS).pack(side="left")
+        self.info_label = tk.Label(control_frame, text="", font=("Arial", 9), fg="gray")
+        self.info_label.pack(side="left", padx=10)
+
+        self.charts = [StripChart(self.frame, title, unit, channels, width=width, height=height)
+                       for title, unit, channels, height in layout]
+        for chart in self.charts:
+            chart.pack(pady=2)
+        self.plot_width = self.charts[0].plot_width
+
+    def pack(self, **options):
+        self.frame.pack(**options)
+
+    def refresh(self):
+        """缓存有新数据或窗口变化时重绘，返回是否重绘"""
+        window_seconds = TIME_WINDOWS[self.window_var.get()]
+        state = (self.buffer.version, window_seconds)
+        if state == self.drawn:
+            return False
+        self.drawn = state
+        time_range = self.buffer.time_range()
+        if time_range is None:
+            return False
+
+        # 窗口右端对齐最新样本，没有新数据时曲线不滚动
+        end_ns = time_range[1]
+        start_ns = time_range[0] if window_seconds is None else end_ns - int(window_seconds * 1e9)
+        lo, hi = self.buffer.minmax(start_ns, end_ns, self.plot_width)
+        for chart in self.charts:
+            chart.redraw(lo, hi, (end_ns - start_ns) / 1e9)
+        self.info_label.config(text=f"缓存 {len(self.buffer)}/{self.buffer.capacity} 个样本")
+        return True
+
+
+def parse_arguments():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description='测试实时曲线的最小/最大值抽取耗时')
+    parser.add_argument('--rate', type=float, default=100.0, help='采样频率Hz（默认100）')
+    parser.add_argument('--minutes', type=float, default=60.0, help='缓存中的数据时长（分钟，默认60）')
+    parser.add_argument('--width', type=int, default=CHART_WIDTH - MARGIN_LEFT, help='像素列数')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+
+    samples = int(args.rate * args.minutes * 60)
+    buffer = RingBuffer(max(samples, 1))
+    step_ns = int(1e9 / args.rate)
+    buffer.times[:samples] = time.time_ns() - samples * step_ns + np.arange(samples, dtype=np.int64) * step_ns
+    buffer.values[:samples] = np.random.default_rng(0).normal(size=(samples, len(CHART_CHANNELS)))
+    buffer.count = samples
+
+    start_ns, end_ns = buffer.time_range()
+    repeat = 20
+    began = time.perf_counter()
+    for _ in range(repeat):
+        lo, hi = buffer.minmax(start_ns, end_ns, args.width)
+    elapsed = (time.perf_counter() - began) / repeat
+    print(f"{samples} 个样本 x {len(CHART_CHANNELS)} 通道 -> {args.width} 列，"
+          f"每次抽取 {elapsed * 1000:.1f} ms，缓存占用 {(buffer.times.nbytes + buffer.values.nbytes) / 1e6:.1f} MB")
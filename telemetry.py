@@ -0,0 +1,495 @@
+# -*- coding: utf-8 -*-
+"""
+遥测数据发送通道 - 发送端每个客户端一个非阻塞发送队列
+功能：
+1. 采集线程只把消息放入队列，由每个客户端独立的发送线程负责 sendall
+2. 控制消息（STATUS等）单独排队，永不丢弃
+3. 遥测消息队列有上限，满时按策略处理：丢弃最旧 / 只保留最新 / 限时阻塞
+4. 统计发送、丢弃数量，并定期以 TELEMETRY_STATS 消息告知客户端；记录最近的发送速率和每次 sendall 的耗时
+5. 遥测消息带单调递增序号，发送端保留最近的历史，客户端重连后只补发缺失部分
+6. 客户端可订阅指定字段、最大更新频率和聚合方式（最新值/平均值/最小最大值）；
+   没有新样本时到期的窗口由 flush 发出，停止监测或取消订阅时最后一个不完整的窗口也会发出
+"""
+
+import threading
+import time
+import json
+import datetime
+import socket
+from itertools import islice
+from collections import deque
+
+from link_stats import RateMeter, Histogram, SEND_TIME_BOUNDS
+
+# 队列满时的处理策略
+DROP_OLDEST = "drop_oldest"          # 丢弃队列中最旧的遥测消息
+COALESCE_LATEST = "coalesce"         # 队列只保留最新一条遥测消息
+BLOCK_WITH_TIMEOUT = "block"         # 采集线程最多等待block_timeout秒，仍满则丢弃新消息
+SEND_POLICIES = (DROP_OLDEST, COALESCE_LATEST, BLOCK_WITH_TIMEOUT)
+
+DEFAULT_QUEUE_SIZE = 256
+DEFAULT_BLOCK_TIMEOUT = 0.05  # 秒
+STATS_REPORT_INTERVAL = 1.0   # 丢弃统计上报间隔（秒）
+DEFAULT_HISTORY_SIZE = 3000   # 保留的历史遥测条数（0.1秒间隔约5分钟）
+RESUME_WAIT = 1.0             # 新连接等待客户端resume指令的最长时间（秒）
+
+# 订阅聚合方式
+AGGREGATE_LATEST = "latest"
+AGGREGATE_MEAN = "mean"
+AGGREGATE_MINMAX = "minmax"
+AGGREGATE_MODES = (AGGREGATE_LATEST, AGGREGATE_MEAN, AGGREGATE_MINMAX)
+
+# 字段别名，订阅时可直接使用
+FIELD_ALIASES = {
+    "status": ["recording", "data_recording", "combined", "i2c_available", "image_interval"],
+    "adc": ["adc_data"],
+    "env": ["env_data"],
+}
+
+
+# 消息总是附带整数纳秒时间戳 time_ns；本地时间字符串 timestamp 只为兼容旧客户端，可关闭
+text_timestamps = True
+
+
+def set_text_timestamps(enabled):
+    global text_timestamps
+    text_timestamps = bool(enabled)
+
+
+def encode_message(message_type, data, seq=None, stream_id=None):
+    """将结构化消息编码为一行JSON（与 NetworkManager.send_message 格式一致）"""
+    time_ns = time.time_ns()
+    message = {"type": message_type, "time_ns": time_ns}
+    if text_timestamps:
+        message["timestamp"] = datetime.datetime.fromtimestamp(time_ns / 1e9).strftime("%Y-%m-%d %H:%M:%S")
+    message["data"] = data
+    if seq is not None:
+        message["seq"] = seq
+        message["stream"] = stream_id
+    return (json.dumps(message, ensure_ascii=False) + "\n").encode('utf-8')
+
+
+class TelemetryHistory:
+    """最近遥测消息的环形缓存，序号在本次运行内单调递增"""
+
+    def __init__(self, max_samples=DEFAULT_HISTORY_SIZE):
+        # 发送端每次启动使用新的流ID，客户端据此判断序号是否可续接
+        self.stream_id = format(int(time.time() * 1000), "x")
+        self.samples = deque(maxlen=max_samples)
+        self.next_seq = 1
+        self.lock = threading.Lock()
+
+    @property
+    def last_seq(self):
+        return self.next_seq - 1
+
+    def append(self, message_type, data):
+        """分配序号、编码并保存消息，返回(序号, 编码后的消息)"""
+        with self.lock:
+            seq = self.next_seq
+            self.next_seq += 1
+            payload = encode_message(message_type, data, seq, self.stream_id)
+            self.samples.append((seq, payload, data))
+        return seq, payload
+
+    def since(self, last_seq):
+        """返回序号大于last_seq的已保存(序号, 消息, 原始数据)，以及当前保存的最旧序号"""
+        with self.lock:
+            if not self.samples:
+                return [], self.next_seq
+            oldest = self.samples[0][0]
+            start = max(0, last_seq + 1 - oldest)
+            return list(islice(self.samples, start, None)), oldest
+
+
+def flatten_fields(data, prefix=""):
+    """将嵌套的遥测数据展开为 {"adc_data.channel0_voltage": 值} 形式"""
+    flat = {}
+    if isinstance(data, dict):
+        for key, value in data.items():
+            flat.update(flatten_fields(value, f"{prefix}{key}."))
+    elif isinstance(data, (list, tuple)):
+        for index, value in enumerate(data):
+            flat.update(flatten_fields(value, f"{prefix}{index}."))
+    elif prefix:
+        flat[prefix[:-1]] = data
+    return flat
+
+
+def unflatten_fields(flat):
+    """flatten_fields 的逆操作，数字下标还原为列表"""
+    root = {}
+    for key, value in flat.items():
+        parts = key.split(".")
+        node = root
+        for part in parts[:-1]:
+            node = node.setdefault(part, {})
+        node[parts[-1]] = value
+
+    def restore_lists(node):
+        if not isinstance(node, dict):
+            return node
+        node = {key: restore_lists(value) for key, value in node.items()}
+        if node and all(key.isdigit() for key in node):
+            return [node[key] for key in sorted(node, key=int)]
+        return node
+
+    return restore_lists(root)
+
+
+class TelemetrySubscription:
+    """单个客户端的遥测订阅：字段过滤、限频和窗口聚合"""
+
+    def __init__(self, fields=None, max_rate=None, aggregate=AGGREGATE_LATEST):
+        if aggregate not in AGGREGATE_MODES:
+            raise ValueError(f"未知的聚合方式: {aggregate}")
+        if max_rate is not None:
+            max_rate = float(max_rate)
+            if max_rate <= 0:
+                raise ValueError("max_rate必须大于0")
+
+        self.fields = self._expand_fields(fields)
+        self.max_rate = max_rate
+        self.interval = 1.0 / max_rate if max_rate else 0
+        self.aggregate = aggregate
+        self.lock = threading.Lock()  # add() 在采集线程中调用，flush() 也可能在指令线程中调用
+        self._reset_window()
+
+    @staticmethod
+    def _expand_fields(fields):
+        if not fields:
+            return None
+        if isinstance(fields, str):
+            fields = [fields]
+        expanded = []
+        for field in fields:
+            expanded.extend(FIELD_ALIASES.get(field, [field]))
+        return tuple(expanded)
+
+    def describe(self):
+        return {"fields": list(self.fields) if self.fields else None,
+                "max_rate": self.max_rate, "aggregate": self.aggregate}
+
+    def project(self, data):
+        """只保留订阅的字段（前缀匹配）"""
+        flat = flatten_fields(data)
+        if self.fields is None:
+            return flat
+        return {key: value for key, value in flat.items()
+                if any(key == field or key.startswith(field + ".") for field in self.fields)}
+
+    def _reset_window(self):
+        self.window_start = None
+        self.first_seq = None
+        self.last_seq = None
+        self.count = 0
+        self.latest = {}
+        self.sums = {}
+        self.mins = {}
+        self.maxs = {}
+
+    def add(self, seq, data, now=None):
+        """加入一条样本，窗口到期时返回要发送的数据，否则返回None"""
+        now = time.time() if now is None else now
+        values = self.project(data)
+        with self.lock:
+            self._add_values(seq, values, now)
+            if now - self.window_start < self.interval:
+                return None
+            return self._emit()
+
+    def flush(self, now=None, force=False):
+        """窗口已到期（force为True时不论是否到期）且有未发送的样本时，返回 (窗口最后的序号, 要发送的数据)，否则返回None"""
+        now = time.time() if now is None else now
+        with self.lock:
+            if self.window_start is None or (not force and now - self.window_start < self.interval):
+                return None
+            seq = self.last_seq
+            return seq, self._emit()
+
+    def _add_values(self, seq, values, now):
+        if self.window_start is None:
+            self.window_start = now
+            self.first_seq = seq
+        self.last_seq = seq
+        self.count += 1
+        self.latest = values
+
+        if self.aggregate != AGGREGATE_LATEST:
+            for key, value in values.items():
+                if not isinstance(value, (int, float)) or isinstance(value, bool):
+                    continue
+                if self.aggregate == AGGREGATE_MEAN:
+                    total, n = self.sums.get(key, (0.0, 0))
+                    self.sums[key] = (total + value, n + 1)
+                else:
+                    self.mins[key] = value if key not in self.mins else min(self.mins[key], value)
+                    self.maxs[key] = value if key not in self.maxs else max(self.maxs[key], value)
+
+    def _emit(self):
+        """当前窗口的聚合结果，并开始新窗口"""
+        result = dict(self.latest)
+        if self.aggregate == AGGREGATE_MEAN:
+            for key, (total, n) in self.sums.items():
+                result[key] = total / n
+        elif self.aggregate == AGGREGATE_MINMAX:
+            for key in self.mins:
+                result[key] = [self.mins[key], self.maxs[key]]
+
+        output = {"fields": result, "aggregate": self.aggregate,
+                  "count": self.count, "first_seq": self.first_seq}
+        self._reset_window()
+        return output
+
+
+class TelemetryChannel:
+    """单个客户端的发送通道，发送线程与采集线程解耦"""
+
+    def __init__(self, sock, address=None, policy=DROP_OLDEST,
+                 max_queue=DEFAULT_QUEUE_SIZE, block_timeout=DEFAULT_BLOCK_TIMEOUT,
+                 resume_wait=RESUME_WAIT):
+        if policy not in SEND_POLICIES:
+            raise ValueError(f"未知的发送策略: {policy}")
+
+        self.sock = sock
+        self.address = address
+        self.policy = policy
+        self.max_queue = max(1, int(max_queue))
+        self.block_timeout = block_timeout
+
+        self.condition = threading.Condition()
+        self.control_queue = deque()
+        self.replay_queue = deque()
+        self.telemetry_queue = deque()  # 元素为(序号, 编码后的消息)
+        self.closed = False
+        
+        # 连接建立后先暂存遥测消息，等待客户端发送resume后再开始发送
+        self.hold_until = time.time() + resume_wait
+        
+        # 遥测订阅，None表示接收完整的RUNTIME_STATUS
+        self.subscription = None
+
+        # 统计计数
+        self.sent_messages = 0
+        self.sent_bytes = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.send_errors = 0
+        self.replayed = 0
+        self.max_queue_depth = 0
+        self.last_reported_dropped = 0
+        self.last_report_time = 0
+        self.traffic = RateMeter()
+        self.send_times = Histogram(SEND_TIME_BOUNDS)  # 毫秒，发送缓冲区满（WiFi拥塞）时变长
+
+        self.writer_thread = threading.Thread(target=self._writer_loop, daemon=True)
+        self.writer_thread.start()
+
+    def set_policy(self, policy, max_queue=None, block_timeout=None):
+        """修改队列满时的处理策略"""
+        if policy not in SEND_POLICIES:
+            raise ValueError(f"未知的发送策略: {policy}")
+        with self.condition:
+            self.policy = policy
+            if max_queue is not None:
+                self.max_queue = max(1, int(max_queue))
+            if block_timeout is not None:
+                self.block_timeout = max(0.0, float(block_timeout))
+            limit = 1 if policy == COALESCE_LATEST else self.max_queue
+            while len(self.telemetry_queue) > limit:
+                self.telemetry_queue.popleft()
+                self.dropped += 1
+            self.condition.notify_all()
+
+    def send_control(self, payload):
+        """控制消息入队，不受遥测队列上限影响"""
+        with self.condition:
+            if self.closed:
+                return False
+            self.control_queue.append(payload)
+            self.condition.notify_all()
+        return True
+
+    def publish(self, payload, seq=None):
+        """遥测消息入队，按策略处理队列满的情况；返回消息是否入队"""
+        with self.condition:
+            if self.closed:
+                return False
+
+            if self.policy == COALESCE_LATEST:
+                if self.telemetry_queue:
+                    self.telemetry_queue.clear()
+                    self.coalesced += 1
+                    self.dropped += 1
+            elif len(self.telemetry_queue) >= self.max_queue:
+                if self.policy == DROP_OLDEST:
+                    self.telemetry_queue.popleft()
+                    self.dropped += 1
+                else:
+                    self.condition.wait_for(
+                        lambda: self.closed or len(self.telemetry_queue) < self.max_queue,
+                        self.block_timeout)
+                    if self.closed or len(self.telemetry_queue) >= self.max_queue:
+                        self.dropped += 1
+                        return False
+
+            self.telemetry_queue.append((seq, payload))
+            self.max_queue_depth = max(self.max_queue_depth, len(self.telemetry_queue))
+            self.condition.notify_all()
+        return True
+
+    def subscribe(self, subscription, stream_id=None):
+        """设置遥测订阅，None表示恢复为完整数据；原订阅中未发送的窗口先发出"""
+        with self.condition:
+            previous = self.subscription
+            self.subscription = subscription
+            self.telemetry_queue.clear()
+        if previous is not None:
+            self._publish_window(previous.flush(force=True), stream_id)
+
+    def flush_subscription(self, stream_id, now=None, force=False):
+        """发出订阅中已到期（force为True时为全部）但因没有新样本而未发送的窗口，返回是否发出"""
+        subscription = self.subscription
+        if subscription is None:
+            return False
+        return self._publish_window(subscription.flush(now, force), stream_id)
+
+    def _publish_window(self, window, stream_id):
+        if window is None:
+            return False
+        seq, output = window
+        return self.publish(encode_message("TELEMETRY", output, seq, stream_id), seq)
+
+    def publish_sample(self, seq, payload, data, stream_id):
+        """
+        按订阅发布一条遥测样本
+
+        payload为所有未订阅客户端共享的编码消息；有订阅时按窗口聚合后单独编码。
+        """
+        subscription = self.subscription
+        if subscription is None:
+            return self.publish(payload, seq)
+        output = subscription.add(seq, data)
+        if output is None:
+            return False
+        return self.publish(encode_message("TELEMETRY", output, seq, stream_id), seq)
+
+    def start_replay(self, items, stream_id=None):
+        """
+        补发历史消息并开始发送实时遥测
+
+        items: TelemetryHistory.since() 返回的(序号, 消息, 原始数据)列表。
+        队列中已包含在补发范围内的消息会被移除，避免重复发送。
+        有订阅时补发的每条样本只包含订阅的字段，不做聚合。
+        """
+        with self.condition:
+            if items:
+                replay_last = items[-1][0]
+                subscription = self.subscription
+                for seq, payload, data in items:
+                    if subscription is not None:
+                        payload = encode_message("TELEMETRY", {
+                            "fields": subscription.project(data), "aggregate": AGGREGATE_LATEST,
+                            "count": 1, "first_seq": seq}, seq, stream_id)
+                    self.replay_queue.append(payload)
+                self.replayed += len(items)
+                while (self.telemetry_queue and self.telemetry_queue[0][0] is not None
+                       and self.telemetry_queue[0][0] <= replay_last):
+                    self.telemetry_queue.popleft()
+            self.hold_until = 0
+            self.condition.notify_all()
+
+    def release(self):
+        """不补发历史，直接开始发送实时遥测"""
+        self.start_replay([])
+
+    def stats(self):
+        """返回发送统计"""
+        messages_per_s, bytes_per_s = self.traffic.rates()
+        with self.condition:
+            return {
+                "policy": self.policy,
+                "max_queue": self.max_queue,
+                "queue_depth": len(self.telemetry_queue),
+                "max_queue_depth": self.max_queue_depth,
+                "sent_messages": self.sent_messages,
+                "sent_bytes": self.sent_bytes,
+                "dropped": self.dropped,
+                "coalesced": self.coalesced,
+                "replayed": self.replayed,
+                "send_errors": self.send_errors,
+                "messages_per_s": round(messages_per_s, 2),
+                "bytes_per_s": round(bytes_per_s)
+            }
+
+    def close(self):
+        """关闭通道并唤醒发送线程"""
+        with self.condition:
+            if self.closed:
+                return
+            self.closed = True
+            self.condition.notify_all()
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+    def _next_payload(self):
+        """取出下一条待发送消息（控制消息优先），并判断是否需要上报丢弃统计"""
+        with self.condition:
+            def ready():
+                holding = time.time() < self.hold_until
+                return (self.closed or self.control_queue or self.replay_queue
+                        or (self.telemetry_queue and not holding))
+
+            hold_remaining = self.hold_until - time.time()
+            timeout = min(0.5, hold_remaining) if hold_remaining > 0 else 0.5
+            self.condition.wait_for(ready, timeout)
+            if self.closed:
+                return None, False
+
+            stats_due = False
+            now = time.time()
+            if (self.dropped != self.last_reported_dropped
+                    and now - self.last_report_time >= STATS_REPORT_INTERVAL):
+                self.last_reported_dropped = self.dropped
+                self.last_report_time = now
+                stats_due = True
+
+            payload = None
+            if self.control_queue:
+                payload = self.control_queue.popleft()
+            elif self.replay_queue:
+                payload = self.replay_queue.popleft()
+            elif self.telemetry_queue and time.time() >= self.hold_until:
+                _, payload = self.telemetry_queue.popleft()
+            self.condition.notify_all()
+            return payload, stats_due
+
+    def _send(self, payload):
+        try:
+            began = time.perf_counter()
+            self.sock.sendall(payload)
+            self.send_times.add((time.perf_counter() - began) * 1000)
+            self.sent_messages += 1
+            self.sent_bytes += len(payload)
+            self.traffic.add(1, len(payload))
+            return True
+        except Exception as e:
+            self.send_errors += 1
+            if not self.closed:
+                print(f"发送消息错误({self.address}): {e}")
+            self.close()
+            return False
+
+    def _writer_loop(self):
+        while not self.closed:
+            payload, stats_due = self._next_payload()
+            if stats_due and not self._send(encode_message("TELEMETRY_STATS", self.stats())):
+                break
+            if payload and not self._send(payload):
+                break
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+接收端遥测记录 - 把收到的每个传感器样本写入本机的分段CSV文件
+功能：
+1. 作为 ReceiverClient 的监听回调，网络线程只把数据行放入队列，由 CSVRecorder 的后台线程写文件
+2. 列与发送端 ns 时间戳模式的CSV相同（timestamp_ns 加 SENSOR_SCHEMA 各列），plot_data.py 可直接读取
+3. 按大小/时长切换分段并维护分段清单，记录过程中即可用 plot_data.py 分析已写入的数据
+4. 最小最大值聚合的遥测窗口不是单个样本，不记录；时间戳不晚于上一行的重复样本跳过
+
+用法：
+    recorder = TelemetryRecorder("received")
+    client.add_listener(recorder.on_client_event)
+    ...
+    recorder.close()
+"""
+
+import datetime
+import os
+import threading
+import time
+
+from columnar_format import SENSOR_SCHEMA
+from receiver_client import ClientEvent
+from recorder import CSVRecorder, DEFAULT_ROTATE_BYTES, DEFAULT_ROTATE_SECONDS
+from telemetry import flatten_fields
+
+# CSV列 -> 消息中展开后的字段名
+FIELD_COLUMNS = {
+    "voltage_ch0": "adc_data.channel0_voltage",
+    "current_ch1": "adc_data.channel1_current",
+    "voltage_ch2": "adc_data.channel2_voltage",
+    "voltage_ch3": "adc_data.channel3_voltage",
+    "raw_ch0": "adc_data.raw_values.0",
+    "raw_ch1": "adc_data.raw_values.1",
+    "raw_ch2": "adc_data.raw_values.2",
+    "raw_ch3": "adc_data.raw_values.3",
+    "lux": "env_data.lux",
+    "temperature": "env_data.temperature",
+    "pressure": "env_data.pressure",
+    "humidity": "env_data.humidity",
+    "altitude": "env_data.altitude",
+}
+RECORD_HEADERS = [name for name, _ in SENSOR_SCHEMA]
+RECORD_FIELDS = [FIELD_COLUMNS[name] for name in RECORD_HEADERS[1:]]
+
+
+def sample_row(time_ns, data):
+    """一条消息中的传感器数据 -> CSV数据行，缺少的值留空；没有任何测量值时返回None"""
+    fields = flatten_fields(data)
+    values = [fields.get(field) for field in RECORD_FIELDS]
+    values = [value if isinstance(value, (int, float)) and not isinstance(value, bool) else ""
+              for value in values]
+    if all(value == "" for value in values):
+        return None
+    return [time_ns] + values
+
+
+class TelemetryRecorder:
+    """把 ClientEvent.SENSOR 样本写入 folder 中的 received_YYYYmmdd_HHMMSS.csv（启用分段时为 _0001 ...）
+    同时记录多台发送端时用 name 区分文件：received_名称_YYYYmmdd_HHMMSS.csv"""
+
+    def __init__(self, folder, rotate_bytes=DEFAULT_ROTATE_BYTES, rotate_seconds=DEFAULT_ROTATE_SECONDS,
+                 sender=None, name=None, **options):
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        metadata = {"source": "receiver"}
+        if sender:
+            metadata["sender"] = sender
+        prefix = f"received_{name}_" if name else "received_"
+        self.recorder = CSVRecorder(os.path.join(folder, f"{prefix}{timestamp}.csv"), RECORD_HEADERS,
+                                    integer_timestamps=True, rotate_bytes=rotate_bytes,
+                                    rotate_seconds=rotate_seconds, metadata=metadata, **options)
+        self.lock = threading.Lock()
+        self.last_time_ns = 0
+        self.samples = 0
+        self.skipped = 0
+
+    @property
+    def manifest_path(self):
+        return self.recorder.manifest.path
+
+    def on_client_event(self, event, value):
+        """ReceiverClient 监听回调（网络线程中调用，只入队）"""
+        if event == ClientEvent.SENSOR:
+            self.record(*value)
+
+    def record(self, time_ns, data):
+        """记录一个样本，返回是否写入"""
+        row = sample_row(time_ns or time.time_ns(), data)
+        with self.lock:
+            if row is None or row[0] <= self.last_time_ns:
+                self.skipped += 1
+                return False
+            self.last_time_ns = row[0]
+            self.samples += 1
+        return self.recorder.write_row(row)
+
+    def close(self):
+        """写完队列中剩余的数据后关闭文件"""
+        self.recorder.close()
+
+    def stats(self):
+        """写入吞吐量统计（CSVRecorder.stats）加上接收的样本数"""
+        stats = self.recorder.stats()
+        stats["samples"] = self.samples
+        stats["skipped"] = self.skipped
+        return stats
+
+    def summary(self):
+        """一行统计文字"""
+        stats = self.stats()
+        return (f"遥测记录: {stats['rows_written']} 行 ({stats['rows_per_sec']}/秒), {stats['bytes_written']} 字节, "
+                f"跳过 {stats['skipped']}, 分段 {stats['segment']} 个, 清单: {stats['manifest']}")
+
+
+def add_record_arguments(parser):
+    """接收端GUI和守护进程共用的记录参数"""
+    parser.add_argument('--record', metavar='DIR', help='把收到的遥测样本记录到该目录（CSV，可用plot_data.py分析）')
+    parser.add_argument('--rotate-mb', type=float, default=DEFAULT_ROTATE_BYTES / 1024 / 1024,
+                        help='记录文件分段大小（MB，0表示不按大小切换）')
+    parser.add_argument('--rotate-minutes', type=float, default=DEFAULT_ROTATE_SECONDS / 60,
+                        help='记录文件分段时长（分钟，0表示不按时长切换）')
+
+
+def open_recorder(args, sender=None, name=None):
+    """按命令行参数创建记录器；未指定 --record 时返回None，目录不存在时返回False"""
+    if not args.record:
+        return None
+    if not os.path.isdir(args.record):
+        print(f"错误: 目录 {args.record} 不存在")
+        return False
+    recorder = TelemetryRecorder(args.record, int(args.rotate_mb * 1024 * 1024), args.rotate_minutes * 60,
+                                 sender=sender, name=name)
+    print(f"遥测记录: {recorder.manifest_path}")
+    return recorder
@@ -1,65 +1,92 @@
 # -*- coding: utf-8 -*-
-import socket
-import os
+import argparse
 import datetime
 import threading
-import sys
-import time
-import json
+import queue
 import tkinter as tk
-from tkinter import ttk, scrolledtext
+from tkinter import ttk
 from tkinter import messagebox
 
-# 图像接收配置
-IMAGE_HOST = '0.0.0.0'
-IMAGE_PORT = 8888
+from file_transfer import FileTransferClient, TRANSFER_PORT
+from receiver_client import ReceiverClient, ClientEvent, SENDER_IP, COMMAND_PORT, IMAGE_HOST, IMAGE_PORT
+from telemetry_recorder import add_record_arguments, open_recorder
+from log_panel import LogPanel, make_record, add_log_arguments, DEFAULT_MAX_LINES
+from link_stats_panel import LinkStatsPanel, REFRESH_INTERVAL as LINK_STATS_REFRESH_INTERVAL
 
-# 指令发送配置
-SENDER_IP = '192.168.1.205'  # 发送端的IP地址，需要根据实际情况修改
-COMMAND_PORT = 8889
+# 实时曲线需要NumPy，不可用时只显示数值
+try:
+    from strip_chart import ChartPanel, RingBuffer, record_sample, REFRESH_INTERVAL as CHART_REFRESH_INTERVAL
+    CHARTS_AVAILABLE = True
+except ImportError:
+    CHARTS_AVAILABLE = False
 
-# 全局变量控制程序运行
-running = True
-command_socket = None
-image_connected = False
-command_connected = False
-last_runtime_status = ""
-last_gpio_data = ""
-last_temp_humidity = ""
-latest_sensor_data = None  # 存储最新的传感器数据
+# 图像预览需要Pillow
+try:
+    from image_preview import FrameDecoder, PreviewPanel, REFRESH_INTERVAL as PREVIEW_REFRESH_INTERVAL
+    PREVIEW_AVAILABLE = True
+except ImportError:
+    PREVIEW_AVAILABLE = False
 
-# 状态变量
-monitoring_status = False
-data_recording_status = False
-combined_status = False
+# 结果文件下载目录
+DOWNLOAD_DIR = 'downloads'
 
-# 记录时间相关变量
-monitoring_start_time = None
-data_recording_start_time = None
-combined_start_time = None
+# 网络线程投递给GUI的事件队列，由Tk主循环批量处理
+ui_events = queue.SimpleQueue()
+UI_DRAIN_INTERVAL = 50  # 事件队列处理间隔（毫秒）
+UI_TICK_INTERVAL = 500  # 计时显示刷新间隔（毫秒）
 
-# 消息类型定义
-class MessageType:
-    STATUS = "STATUS"
-    RUNTIME_STATUS = "RUNTIME_STATUS"
-    GPIO_DATA = "GPIO_DATA"
-    TEMP_HUMIDITY = "TEMP_HUMIDITY"
-    SYSTEM_INFO = "SYSTEM_INFO"
+# 记录模式 -> (按钮, 关闭时文字, 开启时文字, 开启时颜色)
+MODE_BUTTONS = {
+    "monitoring": ("monitoring_btn", "开启数据监测", "停止数据监测", "lightgreen"),
+    "data_recording": ("data_recording_btn", "开启数据记录", "停止数据记录", "lightblue"),
+    "combined": ("combined_btn", "录像+数据", "停止录像+数据", "lightgreen"),
+}
+
+# GUI事件类型（事件为 (类型, 键, 值) 元组）
+class UIEvent:
+    LOG = "LOG"        # 日志记录 (级别, 时间戳, 文字)，全部保留
+    WIDGET = "WIDGET"  # 控件配置，键为控件属性名，同一控件只保留最新值
+    SENSOR = "SENSOR"  # 有新的传感器数据，多次合并为一次显示更新
+    STATE = "STATE"    # 连接/运行状态已变化，重新生成状态标签
+
+def post_ui_event(kind, key=None, value=None):
+    """投递GUI事件（任意线程可调用）"""
+    ui_events.put((kind, key, value))
+
+def post_widget(name, **options):
+    """投递控件配置，例如 post_widget("monitoring_btn", text=..., bg=...)"""
+    post_ui_event(UIEvent.WIDGET, name, options)
 
 class WiFiReceiverGUI:
-    def __init__(self, root):
+    def __init__(self, root, client, log_lines=DEFAULT_MAX_LINES, log_file=None, log_level="INFO"):
         self.root = root
+        self.client = client
+        self.log_options = {"max_lines": log_lines, "log_file": log_file, "min_level": log_level}
         self.root.title("WiFi摄像头控制系统 - 接收端")
         self.root.geometry("800x600")
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
         
+        # 各控件最近一次设置的选项，只在实际变化时调用config
+        self.widget_state = {}
+        self.chart_window = None
+        self.chart_panel = None
+        self.sensor_history = None  # 实时曲线的样本缓存（固定大小），第一次打开曲线窗口时分配
+        self.preview_window = None
+        self.preview_panel = None
+        self.image_decoder = None  # 预览窗口打开时才解码
+        self.link_stats_window = None
+        self.link_stats_panel = None
+        self.latest_image = None
+        
         # 创建主框架
         self.create_widgets()
         
-        # 启动后台线程
-        self.start_background_threads()
+        # 客户端事件在网络线程中回调，转为GUI事件
+        self.client.add_listener(self.on_client_event)
         
-        # 定期更新GUI
+        # 处理事件队列，定期更新计时显示
+        self.update_status_labels()
+        self.process_ui_events()
         self.update_gui()
     
     def create_widgets(self):
@@ -94,6 +121,8 @@ class WiFiReceiverGUI:
                                       command=self.toggle_monitoring,
                                       width=15, height=2, font=("Arial", 10))
         self.monitoring_btn.pack(side="left", padx=5)
+        # 按钮默认背景色（各平台不同，Windows的SystemButtonFace在Linux/macOS上不存在）
+        self.button_bg = self.monitoring_btn.cget("bg")
         
         # 数据记录控制按钮
         self.data_recording_btn = tk.Button(row1_frame, text="开启数据记录", 
@@ -107,6 +136,22 @@ class WiFiReceiverGUI:
                                     width=15, height=2, font=("Arial", 10))
         self.combined_btn.pack(side="left", padx=5)
         
+        # 实时曲线按钮
+        self.chart_btn = tk.Button(row1_frame, text="实时曲线", 
+                                 command=self.open_charts,
+                                 width=15, height=2, font=("Arial", 10))
+        self.chart_btn.pack(side="left", padx=5)
+        if not CHARTS_AVAILABLE:
+            self.chart_btn.config(state="disabled")
+        
+        # 图像预览按钮
+        self.preview_btn = tk.Button(row1_frame, text="图像预览", 
+                                   command=self.open_preview,
+                                   width=15, height=2, font=("Arial", 10))
+        self.preview_btn.pack(side="left", padx=5)
+        if not PREVIEW_AVAILABLE:
+            self.preview_btn.config(state="disabled")
+        
         # 第二行按钮
         row2_frame = tk.Frame(button_frame)
         row2_frame.pack(pady=5)
@@ -117,6 +162,18 @@ class WiFiReceiverGUI:
                                       width=15, height=2, font=("Arial", 10))
         self.send_image_btn.pack(side="left", padx=5)
         
+        # 下载结果文件按钮
+        self.download_btn = tk.Button(row2_frame, text="下载结果文件", 
+                                    command=self.download_results,
+                                    width=15, height=2, font=("Arial", 10))
+        self.download_btn.pack(side="left", padx=5)
+        
+        # 连接统计按钮
+        self.link_stats_btn = tk.Button(row2_frame, text="连接统计", 
+                                      command=self.open_link_stats,
+                                      width=15, height=2, font=("Arial", 10))
+        self.link_stats_btn.pack(side="left", padx=5)
+        
         # 停止发送端按钮
         self.stop_sender_btn = tk.Button(row2_frame, text="停止发送端", 
                                        command=self.stop_sender,
@@ -208,78 +265,33 @@ class WiFiReceiverGUI:
                                           font=("Arial", 10), anchor="w", fg="purple")
         self.combined_time_label.pack(fill="x", pady=2)
         
-        # 日志显示区域
-        log_label = tk.Label(info_frame, text="系统日志:", font=("Arial", 10, "bold"))
-        log_label.pack(anchor="w", pady=(10, 5))
-        
-        self.log_text = scrolledtext.ScrolledText(info_frame, height=15, width=80, 
-                                                font=("Consolas", 9))
-        self.log_text.pack(fill="both", expand=True)
-        
-    def log_message(self, message):
-        """在日志区域添加消息"""
-        timestamp = datetime.datetime.now().strftime("%H:%M:%S")
-        log_entry = f"[{timestamp}] {message}\n"
+        # 日志显示区域（有界，按级别过滤，全部日志写入轮换的日志文件）
+        self.log_panel = LogPanel(info_frame, **self.log_options)
+        self.log_panel.pack(fill="both", expand=True)
         
-        # 在主线程中更新GUI
-        self.root.after(0, lambda: self._append_log(log_entry))
-    
-    def _append_log(self, log_entry):
-        """在GUI主线程中添加日志"""
-        self.log_text.insert(tk.END, log_entry)
-        self.log_text.see(tk.END)
-        
-        # 限制日志行数，保留最后1000行
-        lines = self.log_text.get("1.0", tk.END).split('\n')
-        if len(lines) > 1000:
-            self.log_text.delete("1.0", f"{len(lines) - 1000}.0")
+    def log_message(self, message, level=None):
+        """在日志区域添加消息（任意线程可调用），未指定级别时按内容判断"""
+        post_ui_event(UIEvent.LOG, value=make_record(message, level))
     
     def toggle_monitoring(self):
         """切换数据监测状态"""
-        global monitoring_status, monitoring_start_time
-        if not monitoring_status:
-            self.send_command("start_monitoring")
-            monitoring_status = True
-            monitoring_start_time = datetime.datetime.now()
-            self.monitoring_btn.config(text="停止数据监测", bg="lightgreen")
+        if self.client.toggle_mode("monitoring"):
             self.log_message("开启数据监测")
         else:
-            self.send_command("stop_monitoring")
-            monitoring_status = False
-            monitoring_start_time = None
-            self.monitoring_btn.config(text="开启数据监测", bg="SystemButtonFace")
             self.log_message("停止数据监测")
     
     def toggle_data_recording(self):
         """切换数据记录状态"""
-        global data_recording_status, data_recording_start_time
-        if not data_recording_status:
-            self.send_command("cb")
-            data_recording_status = True
-            data_recording_start_time = datetime.datetime.now()
-            self.data_recording_btn.config(text="停止数据记录", bg="lightblue")
+        if self.client.toggle_mode("data_recording"):
             self.log_message("开启数据记录")
         else:
-            self.send_command("cs")
-            data_recording_status = False
-            data_recording_start_time = None
-            self.data_recording_btn.config(text="开启数据记录", bg="SystemButtonFace")
             self.log_message("停止数据记录")
     
     def toggle_combined(self):
         """切换录像+数据状态"""
-        global combined_status, combined_start_time
-        if not combined_status:
-            self.send_command("rcb")
-            combined_status = True
-            combined_start_time = datetime.datetime.now()
-            self.combined_btn.config(text="停止录像+数据", bg="lightgreen")
+        if self.client.toggle_mode("combined"):
             self.log_message("开启延时录像+数据记录")
         else:
-            self.send_command("rcs")
-            combined_status = False
-            combined_start_time = None
-            self.combined_btn.config(text="录像+数据", bg="SystemButtonFace")
             self.log_message("停止延时录像+数据记录")
     
     def send_current_image(self):
@@ -287,6 +299,121 @@ class WiFiReceiverGUI:
         self.send_command("s")
         self.log_message("请求发送当前图像")
     
+    def download_results(self):
+        """在后台线程中下载发送端所有结果文件夹（支持断点续传）"""
+        self.set_widget("download_btn", state="disabled")
+        self.log_message(f"开始从 {self.client.sender_ip}:{TRANSFER_PORT} 下载结果文件到 {DOWNLOAD_DIR}/ ...")
+        
+        def download_worker():
+            client = FileTransferClient(self.client.sender_ip, TRANSFER_PORT, log=self.log_message)
+            try:
+                files = client.list_files()
+                folders = sorted(set(item["path"].split("/")[0] for item in files))
+                total = 0
+                failed = 0
+                for folder in folders:
+                    done = client.download_folder(folder, DOWNLOAD_DIR)
+                    total += len(done)
+                    failed += len(client.failed)
+                    self.log_message(f"文件夹 {folder} 同步完成，新下载 {len(done)} 个文件")
+                message = f"结果文件下载完成，共 {len(folders)} 个文件夹，新下载 {total} 个文件"
+                if failed:
+                    message += f"，{failed} 个文件失败（见上方日志）"
+                self.log_message(message)
+            except Exception as e:
+                self.log_message(f"下载结果文件失败: {e}，再次点击可续传")
+            finally:
+                client.close()
+                post_widget("download_btn", state="normal")
+        
+        threading.Thread(target=download_worker, daemon=True).start()
+    
+    def open_charts(self):
+        """打开实时曲线窗口（已打开时置于前台）"""
+        if self.chart_window:
+            self.chart_window.lift()
+            return
+        if self.sensor_history is None:
+            self.sensor_history = RingBuffer()
+        self.chart_window = tk.Toplevel(self.root)
+        self.chart_window.title("实时曲线")
+        self.chart_window.protocol("WM_DELETE_WINDOW", self.close_charts)
+        self.chart_panel = ChartPanel(self.chart_window, self.sensor_history)
+        self.chart_panel.pack(padx=10, pady=5)
+        self.refresh_charts()
+    
+    def close_charts(self):
+        """关闭实时曲线窗口，样本缓存继续记录"""
+        if self.chart_window:
+            self.chart_window.destroy()
+        self.chart_window = None
+        self.chart_panel = None
+    
+    def refresh_charts(self):
+        """定期重绘曲线，窗口关闭后停止"""
+        if not self.chart_panel:
+            return
+        self.chart_panel.refresh()
+        self.root.after(CHART_REFRESH_INTERVAL, self.refresh_charts)
+    
+    def open_preview(self):
+        """打开图像预览窗口（已打开时置于前台），先显示最近收到的一张"""
+        if self.preview_window:
+            self.preview_window.lift()
+            return
+        self.image_decoder = FrameDecoder()
+        if self.latest_image:
+            self.image_decoder.submit(self.latest_image)
+        self.preview_window = tk.Toplevel(self.root)
+        self.preview_window.title("图像预览")
+        self.preview_window.protocol("WM_DELETE_WINDOW", self.close_preview)
+        self.preview_panel = PreviewPanel(self.preview_window, self.image_decoder)
+        self.preview_panel.pack(padx=10, pady=5)
+        self.refresh_preview()
+    
+    def close_preview(self):
+        """关闭图像预览窗口并停止解码线程"""
+        decoder, self.image_decoder = self.image_decoder, None
+        if decoder:
+            decoder.stop()
+        if self.preview_window:
+            self.preview_window.destroy()
+        self.preview_window = None
+        self.preview_panel = None
+    
+    def refresh_preview(self):
+        """定期显示解码好的图像，窗口关闭后停止"""
+        if not self.preview_panel:
+            return
+        self.preview_panel.refresh()
+        self.root.after(PREVIEW_REFRESH_INTERVAL, self.refresh_preview)
+    
+    def open_link_stats(self):
+        """打开连接统计窗口（已打开时置于前台），打开期间定期查询发送端统计"""
+        if self.link_stats_window:
+            self.link_stats_window.lift()
+            return
+        self.link_stats_window = tk.Toplevel(self.root)
+        self.link_stats_window.title("连接统计")
+        self.link_stats_window.protocol("WM_DELETE_WINDOW", self.close_link_stats)
+        self.link_stats_panel = LinkStatsPanel(self.link_stats_window, self.client)
+        self.link_stats_panel.pack(padx=10, pady=5, fill="x")
+        self.refresh_link_stats()
+    
+    def close_link_stats(self):
+        """关闭连接统计窗口，不再查询发送端统计"""
+        if self.link_stats_window:
+            self.link_stats_window.destroy()
+        self.link_stats_window = None
+        self.link_stats_panel = None
+    
+    def refresh_link_stats(self):
+        """定期刷新统计，窗口关闭后停止"""
+        if not self.link_stats_panel:
+            return
+        self.link_stats_panel.refresh()
+        self.root.after(LINK_STATS_REFRESH_INTERVAL, self.refresh_link_stats)
+    
     def stop_sender(self):
         """停止发送端程序"""
         if messagebox.askokcancel("停止发送端", "确定要停止发送端程序吗？"):
@@ -295,28 +422,43 @@ class WiFiReceiverGUI:
     
     def send_command(self, command):
         """发送指令到发送端"""
-        global command_socket, command_connected
-        if command_connected and command_socket:
-            try:
-                command_socket.sendall(f"{command}\n".encode())
-                self.log_message(f"已发送指令: {command}")
-            except Exception as e:
-                self.log_message(f"发送指令失败: {e}，连接可能已断开")
-                command_connected = False
-        else:
-            self.log_message("未连接到发送端，无法发送指令")
+        self.client.send_command(command)
+    
+    def on_client_event(self, event, value):
+        """客户端事件（网络线程中调用）转为GUI事件"""
+        if event == ClientEvent.LOG:
+            self.log_message(value)
+        elif event == ClientEvent.STATE:
+            post_ui_event(UIEvent.STATE)
+        elif event == ClientEvent.SENSOR:
+            # 每个样本都写入曲线缓存（GUI事件只保留最新值，曲线需要完整数据）
+            history = self.sensor_history
+            if history is not None:
+                record_sample(history, *value)
+            post_ui_event(UIEvent.SENSOR)
+        elif event == ClientEvent.MODE:
+            mode, active = value
+            name, off_text, on_text, on_color = MODE_BUTTONS[mode]
+            post_widget(name, text=on_text if active else off_text, bg=on_color if active else self.button_bg)
+            post_ui_event(UIEvent.STATE)
+        elif event == ClientEvent.IMAGE:
+            # 只提交给解码线程，网络线程和GUI线程都不解码
+            self.latest_image = value
+            decoder = self.image_decoder
+            if decoder:
+                decoder.submit(value)
     
     def update_sensor_data_display(self):
         """更新传感器数据显示"""
-        global latest_sensor_data, monitoring_status, data_recording_status, combined_status
+        sensor_data = self.client.state.latest_sensor_data
         
         # 检查是否应该显示数据（数据监测、数据记录或录像+数据模式下）
-        should_display_data = monitoring_status or data_recording_status or combined_status
+        should_display_data = any(self.client.state.modes.values())
         
-        if should_display_data and latest_sensor_data:
+        if should_display_data and sensor_data:
             # 获取ADC数据
-            adc_data = latest_sensor_data.get('adc_data', {})
-            env_data = latest_sensor_data.get('env_data', {})
+            adc_data = sensor_data.get('adc_data', {})
+            env_data = sensor_data.get('env_data', {})
             
             if adc_data:
                 # 更新ADC数据显示
@@ -326,28 +468,28 @@ class WiFiReceiverGUI:
                 voltage_ch3 = adc_data.get('channel3_voltage', 0)
                 raw_values = adc_data.get('raw_values', [0, 0, 0, 0])
                 
-                self.voltage_label.config(
+                self.set_widget("voltage_label",
                     text=f"  通道0 - 电压: {voltage:8.2f} V    (原始值: {raw_values[0]:6})",
                     fg="darkblue"
                 )
-                self.current_label.config(
+                self.set_widget("current_label",
                     text=f"  通道1 - 电流: {current:8.2f} A    (原始值: {raw_values[1]:6})",
                     fg="darkblue"
                 )
-                self.voltage_ch2_label.config(
+                self.set_widget("voltage_ch2_label",
                     text=f"  通道2 - 电压: {voltage_ch2:8.3f} V  (原始值: {raw_values[2]:6})",
                     fg="darkblue"
                 )
-                self.voltage_ch3_label.config(
+                self.set_widget("voltage_ch3_label",
                     text=f"  通道3 - 电压: {voltage_ch3:8.3f} V  (原始值: {raw_values[3]:6})",
                     fg="darkblue"
                 )
             else:
                 # ADC数据不可用
-                self.voltage_label.config(text="  通道0 - 电压: 数据不可用", fg="orange")
-                self.current_label.config(text="  通道1 - 电流: 数据不可用", fg="orange")
-                self.voltage_ch2_label.config(text="  通道2 - 电压: 数据不可用", fg="orange")
-                self.voltage_ch3_label.config(text="  通道3 - 电压: 数据不可用", fg="orange")
+                self.set_widget("voltage_label", text="  通道0 - 电压: 数据不可用", fg="orange")
+                self.set_widget("current_label", text="  通道1 - 电流: 数据不可用", fg="orange")
+                self.set_widget("voltage_ch2_label", text="  通道2 - 电压: 数据不可用", fg="orange")
+                self.set_widget("voltage_ch3_label", text="  通道3 - 电压: 数据不可用", fg="orange")
             
             if env_data:
                 # 更新环境传感器数据显示
@@ -357,88 +499,135 @@ class WiFiReceiverGUI:
                 humidity = env_data.get('humidity', 0)
                 altitude = env_data.get('altitude', 0)
                 
-                self.lux_label.config(
+                self.set_widget("lux_label",
                     text=f"  光照强度: {lux:8.2f} lux",
                     fg="darkorange"
                 )
-                self.temperature_label.config(
+                self.set_widget("temperature_label",
                     text=f"  温度: {temperature:6.2f} °C",
                     fg="red"
                 )
-                self.pressure_label.config(
+                self.set_widget("pressure_label",
                     text=f"  气压: {pressure:8.2f} Pa",
                     fg="purple"
                 )
-                self.humidity_label.config(
+                self.set_widget("humidity_label",
                     text=f"  湿度: {humidity:6.2f} %",
                     fg="blue"
                 )
-                self.altitude_label.config(
+                self.set_widget("altitude_label",
                     text=f"  海拔: {altitude:6} m",
                     fg="brown"
                 )
             else:
                 # 环境传感器数据不可用
-                self.lux_label.config(text="  光照强度: 数据不可用", fg="orange")
-                self.temperature_label.config(text="  温度: 数据不可用", fg="orange")
-                self.pressure_label.config(text="  气压: 数据不可用", fg="orange")
-                self.humidity_label.config(text="  湿度: 数据不可用", fg="orange")
-                self.altitude_label.config(text="  海拔: 数据不可用", fg="orange")
+                self.set_widget("lux_label", text="  光照强度: 数据不可用", fg="orange")
+                self.set_widget("temperature_label", text="  温度: 数据不可用", fg="orange")
+                self.set_widget("pressure_label", text="  气压: 数据不可用", fg="orange")
+                self.set_widget("humidity_label", text="  湿度: 数据不可用", fg="orange")
+                self.set_widget("altitude_label", text="  海拔: 数据不可用", fg="orange")
         else:
             # 未开启监测或无数据时显示"未检测"
-            self.voltage_label.config(text="  通道0 - 电压: 未检测", fg="gray")
-            self.current_label.config(text="  通道1 - 电流: 未检测", fg="gray")
-            self.voltage_ch2_label.config(text="  通道2 - 电压: 未检测", fg="gray")
-            self.voltage_ch3_label.config(text="  通道3 - 电压: 未检测", fg="gray")
+            self.set_widget("voltage_label", text="  通道0 - 电压: 未检测", fg="gray")
+            self.set_widget("current_label", text="  通道1 - 电流: 未检测", fg="gray")
+            self.set_widget("voltage_ch2_label", text="  通道2 - 电压: 未检测", fg="gray")
+            self.set_widget("voltage_ch3_label", text="  通道3 - 电压: 未检测", fg="gray")
             
-            self.lux_label.config(text="  光照强度: 未检测", fg="gray")
-            self.temperature_label.config(text="  温度: 未检测", fg="gray")
-            self.pressure_label.config(text="  气压: 未检测", fg="gray")
-            self.humidity_label.config(text="  湿度: 未检测", fg="gray")
-            self.altitude_label.config(text="  海拔: 未检测", fg="gray")
+            self.set_widget("lux_label", text="  光照强度: 未检测", fg="gray")
+            self.set_widget("temperature_label", text="  温度: 未检测", fg="gray")
+            self.set_widget("pressure_label", text="  气压: 未检测", fg="gray")
+            self.set_widget("humidity_label", text="  湿度: 未检测", fg="gray")
+            self.set_widget("altitude_label", text="  海拔: 未检测", fg="gray")
     
-    def update_gui(self):
-        """定期更新GUI状态"""
+    def set_widget(self, name, **options):
+        """配置控件，只提交与上次不同的选项（在GUI主线程中调用）"""
+        current = self.widget_state.setdefault(name, {})
+        changed = {key: value for key, value in options.items() if current.get(key) != value}
+        if changed:
+            getattr(self, name).config(**changed)
+            current.update(changed)
+    
+    def process_ui_events(self):
+        """批量处理网络线程投递的事件：同一控件只保留最新值，日志合并为一次插入"""
+        widgets = {}
+        logs = []
+        sensor_changed = False
+        state_changed = False
+        while True:
+            try:
+                kind, key, value = ui_events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == UIEvent.LOG:
+                logs.append(value)
+            elif kind == UIEvent.WIDGET:
+                widgets.setdefault(key, {}).update(value)
+            elif kind == UIEvent.SENSOR:
+                sensor_changed = True
+            elif kind == UIEvent.STATE:
+                state_changed = True
+        
+        try:
+            # 单个控件出错只跳过该控件，不影响其它更新
+            for name, options in widgets.items():
+                try:
+                    self.set_widget(name, **options)
+                except Exception as e:
+                    self.log_message(f"界面更新错误（{name}）: {e}", "ERROR")
+            try:
+                if state_changed:
+                    self.update_status_labels()
+                if state_changed or sensor_changed:
+                    self.update_sensor_data_display()
+            except Exception as e:
+                self.log_message(f"界面更新错误: {e}", "ERROR")
+            if logs:
+                self.log_panel.extend(logs)
+        except Exception as e:
+            print(f"写入日志区错误: {e}")
+        finally:
+            # 无论本次是否出错都继续处理后续事件
+            self.root.after(UI_DRAIN_INTERVAL, self.process_ui_events)
+    
+    def update_status_labels(self):
+        """根据客户端状态更新连接状态和运行状态标签"""
+        state = self.client.state
         # 更新连接状态
-        if command_connected:
-            self.command_status_label.config(text="指令连接状态: 已连接", fg="green")
+        if state.command_connected:
+            self.set_widget("command_status_label", text="指令连接状态: 已连接", fg="green")
         else:
-            self.command_status_label.config(text="指令连接状态: 未连接", fg="red")
+            self.set_widget("command_status_label", text="指令连接状态: 未连接", fg="red")
         
-        if image_connected:
-            self.image_status_label.config(text="图像服务器状态: 运行中", fg="green")
+        if state.image_connected:
+            self.set_widget("image_status_label", text="图像服务器状态: 运行中", fg="green")
         else:
-            self.image_status_label.config(text="图像服务器状态: 未启动", fg="red")
+            self.set_widget("image_status_label", text="图像服务器状态: 未启动", fg="red")
         
         # 更新状态信息
-        if last_runtime_status:
-            self.runtime_status_label.config(text=f"运行状态: {last_runtime_status}")
+        if state.last_runtime_status:
+            self.set_widget("runtime_status_label", text=f"运行状态: {state.last_runtime_status}")
         else:
             # 如果没有运行时状态数据，根据连接状态显示相应信息
-            if command_connected:
-                self.runtime_status_label.config(text="运行状态: 已连接，等待数据...")
+            if state.command_connected:
+                self.set_widget("runtime_status_label", text="运行状态: 已连接，等待数据...")
             else:
-                self.runtime_status_label.config(text="运行状态: 等待连接...")
-        
-        # 更新传感器数据显示
-        self.update_sensor_data_display()
+                self.set_widget("runtime_status_label", text="运行状态: 等待连接...")
         
-        if last_gpio_data:
-            self.gpio_data_label.config(text=f"GPIO数据: {last_gpio_data}")
+        if state.last_gpio_data:
+            self.set_widget("gpio_data_label", text=f"GPIO数据: {state.last_gpio_data}")
         
-        if last_temp_humidity:
-            self.temp_humidity_label.config(text=f"温湿度: {last_temp_humidity}")
-        
-        # 更新记录时间
+        if state.last_temp_humidity:
+            self.set_widget("temp_humidity_label", text=f"温湿度: {state.last_temp_humidity}")
+    
+    def update_gui(self):
+        """定期更新计时显示（其它标签由事件驱动更新）"""
         self.update_recording_times()
-        
-        # 500毫秒后再次更新
-        self.root.after(500, self.update_gui)
+        self.root.after(UI_TICK_INTERVAL, self.update_gui)
     
     def update_recording_times(self):
         """更新记录时间显示"""
-        global monitoring_status, data_recording_status, combined_status
-        global monitoring_start_time, data_recording_start_time, combined_start_time
+        modes = self.client.state.modes
+        start_times = self.client.state.mode_start_times
         
         current_time = datetime.datetime.now()
         
@@ -450,36 +639,36 @@ class WiFiReceiverGUI:
         main_display_set = False  # 标记是否已设置主要显示内容
         
         # 更新录像+数据时间（最高优先级）
-        if combined_status and combined_start_time:
-            elapsed = current_time - combined_start_time
+        if modes["combined"] and start_times["combined"]:
+            elapsed = current_time - start_times["combined"]
             elapsed_str = self.format_elapsed_time(elapsed)
-            self.combined_time_label.config(text=f"录像+数据时长: {elapsed_str}", fg="lightgreen")
+            self.set_widget("combined_time_label", text=f"录像+数据时长: {elapsed_str}", fg="lightgreen")
             # 同时更新数据监测显示为记录时长
-            self.monitoring_time_label.config(text=f"录像+数据时长: {elapsed_str}", fg="lightgreen")
+            self.set_widget("monitoring_time_label", text=f"录像+数据时长: {elapsed_str}", fg="lightgreen")
             main_display_set = True
         else:
-            self.combined_time_label.config(text="录像+数据时长: 未开始", fg="gray")
+            self.set_widget("combined_time_label", text="录像+数据时长: 未开始", fg="gray")
         
         # 更新数据记录时间（第二优先级）
-        if data_recording_status and data_recording_start_time:
-            elapsed = current_time - data_recording_start_time
+        if modes["data_recording"] and start_times["data_recording"]:
+            elapsed = current_time - start_times["data_recording"]
             elapsed_str = self.format_elapsed_time(elapsed)
-            self.data_recording_time_label.config(text=f"数据记录时长: {elapsed_str}", fg="lightblue")
+            self.set_widget("data_recording_time_label", text=f"数据记录时长: {elapsed_str}", fg="lightblue")
             # 如果没有更高优先级的记录，则显示数据记录时长
             if not main_display_set:
-                self.monitoring_time_label.config(text=f"数据记录时长: {elapsed_str}", fg="lightblue")
+                self.set_widget("monitoring_time_label", text=f"数据记录时长: {elapsed_str}", fg="lightblue")
                 main_display_set = True
         else:
-            self.data_recording_time_label.config(text="数据记录时长: 未开始", fg="gray")
+            self.set_widget("data_recording_time_label", text="数据记录时长: 未开始", fg="gray")
         
         # 更新数据监测时间（最低优先级）
         if not main_display_set:
-            if monitoring_status and monitoring_start_time:
-                elapsed = current_time - monitoring_start_time
+            if modes["monitoring"] and start_times["monitoring"]:
+                elapsed = current_time - start_times["monitoring"]
                 elapsed_str = self.format_elapsed_time(elapsed)
-                self.monitoring_time_label.config(text=f"数据监测时长: {elapsed_str}", fg="darkgreen")
+                self.set_widget("monitoring_time_label", text=f"数据监测时长: {elapsed_str}", fg="darkgreen")
             else:
-                self.monitoring_time_label.config(text="数据监测时长: 未开始", fg="gray")
+                self.set_widget("monitoring_time_label", text="数据监测时长: 未开始", fg="gray")
     
     def format_elapsed_time(self, elapsed):
         """格式化时间显示"""
@@ -493,448 +682,54 @@ class WiFiReceiverGUI:
         else:
             return f"{minutes:02d}:{seconds:02d}"
     
-    def start_background_threads(self):
-        """启动后台线程"""
-        # 启动连接到发送端的线程
-        connect_thread = threading.Thread(target=connect_to_sender, daemon=True)
-        connect_thread.start()
-        
-        # 设置图像服务器
-        server_socket = setup_image_server()
-        if server_socket:
-            # 启动图像连接处理线程
-            image_handler = threading.Thread(target=handle_image_connection, 
-                                           args=(server_socket,), daemon=True)
-            image_handler.start()
-        else:
-            self.log_message("无法启动图像服务器")
-    
     def on_closing(self):
         """处理窗口关闭事件"""
-        global running
         if messagebox.askokcancel("退出", "确定要退出GUI程序吗？"):
             self.log_message("用户请求退出GUI程序...")
             # 只退出GUI，不向发送端发送退出指令
-            running = False
+            self.client.stop()
+            self.close_preview()
+            # 队列中剩余的日志写入日志文件
+            self.process_ui_events()
             self.root.quit()
             self.root.destroy()
 
-# GUI实例
-gui = None
-
-def connect_to_sender():
-    """连接到发送端的指令接口，不停重试直到连接成功"""
-    global command_socket, command_connected, gui, last_runtime_status
-    
-    while running:
-        if not command_connected:
-            try:
-                if gui:
-                    gui.log_message(f"正在尝试连接发送端指令接口 {SENDER_IP}:{COMMAND_PORT}...")
-                command_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                command_socket.settimeout(5)  # 设置连接超时
-                
-                # 优化TCP参数以提高传输性能
-                try:
-                    command_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1024*1024)  # 1MB接收缓冲区
-                    command_socket.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)  # 启用keepalive
-                    # TCP_NODELAY在某些系统上可能不可用
-                    try:
-                        command_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)  # 禁用Nagle算法
-                        tcp_optimized = True
-                    except:
-                        tcp_optimized = False
-                except:
-                    tcp_optimized = False
-                
-                command_socket.connect((SENDER_IP, COMMAND_PORT))
-                command_connected = True
-                if gui:
-                    gui.log_message(f"已成功连接到发送端指令接口 {SENDER_IP}:{COMMAND_PORT}")
-                    if tcp_optimized:
-                        gui.log_message("TCP参数已优化: 1MB缓冲区, Keepalive, 无延迟")
-                    else:
-                        gui.log_message("TCP基础连接已建立")
-                
-                # 连接成功后，清空运行状态以便GUI及时更新
-                last_runtime_status = ""
-                
-                # 重置状态变量，准备从发送端同步最新状态
-                global monitoring_status, data_recording_status, combined_status
-                global monitoring_start_time, data_recording_start_time, combined_start_time
-                monitoring_status = False
-                data_recording_status = False
-                combined_status = False
-                monitoring_start_time = None
-                data_recording_start_time = None
-                combined_start_time = None
-                
-                # 监听状态消息
-                status_thread = threading.Thread(target=listen_status, daemon=True)
-                status_thread.start()
-                
-                # 请求发送端当前状态更新
-                if gui:
-                    gui.log_message("正在同步发送端状态...")
-                    # 给发送端一点时间建立连接，然后请求状态同步
-                    def request_status_sync():
-                        time.sleep(1)  # 等待1秒确保连接稳定
-                        if command_connected and command_socket:
-                            try:
-                                # 请求状态同步（发送端会发送当前状态）
-                                command_socket.sendall("sync_status\n".encode())
-                            except:
-                                pass
-                    
-                    sync_thread = threading.Thread(target=request_status_sync, daemon=True)
-                    sync_thread.start()
-                
-            except Exception as e:
-                if gui:
-                    gui.log_message(f"连接发送端失败: {e}，3秒后重试...")
-                command_connected = False
-                if command_socket:
-                    try:
-                        command_socket.close()
-                    except:
-                        pass
-                    command_socket = None
-                time.sleep(3)
-        else:
-            time.sleep(1)  # 已连接时等待1秒再检查
-
-def listen_status():
-    """监听发送端的状态消息"""
-    global command_socket, command_connected, last_runtime_status, last_gpio_data, last_temp_humidity, gui
-    buffer = b''
-    
-    while running and command_socket and command_connected:
-        try:
-            data = command_socket.recv(1024)
-            if not data:
-                if gui:
-                    gui.log_message("发送端断开连接，将尝试重新连接...")
-                command_connected = False
-                break
-                
-            buffer += data
-            while b'\n' in buffer:
-                line_end = buffer.find(b'\n')
-                message = buffer[:line_end].decode('utf-8').strip()
-                buffer = buffer[line_end+1:]
-                
-                # 尝试解析JSON格式的消息
-                try:
-                    msg_obj = json.loads(message)
-                    process_structured_message(msg_obj)
-                except json.JSONDecodeError:
-                    # 处理旧格式的消息
-                    process_legacy_message(message)
-                    
-        except Exception as e:
-            if running and gui:
-                gui.log_message(f"状态监听错误: {e}，连接断开，将尝试重新连接...")
-            command_connected = False
-            break
-    
-    # 连接断开，设置状态
-    if running and not command_connected:
-        if command_socket:
-            try:
-                command_socket.close()
-            except:
-                pass
-            command_socket = None
-
-def process_structured_message(msg_obj):
-    """处理结构化的JSON消息"""
-    global last_runtime_status, last_gpio_data, last_temp_humidity, gui, latest_sensor_data
-    global monitoring_status, data_recording_status, combined_status
-    global monitoring_start_time, data_recording_start_time, combined_start_time
-    
-    msg_type = msg_obj.get("type", "")
-    timestamp = msg_obj.get("timestamp", "")
-    data = msg_obj.get("data", {})
-    
-    if msg_type == MessageType.RUNTIME_STATUS:
-        # 运行时状态信息 - 也包含传感器数据，更新latest_sensor_data
-        latest_sensor_data = data
-        
-        recording = data.get("recording", "未知")
-        data_recording = data.get("data_recording", "未知")
-        combined = data.get("combined", "未知")
-        i2c_available = data.get("i2c_available", False)
-        
-        i2c_str = "可用" if i2c_available else "不可用"
-        
-        last_runtime_status = f"数据记录:{data_recording}, 录像+数据:{combined}, I2C:{i2c_str}"
-        
-        # 根据运行时状态同步GUI按钮状态
-        current_time = datetime.datetime.now()
-        
-        # 同步数据记录状态
-        if data_recording == "是" and not data_recording_status:
-            data_recording_status = True
-            if not data_recording_start_time:
-                data_recording_start_time = current_time
-            if gui:
-                gui.data_recording_btn.config(text="停止数据记录", bg="lightblue")
-                gui.log_message("[状态同步] 检测到正在记录数据，已同步按钮状态")
-        elif data_recording == "否" and data_recording_status:
-            data_recording_status = False
-            data_recording_start_time = None
-            if gui:
-                gui.data_recording_btn.config(text="开启数据记录", bg="SystemButtonFace")
-        
-        # 同步录像+数据状态
-        if combined == "是" and not combined_status:
-            combined_status = True
-            if not combined_start_time:
-                combined_start_time = current_time
-            if gui:
-                gui.combined_btn.config(text="停止录像+数据", bg="lightgreen")
-                gui.log_message("[状态同步] 检测到正在录像+数据记录，已同步按钮状态")
-        elif combined == "否" and combined_status:
-            combined_status = False
-            combined_start_time = None
-            if gui:
-                gui.combined_btn.config(text="录像+数据", bg="SystemButtonFace")
-        
-        # 同步数据监测状态（如果有任何数据记录在进行，通常数据监测也是开启的）
-        should_monitor = (data_recording == "是" or combined == "是")
-        if should_monitor and not monitoring_status:
-            monitoring_status = True
-            if not monitoring_start_time:
-                monitoring_start_time = current_time
-            if gui:
-                gui.monitoring_btn.config(text="停止数据监测", bg="lightgreen")
-                gui.log_message("[状态同步] 检测到数据监测已开启，已同步按钮状态")
-        
-    elif msg_type == MessageType.GPIO_DATA:
-        # GPIO数据信息（现在包含传感器数据）- 更新latest_sensor_data
-        latest_sensor_data = data
-        
-        adc_data = data.get("adc_data", {})
-        env_data = data.get("env_data", {})
-        
-        voltage = adc_data.get("channel0_voltage", 0) if adc_data else 0
-        current = adc_data.get("channel1_current", 0) if adc_data else 0
-        temperature = env_data.get("temperature") if env_data else None
-        humidity = env_data.get("humidity") if env_data else None
-        
-        temp_str = f"{temperature:.1f}°C" if temperature is not None else "N/A"
-        hum_str = f"{humidity:.1f}%" if humidity is not None else "N/A"
-        
-        last_gpio_data = f"电压:{voltage:.2f}V, 电流:{current:.2f}A, 温度:{temp_str}, 湿度:{hum_str}"
-        
-    elif msg_type == MessageType.STATUS:
-        # 处理状态变更消息，同步按钮状态
-        status_data = data
-        current_time = datetime.datetime.now()
-        
-        # 在状态同步时，不更新开始时间，保持原有的记录时间连续性
-        preserve_time = False
-        if isinstance(status_data, str) and status_data.endswith("_SYNC"):
-            preserve_time = True
-            status_data = status_data.replace("_SYNC", "")
-        
-        if status_data == "DATA_MONITORING_STARTED":
-            if not monitoring_status:
-                monitoring_status = True
-                if not preserve_time or not monitoring_start_time:
-                    monitoring_start_time = current_time
-                if gui:
-                    gui.monitoring_btn.config(text="停止数据监测", bg="lightgreen")
-        elif status_data == "DATA_MONITORING_STOPPED":
-            if monitoring_status:
-                monitoring_status = False
-                if not preserve_time:
-                    monitoring_start_time = None
-                if gui:
-                    gui.monitoring_btn.config(text="开启数据监测", bg="SystemButtonFace")
-        elif status_data == "GPIO_MONITORING_STARTED":
-            if not data_recording_status:
-                data_recording_status = True
-                if not preserve_time or not data_recording_start_time:
-                    data_recording_start_time = current_time
-                if gui:
-                    gui.data_recording_btn.config(text="停止数据记录", bg="lightblue")
-        elif status_data == "GPIO_MONITORING_STOPPED":
-            if data_recording_status:
-                data_recording_status = False
-                if not preserve_time:
-                    data_recording_start_time = None
-                if gui:
-                    gui.data_recording_btn.config(text="开启数据记录", bg="SystemButtonFace")
-        elif status_data == "TIMELAPSE_RECORDING_AND_GPIO_STARTED":
-            if not combined_status:
-                combined_status = True
-                if not preserve_time or not combined_start_time:
-                    combined_start_time = current_time
-                if gui:
-                    gui.combined_btn.config(text="停止录像+数据", bg="lightgreen")
-        elif status_data == "TIMELAPSE_RECORDING_AND_GPIO_STOPPED":
-            if combined_status:
-                combined_status = False
-                if not preserve_time:
-                    combined_start_time = None
-                if gui:
-                    gui.combined_btn.config(text="录像+数据", bg="SystemButtonFace")
-        
-        # 一般状态信息
-        if gui and not preserve_time:  # 同步状态时不显示日志，避免重复信息
-            gui.log_message(f"[状态] {status_data}")
-        elif gui and preserve_time:
-            gui.log_message(f"[状态同步] 已恢复状态: {status_data}")
-        
-    elif msg_type == MessageType.TEMP_HUMIDITY:
-        # 温湿度数据
-        temperature = data.get("temperature")
-        humidity = data.get("humidity")
-        temp_str = f"{temperature:.1f}°C" if temperature is not None else "N/A"
-        hum_str = f"{humidity:.1f}%" if humidity is not None else "N/A"
-        last_temp_humidity = f"温度:{temp_str}, 湿度:{hum_str}"
-
-def process_legacy_message(message):
-    """处理旧格式的消息（兼容性）"""
-    global last_runtime_status, gui
-    
-    if message.startswith("STATUS:"):
-        status = message.split(":", 1)[1]
-        if status.startswith("RUNTIME_STATUS:"):
-            # 运行时状态信息
-            runtime_info = status.split(":", 1)[1]
-            last_runtime_status = runtime_info
-        else:
-            # 其他状态信息
-            if gui:
-                gui.log_message(f"[状态] {status}")
-    elif message == "SENDER_READY":
-        if gui:
-            gui.log_message("[状态] 发送端已准备就绪")
-
-def save_image(data):
-    """保存图像文件，使用日期格式命名"""
-    current_time = datetime.datetime.now()
-    filename = f'img_{current_time.strftime("%Y%m%d_%H%M%S")}.jpg'
-    with open(filename, 'wb') as f:
-        f.write(data)
-    if gui:
-        gui.log_message(f"图像保存为: {filename}")
-    return filename
-
-def setup_image_server():
-    """设置图像服务器，不停重试直到绑定成功"""
-    global image_connected, gui
-    
-    retry_count = 0
-    while running and not image_connected and retry_count < 5:
-        try:
-            if gui:
-                gui.log_message(f"正在设置图像服务器，监听端口: {IMAGE_PORT}...")
-            server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            server_socket.bind((IMAGE_HOST, IMAGE_PORT))
-            server_socket.listen(1)
-            image_connected = True
-            if gui:
-                gui.log_message(f"图像服务器已启动，监听端口: {IMAGE_PORT}")
-            return server_socket
-        except Exception as e:
-            if gui:
-                gui.log_message(f"图像服务器启动失败: {e}，3秒后重试...")
-            try:
-                server_socket.close()
-            except:
-                pass
-            time.sleep(3)
-            retry_count += 1
-    
-    return None
-
-def handle_image_connection(server_socket):
-    """处理图像连接的函数"""
-    global running, gui
-    conn = None
-    
-    while running:
-        try:
-            if gui:
-                gui.log_message("等待发送端连接图像服务器...")
-            conn, addr = server_socket.accept()
-            if gui:
-                gui.log_message(f"发送端已连接: {addr}")
-            
-            buffer = b''
-            while running:
-                try:
-                    data = conn.recv(4096)
-                    if not data:
-                        if gui:
-                            gui.log_message("图像连接断开，等待重新连接...")
-                        break
-                    buffer += data
-
-                    while b'\n' in buffer:
-                        line_end = buffer.find(b'\n')
-                        line = buffer[:line_end].decode()
-                        buffer = buffer[line_end+1:]
-
-                        if line.startswith("IMG_START:"):
-                            size = int(line.split(":")[1])
-                            if gui:
-                                gui.log_message(f"准备接收图像，共 {size} 字节")
-                            image_data = b''
-                            while len(image_data) < size and running:
-                                chunk = conn.recv(size - len(image_data))
-                                if not chunk:
-                                    break
-                                image_data += chunk
-                            if running and len(image_data) == size:
-                                save_image(image_data)
-                        elif line == "IMG_END":
-                            if gui:
-                                gui.log_message("图像接收完成")
-                
-                except Exception as e:
-                    if running and gui:
-                        gui.log_message(f"接收图像数据时出错: {e}，连接断开，等待重新连接...")
-                    break
-            
-            # 关闭当前连接
-            if conn:
-                try:
-                    conn.close()
-                except:
-                    pass
-                conn = None
-                
-        except Exception as e:
-            if running and gui:
-                gui.log_message(f"图像服务器接受连接时出错: {e}")
-                time.sleep(1)
+def parse_arguments():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description='WiFi摄像头控制系统 - 接收端GUI')
+    parser.add_argument('sender', nargs='?', default=SENDER_IP, help=f'发送端IP（默认 {SENDER_IP}）')
+    parser.add_argument('--port', type=int, default=COMMAND_PORT, help='发送端指令端口')
+    parser.add_argument('--image-port', type=int, default=IMAGE_PORT, help='本机图像服务器端口')
+    add_record_arguments(parser)
+    add_log_arguments(parser, "receiver_gui.log")
+    return parser.parse_args()
 
 def main():
-    global gui
+    args = parse_arguments()
+    client = ReceiverClient(args.sender, args.port, IMAGE_HOST, args.image_port)
+    recorder = open_recorder(args, args.sender)
+    if recorder is False:
+        return
+    if recorder:
+        # 记录器在网络线程中直接入队，不经过GUI事件队列
+        client.add_listener(recorder.on_client_event)
     
-    # 创建并启动GUI
+    # 创建并启动GUI，网络部分由客户端库在后台线程中运行
     root = tk.Tk()
-    gui = WiFiReceiverGUI(root)
+    gui = WiFiReceiverGUI(root, client, args.log_lines, args.log_file, args.log_level)
+    client.start()
     
     try:
         root.mainloop()
     except KeyboardInterrupt:
         print("\n用户中断程序...")
     finally:
-        global running
-        running = False
-        
         # 清理资源
-        if command_socket:
-            try:
-                command_socket.close()
-            except:
-                pass
+        client.stop()
+        gui.log_panel.close()
+        if recorder:
+            recorder.close()
+            print(recorder.summary())
 
 if __name__ == "__main__":
     main()
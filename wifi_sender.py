@@ -15,10 +15,26 @@ import json
 import datetime
 import os
 import sys
-import hashlib
-import csv
 import io
 
+from mjpeg_server import MJPEGStreamServer
+from file_transfer import FileTransferServer, TRANSFER_PORT
+from framing import LineReader
+from calibration import make_calibration, DERIVED_COLUMNS
+from columnar_format import SENSOR_SCHEMA, MONOTONIC_COLUMN
+from compression import available_compressions
+from image_archive import ImageArchiveWriter, ARCHIVE_EXTENSION
+from journal import SessionJournal, recover_all, print_summary
+from segments import format_time_ns
+from session_catalog import SessionCatalog, SessionStats, CATALOG_NAME
+from storage import StorageManager, RETENTION_POLICIES, MB
+from recorder import (CSVRecorder, ColumnarRecorder, DEFAULT_FLUSH_ROWS, DEFAULT_FLUSH_INTERVAL_MS,
+                      DEFAULT_FSYNC_INTERVAL, DEFAULT_ROTATE_BYTES, DEFAULT_ROTATE_SECONDS, DEFAULT_ROTATE_ROWS)
+from link_stats import Histogram, IMAGE_TIME_BOUNDS
+from telemetry import (TelemetryChannel, TelemetryHistory, TelemetrySubscription,
+                       encode_message, set_text_timestamps, SEND_POLICIES, DROP_OLDEST,
+                       DEFAULT_QUEUE_SIZE, DEFAULT_BLOCK_TIMEOUT, DEFAULT_HISTORY_SIZE)
+
 # 传感器相关导入
 try:
     import Adafruit_ADS1x15
@@ -51,6 +67,35 @@ COMMAND_HOST = '0.0.0.0'
 COMMAND_PORT = 8889
 IMAGE_HOST = '192.168.1.116'  # 接收端IP
 IMAGE_PORT = 8888
+STREAM_HOST = '0.0.0.0'  # MJPEG实时预览服务监听地址
+STREAM_PORT = 8080
+STREAM_MAX_FPS = 5.0  # 实时预览最大帧率
+
+# 遥测发送队列配置（每个客户端独立）
+TELEMETRY_SEND_POLICY = DROP_OLDEST  # drop_oldest / coalesce / block
+TELEMETRY_QUEUE_SIZE = DEFAULT_QUEUE_SIZE
+TELEMETRY_BLOCK_TIMEOUT = DEFAULT_BLOCK_TIMEOUT  # block策略下采集线程最长等待时间（秒）
+TELEMETRY_HISTORY_SIZE = DEFAULT_HISTORY_SIZE  # 断线重连补发的历史条数
+QUIET_COMMANDS = ("get_link_stats",)  # 接收端定期发送的查询指令，收到时不打印
+
+# 数据记录格式：csv（文本）或 columnar（二进制列式 .scol，可用 columnar_format.py 转换为CSV）
+RECORD_FORMATS = ("csv", "columnar")
+RECORD_FORMAT = "csv"
+RECORD_COMPRESSION = None  # 记录时压缩：None / "gzip" / "zstd"（需安装zstandard）
+RECORD_VALUE_MODES = ("full", "raw")
+RECORD_VALUES = "full"  # raw: 只记录原始ADC值，电压/电流在读取时按文件头中的标定参数换算
+TIMESTAMP_MODES = ("text", "ns")
+TIMESTAMP_MODE = "text"  # ns: 采集、记录和遥测都使用整数纳秒时间戳（并记录单调时钟），只在显示时格式化
+
+# 图像保存方式：archive（每次记录一个打包存档，可用 image_archive.py 导出）或 files（每帧一个JPEG文件）
+IMAGE_STORAGE_MODES = ("archive", "files")
+IMAGE_STORAGE = "archive"
+
+# 存储空间管理：结果文件夹总配额（MB，0表示只受SD卡剩余空间限制）和保留策略（none / oldest / compress）
+# 默认不自动删除或压缩已有的实验数据，空间不足时只警告并依次暂停图像保存和数据记录；
+# 需要自动清理时用 set_storage:retention=oldest|compress 明确开启
+STORAGE_QUOTA_MB = 0
+STORAGE_RETENTION = "none"
 
 # ADC配置参数
 GAIN = 1
@@ -80,13 +125,30 @@ class SystemState:
         self.data_save_thread = None
         self.image_save_thread = None
         self.current_result_folder = None
-        self.csv_file = None
-        self.csv_writer = None
+        self.image_storage = IMAGE_STORAGE
+        self.image_archive = None  # 当前记录的图像存档（ImageArchiveWriter）
+        self.session_journal = None  # 当前结果文件夹的会话日志（SessionJournal）
+        self.session_stats = None  # 当前会话的增量统计（SessionStats），写入会话目录
+        self.csv_recorder = None  # 后台写入的数据记录器（CSV或列式）
+        self.record_format = RECORD_FORMAT
+        self.record_compression = RECORD_COMPRESSION
+        self.record_values = RECORD_VALUES
+        self.timestamp_mode = TIMESTAMP_MODE
+        
+        # CSV持久化策略：每N行/每T毫秒刷新，0表示不按该条件刷新；fsync间隔0表示仅停止时fsync
+        self.csv_flush_rows = DEFAULT_FLUSH_ROWS
+        self.csv_flush_interval_ms = DEFAULT_FLUSH_INTERVAL_MS
+        self.csv_fsync_interval = DEFAULT_FSYNC_INTERVAL
+        
+        # 分段切换策略：单个分段的大小（字节）/时长（秒）/行数上限，0表示不按该条件切换
+        self.rotate_bytes = DEFAULT_ROTATE_BYTES
+        self.rotate_seconds = DEFAULT_ROTATE_SECONDS
+        self.rotate_rows = DEFAULT_ROTATE_ROWS
         
         # 网络连接
-        self.command_socket = None
+        self.clients = []  # 已连接客户端的发送通道（TelemetryChannel）
+        self.clients_lock = threading.Lock()
         self.image_socket = None
-        self.client_connected = False
         
         # 最新数据
         self.latest_sensor_data = None
@@ -94,6 +156,16 @@ class SystemState:
 
 # 全局状态实例
 state = SystemState()
+set_text_timestamps(state.timestamp_mode == "text")
+
+# 数据行的列（save_sensor_data_to_csv 按此顺序生成），记录器按记录内容选取其中的列
+RECORD_COLUMNS = SENSOR_SCHEMA + [MONOTONIC_COLUMN]
+
+def record_row_indices(record_values, timestamp_mode):
+    """按记录内容和时间戳格式选取数据行中要记录的列"""
+    return [index for index, (name, _) in enumerate(RECORD_COLUMNS)
+            if not (record_values == "raw" and name in DERIVED_COLUMNS)
+            and not (timestamp_mode == "text" and name == MONOTONIC_COLUMN[0])]
 
 # 传感器管理类
 class SensorManager:
@@ -221,7 +293,8 @@ class SensorManager:
     
     def read_all_sensor_data(self):
         """读取所有传感器数据"""
-        timestamp = datetime.datetime.now()
+        timestamp_ns = time.time_ns()
+        monotonic_ns = time.monotonic_ns()
         
         # 读取ADC数据
         adc_data = self.read_adc_data()
@@ -231,10 +304,14 @@ class SensorManager:
         
         # 组合数据
         combined_data = {
-            'timestamp': timestamp.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3],
+            'timestamp_ns': timestamp_ns,
+            'monotonic_ns': monotonic_ns,
             'adc_data': adc_data,
             'env_data': env_data
         }
+        # 文本时间戳只在兼容模式下逐条格式化
+        if state.timestamp_mode == "text":
+            combined_data['timestamp'] = format_time_ns(timestamp_ns)
         
         return combined_data
 
@@ -244,6 +321,16 @@ class CameraManager:
         self.camera = None
         self.camera_available = False
         self.camera_type = CAMERA_TYPE
+        
+        # 摄像头访问锁（录像线程、指令线程和实时预览共用一个摄像头）
+        self.lock = threading.RLock()
+        
+        # 最新已编码帧缓存，所有实时预览客户端共享同一份JPEG数据
+        self.frame_condition = threading.Condition()
+        self.latest_frame = None
+        self.latest_frame_id = 0
+        self.latest_frame_time = 0
+        
         self.initialize_camera()
     
     def initialize_camera(self):
@@ -339,20 +426,51 @@ class CameraManager:
                 except:
                     pass
     
-    def capture_image(self):
-        """捕获图像"""
-        if not self.camera_available or not self.camera:
-            print("摄像头不可用，无法捕获图像")
-            return None
+    def capture_image(self, verbose=True):
+        """捕获图像，并更新共享的最新帧缓存"""
+        with self.lock:
+            if not self.camera_available or not self.camera:
+                if verbose:
+                    print("摄像头不可用，无法捕获图像")
+                return None
+            
+            image_data = None
+            if self.camera_type == "opencv":
+                image_data = self._capture_opencv_image(verbose)
+            elif self.camera_type == "picamera":
+                image_data = self._capture_picamera_image(verbose)
         
-        if self.camera_type == "opencv":
-            return self._capture_opencv_image()
-        elif self.camera_type == "picamera":
-            return self._capture_picamera_image()
+        if image_data:
+            self._publish_frame(image_data)
         
-        return None
+        return image_data
+    
+    def _publish_frame(self, image_data):
+        """发布新编码的帧并唤醒等待中的预览客户端"""
+        with self.frame_condition:
+            self.latest_frame = image_data
+            self.latest_frame_id += 1
+            self.latest_frame_time = time.time()
+            self.frame_condition.notify_all()
+    
+    def get_latest_frame(self, max_age=None):
+        """获取缓存的最新帧，返回(帧编号, JPEG数据)；超过max_age秒的帧视为过期"""
+        with self.frame_condition:
+            if self.latest_frame is None:
+                return 0, None
+            if max_age is not None and time.time() - self.latest_frame_time > max_age:
+                return 0, None
+            return self.latest_frame_id, self.latest_frame
+    
+    def wait_for_frame(self, last_frame_id, timeout=1.0):
+        """等待比last_frame_id更新的帧，超时返回(last_frame_id, None)"""
+        with self.frame_condition:
+            self.frame_condition.wait_for(lambda: self.latest_frame_id != last_frame_id, timeout)
+            if self.latest_frame_id == last_frame_id:
+                return last_frame_id, None
+            return self.latest_frame_id, self.latest_frame
     
-    def _capture_opencv_image(self):
+    def _capture_opencv_image(self, verbose=True):
         """使用OpenCV捕获图像"""
         try:
             # 捕获帧
@@ -399,7 +517,8 @@ class CameraManager:
             image_data = buffer.tobytes()
             
             if len(image_data) > 0:
-                print(f"OpenCV图像捕获成功（已旋转180度并添加时间水印），大小: {len(image_data)} 字节")
+                if verbose:
+                    print(f"OpenCV图像捕获成功（已旋转180度并添加时间水印），大小: {len(image_data)} 字节")
                 return image_data
             else:
                 print("OpenCV图像捕获失败：编码数据为空")
@@ -417,7 +536,7 @@ class CameraManager:
             
             return None
     
-    def _capture_picamera_image(self):
+    def _capture_picamera_image(self, verbose=True):
         """使用PiCamera捕获图像"""
         try:
             # 使用内存流
@@ -478,7 +597,8 @@ class CameraManager:
                     
                     if ret:
                         image_data = buffer.tobytes()
-                        print(f"PiCamera图像捕获成功（已旋转180度并添加时间水印），大小: {len(image_data)} 字节")
+                        if verbose:
+                            print(f"PiCamera图像捕获成功（已旋转180度并添加时间水印），大小: {len(image_data)} 字节")
                     else:
                         print(f"PiCamera图像后处理编码失败，使用原始图像，大小: {len(image_data)} 字节")
                 else:
@@ -486,7 +606,8 @@ class CameraManager:
                     
             except ImportError:
                 # 如果没有OpenCV，只能使用原始图像
-                print(f"PiCamera图像捕获成功（无OpenCV后处理），大小: {len(image_data)} 字节")
+                if verbose:
+                    print(f"PiCamera图像捕获成功（无OpenCV后处理），大小: {len(image_data)} 字节")
             except Exception as post_error:
                 print(f"PiCamera图像后处理错误: {post_error}，使用原始图像")
             
@@ -506,21 +627,22 @@ class CameraManager:
     
     def cleanup(self):
         """清理摄像头资源"""
-        if self.camera:
-            try:
-                print("正在关闭摄像头...")
-                if self.camera_type == "opencv":
-                    self.camera.release()
-                elif self.camera_type == "picamera":
-                    self.camera.close()
+        with self.lock:
+            if self.camera:
+                try:
+                    print("正在关闭摄像头...")
+                    if self.camera_type == "opencv":
+                        self.camera.release()
+                    elif self.camera_type == "picamera":
+                        self.camera.close()
                 
-                self.camera = None
-                self.camera_available = False
-                print("摄像头已关闭")
-            except Exception as e:
-                print(f"关闭摄像头时出错: {e}")
-        else:
-            print("摄像头已经关闭")
+                    self.camera = None
+                    self.camera_available = False
+                    print("摄像头已关闭")
+                except Exception as e:
+                    print(f"关闭摄像头时出错: {e}")
+            else:
+                print("摄像头已经关闭")
 
 # 数据保存管理类
 class DataSaveManager:
@@ -532,33 +654,73 @@ class DataSaveManager:
         timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
         folder_name = f"result_{timestamp}"
         
+        # 空间不足时不再开始新的记录
+        storage_manager.check()
+        if storage_manager.data_paused:
+            raise OSError(f"存储空间不足（剩余 {storage_manager.remaining() / MB:.0f}MB），无法开始记录")
+        
         if not os.path.exists(folder_name):
             os.makedirs(folder_name)
+        storage_manager.open_folder(folder_name)
         
         return folder_name
     
     def initialize_csv_file(self, folder_path):
-        """初始化CSV文件"""
+        """初始化数据文件，按记录格式返回后台写入的记录器"""
         timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        csv_filename = f"data_{timestamp}.csv"
-        csv_path = os.path.join(folder_path, csv_filename)
+        options = {
+            "flush_rows": state.csv_flush_rows,
+            "flush_interval_ms": state.csv_flush_interval_ms,
+            "fsync_interval": state.csv_fsync_interval,
+            "rotate_bytes": state.rotate_bytes,
+            "rotate_seconds": state.rotate_seconds,
+            "rotate_rows": state.rotate_rows,
+            "compression": state.record_compression,
+        }
         
-        csv_file = open(csv_path, 'w', newline='', encoding='utf-8')
-        csv_writer = csv.writer(csv_file)
+        row_indices = record_row_indices(state.record_values, state.timestamp_mode)
+        columns = [RECORD_COLUMNS[index] for index in row_indices]
+        options["row_indices"] = row_indices
         
-        # 写入CSV头部
-        headers = [
-            'timestamp', 'voltage_ch0', 'current_ch1', 'voltage_ch2', 'voltage_ch3',
-            'raw_ch0', 'raw_ch1', 'raw_ch2', 'raw_ch3',
-            'lux', 'temperature', 'pressure', 'humidity', 'altitude'
-        ]
-        csv_writer.writerow(headers)
-        csv_file.flush()
+        # 只记录原始值：标定参数写入文件头（列式）和分段清单，读取时再换算
+        metadata = None
+        if state.record_values == "raw":
+            metadata = {"calibration": make_calibration(MAX_ADC_VALUE, ADC_VOLTAGE_RANGE,
+                                                        VOLTAGE_SCALE, CURRENT_SCALE)}
+        
+        if state.record_format == "columnar":
+            data_path = os.path.join(folder_path, f"data_{timestamp}.scol")
+            recorder = ColumnarRecorder(data_path, columns, metadata, **options)
+        else:
+            csv_filename = f"data_{timestamp}.csv"
+            csv_path = os.path.join(folder_path, csv_filename)
+            
+            # CSV头部：兼容模式下第一列为本地时间字符串 timestamp，ns模式下为整数 timestamp_ns
+            headers = [name for name, _ in columns]
+            integer_timestamps = state.timestamp_mode == "ns"
+            if not integer_timestamps:
+                headers[0] = 'timestamp'
+            recorder = CSVRecorder(csv_path, headers, integer_timestamps, metadata=metadata, **options)
         
-        return csv_file, csv_writer
+        self.get_session_journal(folder_path).open_file("data", recorder.manifest.path,
+                                                        format=recorder.data_format)
+        return recorder
+    
+    def close_csv_recorder(self, csv_recorder):
+        """写完剩余数据并关闭CSV记录器，输出写入统计"""
+        if not csv_recorder:
+            return
+        csv_recorder.close()
+        storage_manager.untrack(csv_recorder.base_path)
+        stats = csv_recorder.stats()
+        if state.session_journal:
+            state.session_journal.close_file("data", csv_recorder.manifest.path, rows=stats['rows_written'])
+        print(f"数据记录完成: {stats['rows_written']} 行, {stats['bytes_written']} 字节, "
+              f"刷新 {stats['flush_count']} 次 (平均 {stats['flush_avg_ms']} ms, 最大 {stats['flush_max_ms']} ms), "
+              f"分段 {stats['segment']} 个, 清单: {stats['manifest']}")
     
-    def save_sensor_data_to_csv(self, csv_writer, csv_file, sensor_data):
-        """保存传感器数据到CSV"""
+    def save_sensor_data_to_csv(self, csv_recorder, sensor_data):
+        """保存传感器数据到CSV（只入队，由记录器线程写入）"""
         if not sensor_data:
             return
         
@@ -566,8 +728,13 @@ class DataSaveManager:
             adc_data = sensor_data.get('adc_data', {}) or {}
             env_data = sensor_data.get('env_data', {}) or {}
             
+            timestamp = sensor_data.get(csv_recorder.timestamp_key)
+            if timestamp is None:
+                # 记录过程中切换了时间戳格式
+                timestamp = format_time_ns(sensor_data['timestamp_ns'])
+            
             row = [
-                sensor_data['timestamp'],
+                timestamp,
                 adc_data.get('channel0_voltage', 0),
                 adc_data.get('channel1_current', 0),
                 adc_data.get('channel2_voltage', 0),
@@ -580,19 +747,137 @@ class DataSaveManager:
                 env_data.get('temperature', 0),
                 env_data.get('pressure', 0),
                 env_data.get('humidity', 0),
-                env_data.get('altitude', 0)
+                env_data.get('altitude', 0),
+                sensor_data.get('monotonic_ns', 0)
             ]
-            csv_writer.writerow(row)
-            csv_file.flush()
+            csv_recorder.write_row(row)
+            
+            stats = state.session_stats
+            if stats:
+                stats.add_row(row, sensor_data.get('timestamp_ns'))
         except Exception as e:
             print(f"保存CSV数据错误: {e}")
     
+    def get_image_archive(self, folder_path):
+        """返回结果文件夹对应的图像存档，切换文件夹时关闭之前的存档"""
+        archive = state.image_archive
+        if archive and os.path.dirname(archive.path) == folder_path:
+            return archive
+        self.close_image_archive()
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        archive = ImageArchiveWriter(os.path.join(folder_path, f"images_{timestamp}{ARCHIVE_EXTENSION}"))
+        state.image_archive = archive
+        self.get_session_journal(folder_path).open_file("images", archive.path)
+        return archive
+    
+    def close_image_archive(self):
+        """关闭当前图像存档"""
+        archive, state.image_archive = state.image_archive, None
+        if archive:
+            archive.close()
+            if state.session_journal:
+                state.session_journal.close_file("images", archive.path, count=archive.count)
+            print(f"图像存档已关闭: {archive.path} ({archive.count} 帧)")
+    
+    def get_session_journal(self, folder_path):
+        """返回结果文件夹的会话日志，切换文件夹时结束之前的会话"""
+        journal = state.session_journal
+        if journal and journal.folder == folder_path:
+            return journal
+        # 之前文件夹的图像存档先关闭并记入之前的会话
+        if state.image_archive and os.path.dirname(state.image_archive.path) != folder_path:
+            self.close_image_archive()
+        self.end_session()
+        state.session_journal = SessionJournal(folder_path)
+        state.session_stats = SessionStats(folder_path)
+        self.update_catalog("recording")
+        return state.session_journal
+    
+    def end_session(self):
+        """写入会话结束标记，按校正后的文件夹占用写入会话目录"""
+        stats, state.session_stats = state.session_stats, None
+        journal, state.session_journal = state.session_journal, None
+        if journal:
+            journal.stop()
+            storage_manager.close_folder(journal.folder)
+        self.update_catalog("complete", stats)
+    
+    def count_image(self, folder_path, image_data):
+        storage_manager.add(folder_path, len(image_data))
+        stats = state.session_stats
+        if stats:
+            stats.add_image(len(image_data))
+    
+    def update_catalog(self, status, stats=None):
+        """把会话统计交给会话目录的后台线程写入；数据大小取存储管理已登记的写入量，不扫描文件夹"""
+        stats = stats or state.session_stats
+        if not stats:
+            return
+        stats.data_bytes = max(0, storage_manager.folder_usage(stats.path) - stats.image_bytes)
+        session_catalog.submit(stats, status)
+    
+    def end_session_if_idle(self):
+        """数据记录和图像录制都已停止时结束会话"""
+        if not state.data_recording and not state.image_recording:
+            self.end_session()
+            if state.current_result_folder:
+                storage_manager.close_folder(state.current_result_folder)
+    
+    def check_storage(self):
+        """登记数据写入量并检查存储空间，状态变化时通知客户端"""
+        csv_recorder = state.csv_recorder
+        if csv_recorder:
+            storage_manager.track(csv_recorder.base_path, os.path.dirname(csv_recorder.base_path),
+                                  csv_recorder.bytes_written)
+        change = storage_manager.check()
+        if not change:
+            return
+        previous, level = change
+        remaining_mb = storage_manager.remaining() / MB
+        print(f"存储状态: {previous} -> {level}，剩余 {remaining_mb:.0f}MB")
+        network_manager.broadcast_message("STATUS", f"STORAGE_{level.upper()}:{remaining_mb:.0f}")
+    
+    def on_folder_cleaned(self, folder, status=None):
+        """保留策略压缩或删除了结果文件夹后更新会话目录"""
+        try:
+            session_catalog.update_sizes(folder, status)
+        except Exception as e:
+            print(f"更新会话目录错误: {e}")
+    
+    def checkpoint_session(self):
+        """定期在会话日志中记录各数据文件的进度"""
+        journal = state.session_journal
+        if not journal or not journal.checkpoint_due():
+            return
+        files = {}
+        csv_recorder = state.csv_recorder
+        if csv_recorder and csv_recorder.flushed:
+            # 已刷新到文件的行数和对应的文件偏移，恢复时只统计偏移之后的部分
+            segment_file, segment_rows, offset = csv_recorder.flushed
+            files[os.path.basename(csv_recorder.manifest.path)] = {
+                "file": segment_file,
+                "segment_rows": segment_rows,
+                "offset": offset,
+                "rows": csv_recorder.rows_written,
+            }
+        archive = state.image_archive
+        if archive:
+            files[os.path.basename(archive.path)] = {"count": archive.count, "bytes": archive.offset}
+        journal.checkpoint(files)
+        self.update_catalog("recording")
+    
     def save_image_to_file(self, folder_path, image_data):
-        """保存图像到文件"""
+        """保存图像到存档或单独的文件"""
         if not image_data:
             return None
         
         try:
+            if state.image_storage == "archive":
+                archive = self.get_image_archive(folder_path)
+                index = archive.append(image_data)
+                self.count_image(folder_path, image_data)
+                return f"{os.path.basename(archive.path)}#{index}"
+            
             timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]
             filename = f"img_{timestamp}.jpg"
             filepath = os.path.join(folder_path, filename)
@@ -600,6 +885,7 @@ class DataSaveManager:
             with open(filepath, 'wb') as f:
                 f.write(image_data)
             
+            self.count_image(folder_path, image_data)
             return filename
         except Exception as e:
             print(f"保存图像错误: {e}")
@@ -608,29 +894,98 @@ class DataSaveManager:
 # 网络通信管理类
 class NetworkManager:
     def __init__(self):
-        pass
+        # 带序号的遥测历史，用于客户端重连后补发
+        self.history = TelemetryHistory(TELEMETRY_HISTORY_SIZE)
+        
+        # 连接和图像发送统计（get_link_stats 查询）
+        self.started = time.time()
+        self.connections = 0
+        self.disconnects = 0
+        self.images_sent = 0
+        self.image_failures = 0
+        self.image_bytes = 0
+        self.image_seconds = 0.0
+        self.image_connects = 0
+        self.image_times = Histogram(IMAGE_TIME_BOUNDS)  # 一张图像的发送耗时（毫秒）
+    
+    def add_client(self, channel):
+        """登记新的客户端发送通道"""
+        with state.clients_lock:
+            state.clients.append(channel)
+            self.connections += 1
+    
+    def remove_client(self, channel):
+        """移除并关闭客户端发送通道"""
+        with state.clients_lock:
+            if channel in state.clients:
+                state.clients.remove(channel)
+                self.disconnects += 1
+        channel.close()
     
-    def send_message(self, socket_obj, message_type, data):
-        """发送结构化消息"""
+    def get_clients(self):
+        """返回当前客户端列表的快照"""
+        with state.clients_lock:
+            return list(state.clients)
+    
+    def send_message(self, channel, message_type, data):
+        """向单个客户端发送结构化控制消息（入队后立即返回）"""
+        if not channel:
+            return False
         try:
-            message = {
-                "type": message_type,
-                "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "data": data
-            }
-            json_message = json.dumps(message, ensure_ascii=False)
-            socket_obj.sendall(f"{json_message}\n".encode('utf-8'))
-            return True
+            return channel.send_control(encode_message(message_type, data))
         except Exception as e:
             print(f"发送消息错误: {e}")
             return False
     
+    def broadcast_message(self, message_type, data):
+        """向所有客户端发送控制消息，消息只编码一次"""
+        clients = self.get_clients()
+        if not clients:
+            return False
+        payload = encode_message(message_type, data)
+        for channel in clients:
+            channel.send_control(payload)
+        return True
+    
+    def publish_telemetry(self, message_type, data):
+        """记录带序号的遥测消息并发布给所有客户端，队列满时按各客户端的策略丢弃，不阻塞采集线程"""
+        seq, payload = self.history.append(message_type, data)
+        for channel in self.get_clients():
+            channel.publish_sample(seq, payload, data, self.history.stream_id)
+        return seq
+    
+    def flush_subscriptions(self, force=False):
+        """发出各客户端订阅中已到期（force为True时为全部）的聚合窗口，采样变慢或停止时也能按时收到"""
+        now = time.time()
+        for channel in self.get_clients():
+            channel.flush_subscription(self.history.stream_id, now, force)
+    
+    def resume_client(self, channel, stream_id, last_seq):
+        """客户端重连后补发last_seq之后的遥测，然后开始实时发送"""
+        if stream_id != self.history.stream_id or last_seq < 0:
+            # 新客户端或发送端已重启，序号无法续接
+            if stream_id not in ("", "-") and stream_id != self.history.stream_id:
+                self.send_message(channel, "STATUS", f"REPLAY_RESET:{self.history.stream_id}")
+            channel.release()
+            return 0
+        
+        items, oldest = self.history.since(last_seq)
+        if last_seq + 1 < oldest:
+            # 断线时间过长，部分历史已被覆盖
+            self.send_message(channel, "STATUS", f"REPLAY_GAP:{last_seq + 1}:{oldest - 1}")
+        channel.start_replay(items, self.history.stream_id)
+        if items:
+            print(f"客户端 {channel.address} 重连，补发 {len(items)} 条遥测 (序号 {items[0][0]}-{items[-1][0]})")
+        return len(items)
+    
     def send_image_data(self, image_data):
         """发送图像数据"""
         if not state.image_socket or not image_data:
             return False
         
         try:
+            began = time.perf_counter()
+            
             # 发送图像头部信息
             header = f"IMG_START:{len(image_data)}\n"
             state.image_socket.sendall(header.encode())
@@ -640,16 +995,61 @@ class NetworkManager:
             
             # 发送结束标记
             state.image_socket.sendall(b"IMG_END\n")
+            
+            elapsed = time.perf_counter() - began
+            self.image_times.add(elapsed * 1000)
+            self.images_sent += 1
+            self.image_bytes += len(image_data)
+            self.image_seconds += elapsed
             return True
         except Exception as e:
             print(f"发送图像错误: {e}")
+            self.image_failures += 1
             return False
+    
+    def link_stats(self, channel=None):
+        """连接和吞吐量统计：连接次数、各客户端的发送速率和丢弃数量、图像发送耗时"""
+        clients = self.get_clients()
+        stats = {
+            "uptime_s": round(time.time() - self.started, 1),
+            "clients": len(clients),
+            "connections": self.connections,
+            "disconnects": self.disconnects,
+            "messages_per_s": 0.0,
+            "bytes_per_s": 0,
+            "dropped": 0,
+            "images": {
+                "sent": self.images_sent,
+                "failed": self.image_failures,
+                "bytes": self.image_bytes,
+                "connects": self.image_connects,
+                "bytes_per_s": round(self.image_bytes / self.image_seconds) if self.image_seconds else 0,
+                "time_ms": self.image_times.snapshot(),
+            },
+        }
+        for client in clients:
+            client_stats = client.stats()
+            stats["messages_per_s"] += client_stats["messages_per_s"]
+            stats["bytes_per_s"] += client_stats["bytes_per_s"]
+            stats["dropped"] += client_stats["dropped"]
+            if client is channel:
+                # 请求统计的客户端自己的发送通道
+                client_stats["send_ms"] = client.send_times.snapshot()
+                stats["channel"] = client_stats
+        stats["messages_per_s"] = round(stats["messages_per_s"], 2)
+        return stats
 
 # 初始化全局管理器
 sensor_manager = SensorManager()
 camera_manager = CameraManager()
 data_save_manager = DataSaveManager()
 network_manager = NetworkManager()
+stream_server = MJPEGStreamServer(camera_manager, STREAM_HOST, STREAM_PORT, STREAM_MAX_FPS)
+transfer_server = FileTransferServer(".", COMMAND_HOST, TRANSFER_PORT)
+session_catalog = SessionCatalog(CATALOG_NAME)
+storage_manager = StorageManager(".", int(STORAGE_QUOTA_MB * MB), STORAGE_RETENTION)
+storage_manager.on_compress = data_save_manager.on_folder_cleaned
+storage_manager.on_delete = lambda folder: data_save_manager.on_folder_cleaned(folder, "deleted")
 
 def data_monitoring_loop():
     """数据监测主循环"""
@@ -664,29 +1064,42 @@ def data_monitoring_loop():
                 sensor_data = sensor_manager.read_all_sensor_data()
                 state.latest_sensor_data = sensor_data
                 
-                # 发送运行时状态
-                if state.command_socket and state.client_connected:
-                    runtime_data = {
-                        "recording": "是" if state.image_recording else "否",
-                        "data_recording": "是" if state.data_recording else "否",
-                        "combined": "是" if state.combined_recording else "否",
-                        "temperature": sensor_data['env_data']['temperature'] if sensor_data.get('env_data') else None,
-                        "humidity": sensor_data['env_data']['humidity'] if sensor_data.get('env_data') else None,
-                        "i2c_available": sensor_manager.i2c_available,
-                        # 添加完整的传感器数据
-                        "adc_data": sensor_data.get('adc_data', {}),
-                        "env_data": sensor_data.get('env_data', {}),
-                        # 添加图像记录间隔信息
-                        "image_interval": state.image_interval
-                    }
-                    network_manager.send_message(state.command_socket, "RUNTIME_STATUS", runtime_data)
+                # 发送运行时状态（记录到历史并入队，由各客户端发送线程负责发送）
+                runtime_data = {
+                    "sample_time_ns": sensor_data['timestamp_ns'],
+                    "monotonic_ns": sensor_data['monotonic_ns'],
+                    "recording": "是" if state.image_recording else "否",
+                    "data_recording": "是" if state.data_recording else "否",
+                    "combined": "是" if state.combined_recording else "否",
+                    "temperature": sensor_data['env_data']['temperature'] if sensor_data.get('env_data') else None,
+                    "humidity": sensor_data['env_data']['humidity'] if sensor_data.get('env_data') else None,
+                    "i2c_available": sensor_manager.i2c_available,
+                    # 添加完整的传感器数据
+                    "adc_data": sensor_data.get('adc_data', {}),
+                    "env_data": sensor_data.get('env_data', {}),
+                    # 添加图像记录间隔信息
+                    "image_interval": state.image_interval
+                }
+                if 'timestamp' in sensor_data:
+                    runtime_data["sample_time"] = sensor_data['timestamp']
+                network_manager.publish_telemetry("RUNTIME_STATUS", runtime_data)
+                
+                # 检查存储空间：空间不足时先暂停图像保存，最后才暂停数据记录
+                data_save_manager.check_storage()
                 
                 # 如果正在记录数据，保存到CSV（每0.1秒）
-                if state.data_recording and state.csv_writer and state.csv_file:
-                    data_save_manager.save_sensor_data_to_csv(state.csv_writer, state.csv_file, sensor_data)
+                csv_recorder = state.csv_recorder
+                if state.data_recording and csv_recorder and csv_recorder.closed:
+                    stop_failed_recording(csv_recorder)
+                    csv_recorder = None
+                if state.data_recording and csv_recorder and not storage_manager.data_paused:
+                    data_save_manager.save_sensor_data_to_csv(csv_recorder, sensor_data)
+                
+                # 定期写入会话检查点
+                data_save_manager.checkpoint_session()
                 
                 # 读取图像（仅在录像模式下，按设定间隔）
-                if state.image_recording:
+                if state.image_recording and not storage_manager.images_paused:
                     # 检查是否到了图像记录时间
                     if current_time - state.last_image_time >= state.image_interval:
                         print(f"图像记录间隔: {state.image_interval}秒，开始捕获图像...")
@@ -703,81 +1116,80 @@ def data_monitoring_loop():
             except Exception as e:
                 print(f"数据监测错误: {e}")
         
+        # 没有新样本时，订阅中已到期的窗口也要发出
+        network_manager.flush_subscriptions()
+        
         time.sleep(state.data_interval)  # 使用配置的数据间隔
 
 def setup_command_server():
-    """设置指令服务器"""
+    """设置指令服务器，每个客户端使用独立的处理线程和发送队列"""
     while state.running:
         try:
             server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
             server_socket.bind((COMMAND_HOST, COMMAND_PORT))
-            server_socket.listen(1)
+            server_socket.listen(5)
             print(f"指令服务器启动，监听端口: {COMMAND_PORT}")
             
             while state.running:
                 try:
                     client_socket, address = server_socket.accept()
                     print(f"客户端连接: {address}")
-                    state.command_socket = client_socket
-                    state.client_connected = True
+                    channel = TelemetryChannel(client_socket, address, TELEMETRY_SEND_POLICY,
+                                               TELEMETRY_QUEUE_SIZE, TELEMETRY_BLOCK_TIMEOUT)
+                    network_manager.add_client(channel)
                     
                     # 处理客户端命令
-                    handle_client_commands(client_socket)
+                    client_thread = threading.Thread(target=handle_client_commands,
+                                                     args=(client_socket, channel), daemon=True)
+                    client_thread.start()
                     
                 except Exception as e:
                     print(f"客户端连接错误: {e}")
-                    state.client_connected = False
-                    if state.command_socket:
-                        try:
-                            state.command_socket.close()
-                        except:
-                            pass
-                        state.command_socket = None
             
         except Exception as e:
             print(f"指令服务器错误: {e}")
             time.sleep(3)
 
-def handle_client_commands(client_socket):
+def handle_client_commands(client_socket, channel):
     """处理客户端指令"""
-    buffer = b''
+    reader = LineReader(client_socket)
     
-    while state.running and state.client_connected:
+    while state.running and not channel.closed:
         try:
-            data = client_socket.recv(1024)
-            if not data:
-                print("客户端断开连接")
+            lines = reader.readlines()
+            if not lines:
+                print(f"客户端断开连接: {channel.address}")
                 break
             
-            buffer += data
-            while b'\n' in buffer:
-                line_end = buffer.find(b'\n')
-                command = buffer[:line_end].decode('utf-8').strip()
-                buffer = buffer[line_end+1:]
+            for line in lines:
+                command = line.decode('utf-8').strip()
                 
-                print(f"收到指令: {command}")
-                process_command(command)
+                if command not in QUIET_COMMANDS:
+                    print(f"收到指令: {command}")
+                process_command(command, channel)
                 
         except Exception as e:
-            print(f"处理客户端指令错误: {e}")
+            if not channel.closed:
+                print(f"处理客户端指令错误: {e}")
             break
     
-    state.client_connected = False
+    network_manager.remove_client(channel)
 
-def process_command(command):
-    """处理具体指令"""
+def process_command(command, client=None):
+    """处理具体指令，client为发出指令的客户端发送通道"""
     try:
         if command == "start_monitoring":
             # 开启数据监测
             state.data_monitoring = True
-            network_manager.send_message(state.command_socket, "STATUS", "DATA_MONITORING_STARTED")
+            network_manager.broadcast_message("STATUS", "DATA_MONITORING_STARTED")
             print("开启数据监测")
             
         elif command == "stop_monitoring":
             # 停止数据监测
             state.data_monitoring = False
-            network_manager.send_message(state.command_socket, "STATUS", "DATA_MONITORING_STOPPED")
+            network_manager.flush_subscriptions(force=True)  # 最后一个不完整的聚合窗口
+            network_manager.broadcast_message("STATUS", "DATA_MONITORING_STOPPED")
             print("停止数据监测")
             
         elif command == "cb":
@@ -816,19 +1228,241 @@ def process_command(command):
                 if interval >= 0.1:  # 最小间隔0.1秒
                     state.image_interval = interval
                     print(f"图像记录间隔已设置为: {interval}秒")
-                    network_manager.send_message(state.command_socket, "STATUS", f"IMAGE_INTERVAL_SET:{interval}")
+                    network_manager.send_message(client, "STATUS", f"IMAGE_INTERVAL_SET:{interval}")
                 else:
                     print("图像记录间隔不能小于0.1秒")
-                    network_manager.send_message(state.command_socket, "STATUS", "IMAGE_INTERVAL_ERROR:最小间隔0.1秒")
+                    network_manager.send_message(client, "STATUS", "IMAGE_INTERVAL_ERROR:最小间隔0.1秒")
             except (ValueError, IndexError):
                 print("图像记录间隔设置格式错误")
-                network_manager.send_message(state.command_socket, "STATUS", "IMAGE_INTERVAL_ERROR:格式错误")
+                network_manager.send_message(client, "STATUS", "IMAGE_INTERVAL_ERROR:格式错误")
             
         elif command == "get_image_interval":
             # 获取当前图像记录间隔
-            network_manager.send_message(state.command_socket, "STATUS", f"CURRENT_IMAGE_INTERVAL:{state.image_interval}")
+            network_manager.send_message(client, "STATUS", f"CURRENT_IMAGE_INTERVAL:{state.image_interval}")
             print(f"当前图像记录间隔: {state.image_interval}秒")
             
+        elif command.startswith("set_stream_fps:"):
+            # 设置实时预览最大帧率
+            try:
+                fps = float(command.split(":", 1)[1])
+                if fps <= 0:
+                    raise ValueError
+                stream_server.set_max_fps(fps)
+                print(f"实时预览最大帧率已设置为: {stream_server.max_fps} fps")
+                network_manager.send_message(client, "STATUS", f"STREAM_FPS_SET:{stream_server.max_fps}")
+            except (ValueError, IndexError):
+                print("实时预览帧率设置格式错误")
+                network_manager.send_message(client, "STATUS", "STREAM_FPS_ERROR:格式错误")
+            
+        elif command.startswith("set_send_policy:"):
+            # 设置遥测发送队列策略: set_send_policy:<策略>[:<队列长度>[:<阻塞超时毫秒>]]
+            try:
+                parts = command.split(":")
+                policy = parts[1]
+                if policy not in SEND_POLICIES:
+                    raise ValueError
+                max_queue = int(parts[2]) if len(parts) > 2 and parts[2] else None
+                block_timeout = float(parts[3]) / 1000.0 if len(parts) > 3 and parts[3] else None
+                client.set_policy(policy, max_queue, block_timeout)
+                print(f"客户端 {client.address} 发送策略已设置为: {policy}，队列长度: {client.max_queue}")
+                network_manager.send_message(client, "STATUS", f"SEND_POLICY_SET:{policy}:{client.max_queue}")
+            except (ValueError, IndexError, AttributeError):
+                print("发送策略设置格式错误")
+                network_manager.send_message(client, "STATUS",
+                                             f"SEND_POLICY_ERROR:可选策略 {'/'.join(SEND_POLICIES)}")
+            
+        elif command.startswith("resume:"):
+            # 重连后补发遥测: resume:<流ID>:<最后收到的序号>
+            try:
+                _, stream_id, last_seq = command.split(":", 2)
+                network_manager.resume_client(client, stream_id, int(last_seq))
+            except (ValueError, AttributeError):
+                print("resume指令格式错误")
+                if client:
+                    client.release()
+            
+        elif command.startswith("subscribe:"):
+            # 订阅遥测: subscribe:{"fields": [...], "max_rate": 2, "aggregate": "mean"}
+            try:
+                options = json.loads(command.split(":", 1)[1] or "{}")
+                subscription = TelemetrySubscription(options.get("fields"), options.get("max_rate"),
+                                                     options.get("aggregate", "latest"))
+                client.subscribe(subscription, network_manager.history.stream_id)
+                description = json.dumps(subscription.describe(), ensure_ascii=False)
+                print(f"客户端 {client.address} 订阅遥测: {description}")
+                network_manager.send_message(client, "STATUS", f"SUBSCRIBED:{description}")
+            except (ValueError, TypeError, AttributeError) as e:
+                print(f"订阅指令格式错误: {e}")
+                network_manager.send_message(client, "STATUS", f"SUBSCRIBE_ERROR:{e}")
+            
+        elif command == "unsubscribe":
+            # 取消订阅，恢复接收完整RUNTIME_STATUS
+            if client:
+                client.subscribe(None, network_manager.history.stream_id)
+                network_manager.send_message(client, "STATUS", "UNSUBSCRIBED")
+            
+        elif command.startswith("set_flush_policy:"):
+            # 设置CSV持久化策略: set_flush_policy:rows=50,ms=1000,fsync=10
+            try:
+                options = dict(item.split("=", 1) for item in command.split(":", 1)[1].split(",") if item)
+                unknown = set(options) - {"rows", "ms", "fsync"}
+                if unknown:
+                    raise ValueError(f"未知参数: {','.join(unknown)}")
+                if "rows" in options:
+                    state.csv_flush_rows = max(0, int(options["rows"]))
+                if "ms" in options:
+                    state.csv_flush_interval_ms = max(0, float(options["ms"]))
+                if "fsync" in options:
+                    state.csv_fsync_interval = max(0, float(options["fsync"]))
+                if state.csv_recorder:
+                    state.csv_recorder.set_policy(state.csv_flush_rows, state.csv_flush_interval_ms,
+                                                  state.csv_fsync_interval)
+                policy = f"rows={state.csv_flush_rows},ms={state.csv_flush_interval_ms:g},fsync={state.csv_fsync_interval:g}"
+                print(f"CSV持久化策略已设置为: {policy}")
+                network_manager.send_message(client, "STATUS", f"FLUSH_POLICY_SET:{policy}")
+            except ValueError as e:
+                print(f"CSV持久化策略设置格式错误: {e}")
+                network_manager.send_message(client, "STATUS", "FLUSH_POLICY_ERROR:格式错误")
+            
+        elif command.startswith("set_record_format:"):
+            # 设置数据记录格式，下次开始记录时生效: set_record_format:csv|columnar
+            record_format = command.split(":", 1)[1].strip()
+            if record_format in RECORD_FORMATS:
+                state.record_format = record_format
+                print(f"数据记录格式已设置为: {record_format}")
+                network_manager.send_message(client, "STATUS", f"RECORD_FORMAT_SET:{record_format}")
+            else:
+                print(f"未知的数据记录格式: {record_format}")
+                network_manager.send_message(client, "STATUS", "RECORD_FORMAT_ERROR:未知格式")
+            
+        elif command.startswith("set_record_values:"):
+            # 设置记录内容，下次开始记录时生效: set_record_values:full|raw（raw只记录原始ADC值）
+            record_values = command.split(":", 1)[1].strip()
+            if record_values in RECORD_VALUE_MODES:
+                state.record_values = record_values
+                print(f"数据记录内容已设置为: {record_values}")
+                network_manager.send_message(client, "STATUS", f"RECORD_VALUES_SET:{record_values}")
+            else:
+                print(f"未知的数据记录内容: {record_values}")
+                network_manager.send_message(client, "STATUS", "RECORD_VALUES_ERROR:未知模式")
+            
+        elif command.startswith("set_timestamps:"):
+            # 设置时间戳格式: set_timestamps:text|ns（遥测立即生效，数据文件下次开始记录时生效）
+            timestamp_mode = command.split(":", 1)[1].strip()
+            if timestamp_mode in TIMESTAMP_MODES:
+                state.timestamp_mode = timestamp_mode
+                set_text_timestamps(timestamp_mode == "text")
+                print(f"时间戳格式已设置为: {timestamp_mode}")
+                network_manager.send_message(client, "STATUS", f"TIMESTAMPS_SET:{timestamp_mode}")
+            else:
+                print(f"未知的时间戳格式: {timestamp_mode}")
+                network_manager.send_message(client, "STATUS", "TIMESTAMPS_ERROR:未知格式")
+            
+        elif command.startswith("set_compression:"):
+            # 设置记录压缩格式，下次开始记录时生效: set_compression:none|gzip|zstd
+            compression = command.split(":", 1)[1].strip()
+            if compression == "none":
+                state.record_compression = None
+                print("数据记录压缩已关闭")
+                network_manager.send_message(client, "STATUS", "COMPRESSION_SET:none")
+            elif compression in available_compressions():
+                state.record_compression = compression
+                print(f"数据记录压缩格式已设置为: {compression}")
+                network_manager.send_message(client, "STATUS", f"COMPRESSION_SET:{compression}")
+            else:
+                print(f"不可用的压缩格式: {compression}")
+                network_manager.send_message(client, "STATUS", "COMPRESSION_ERROR:不可用的压缩格式")
+            
+        elif command == "query_sessions" or command.startswith("query_sessions:"):
+            # 查询会话目录: query_sessions:{"since": "2025-01-01", "channel": "temperature", "above": 30, "limit": 20}
+            try:
+                filters = json.loads(command.split(":", 1)[1]) if ":" in command else {}
+                sessions = session_catalog.query(**filters)
+                network_manager.send_message(client, "SESSIONS", sessions)
+            except (ValueError, TypeError) as e:
+                print(f"会话查询格式错误: {e}")
+                network_manager.send_message(client, "STATUS", f"SESSIONS_ERROR:{e}")
+            
+        elif command.startswith("get_session:"):
+            # 查询单个会话及各通道统计: get_session:result_20250101_120000
+            session = session_catalog.get(command.split(":", 1)[1].strip())
+            network_manager.send_message(client, "SESSION", session)
+            
+        elif command.startswith("set_image_storage:"):
+            # 设置图像保存方式: set_image_storage:archive|files
+            storage = command.split(":", 1)[1].strip()
+            if storage in IMAGE_STORAGE_MODES:
+                state.image_storage = storage
+                if storage == "files":
+                    data_save_manager.close_image_archive()
+                print(f"图像保存方式已设置为: {storage}")
+                network_manager.send_message(client, "STATUS", f"IMAGE_STORAGE_SET:{storage}")
+            else:
+                print(f"未知的图像保存方式: {storage}")
+                network_manager.send_message(client, "STATUS", "IMAGE_STORAGE_ERROR:未知方式")
+            
+        elif command.startswith("set_rotation:"):
+            # 设置分段切换策略，下次开始记录时生效: set_rotation:mb=64,minutes=60,rows=0
+            try:
+                options = dict(item.split("=", 1) for item in command.split(":", 1)[1].split(",") if item)
+                unknown = set(options) - {"mb", "minutes", "rows"}
+                if unknown:
+                    raise ValueError(f"未知参数: {','.join(unknown)}")
+                if "mb" in options:
+                    state.rotate_bytes = max(0, int(float(options["mb"]) * 1024 * 1024))
+                if "minutes" in options:
+                    state.rotate_seconds = max(0, float(options["minutes"]) * 60)
+                if "rows" in options:
+                    state.rotate_rows = max(0, int(options["rows"]))
+                rotation = (f"mb={state.rotate_bytes / 1024 / 1024:g},minutes={state.rotate_seconds / 60:g},"
+                            f"rows={state.rotate_rows}")
+                print(f"分段切换策略已设置为: {rotation}")
+                network_manager.send_message(client, "STATUS", f"ROTATION_SET:{rotation}")
+            except ValueError as e:
+                print(f"分段切换策略设置格式错误: {e}")
+                network_manager.send_message(client, "STATUS", "ROTATION_ERROR:格式错误")
+            
+        elif command.startswith("set_storage:"):
+            # 设置存储配额和保留策略: set_storage:quota_mb=4096,retention=compress,warn_mb=512,image_mb=256,data_mb=32
+            try:
+                options = dict(item.split("=", 1) for item in command.split(":", 1)[1].split(",") if item)
+                unknown = set(options) - {"quota_mb", "retention", "warn_mb", "image_mb", "data_mb"}
+                if unknown:
+                    raise ValueError(f"未知参数: {','.join(unknown)}")
+                sizes = {key: max(0, int(float(options[key]) * MB))
+                         for key in ("quota_mb", "warn_mb", "image_mb", "data_mb") if key in options}
+                storage_manager.set_policy(quota_bytes=sizes.get("quota_mb"),
+                                           retention=options.get("retention"),
+                                           warn_bytes=sizes.get("warn_mb"),
+                                           image_reserve_bytes=sizes.get("image_mb"),
+                                           data_reserve_bytes=sizes.get("data_mb"))
+                data_save_manager.check_storage()
+                status = storage_manager.status()
+                print(f"存储策略已设置为: 配额 {status['quota_mb']}MB, 保留策略 {status['retention']}")
+                network_manager.send_message(client, "STORAGE", status)
+            except ValueError as e:
+                print(f"存储策略设置格式错误: {e}")
+                network_manager.send_message(client, "STATUS", f"STORAGE_ERROR:{e}")
+            
+        elif command == "get_storage":
+            # 查询存储空间和保留策略
+            network_manager.send_message(client, "STORAGE", storage_manager.status())
+            
+        elif command == "get_recorder_stats":
+            # 查询CSV记录器吞吐量和刷新耗时
+            stats = state.csv_recorder.stats() if state.csv_recorder else None
+            network_manager.send_message(client, "RECORDER_STATS", stats)
+            
+        elif command == "get_telemetry_stats":
+            # 查询本客户端的遥测发送统计
+            if client:
+                network_manager.send_message(client, "TELEMETRY_STATS", client.stats())
+            
+        elif command == "get_link_stats":
+            # 查询连接和吞吐量统计（接收端连接统计面板定期查询）
+            if client:
+                network_manager.send_message(client, "LINK_STATS", network_manager.link_stats(client))
+            
         elif command == "quit":
             # 退出程序
             print("收到退出指令")
@@ -847,7 +1481,7 @@ def start_data_recording():
         state.current_result_folder = data_save_manager.create_result_folder()
         
         # 初始化CSV文件
-        state.csv_file, state.csv_writer = data_save_manager.initialize_csv_file(state.current_result_folder)
+        state.csv_recorder = data_save_manager.initialize_csv_file(state.current_result_folder)
         
         state.data_recording = True
         print(f"开启数据记录，保存到: {state.current_result_folder}")
@@ -856,7 +1490,7 @@ def start_data_recording():
         if not state.data_monitoring:
             state.data_monitoring = True
         
-        network_manager.send_message(state.command_socket, "STATUS", "GPIO_MONITORING_STARTED")
+        network_manager.broadcast_message("STATUS", "GPIO_MONITORING_STARTED")
         
     except Exception as e:
         print(f"开启数据记录错误: {e}")
@@ -870,17 +1504,27 @@ def stop_data_recording():
         state.data_recording = False
         
         # 关闭CSV文件
-        if state.csv_file:
-            state.csv_file.close()
-            state.csv_file = None
-            state.csv_writer = None
+        csv_recorder, state.csv_recorder = state.csv_recorder, None
+        data_save_manager.close_csv_recorder(csv_recorder)
+        data_save_manager.end_session_if_idle()
         
         print("停止数据记录")
-        network_manager.send_message(state.command_socket, "STATUS", "GPIO_MONITORING_STOPPED")
+        network_manager.broadcast_message("STATUS", "GPIO_MONITORING_STOPPED")
         
     except Exception as e:
         print(f"停止数据记录错误: {e}")
 
+def stop_failed_recording(csv_recorder):
+    """记录器已无法写入（如切换分段时磁盘已满）：按正常流程停止记录，关闭会话日志和会话目录，并通知客户端"""
+    stats = csv_recorder.stats()
+    message = f"记录器无法继续写入（写入错误 {stats['write_errors']} 次），已停止数据记录"
+    print(message)
+    network_manager.broadcast_message("STATUS", f"DATA_RECORDING_ERROR:{message}")
+    if state.combined_recording:
+        stop_combined_recording()
+    else:
+        stop_data_recording()
+
 def start_image_recording():
     """开启图像录制"""
     if state.image_recording:
@@ -900,7 +1544,7 @@ def start_image_recording():
         if not state.data_monitoring:
             state.data_monitoring = True
         
-        network_manager.send_message(state.command_socket, "STATUS", "TIMELAPSE_RECORDING_STARTED")
+        network_manager.broadcast_message("STATUS", "TIMELAPSE_RECORDING_STARTED")
         
     except Exception as e:
         print(f"开启图像录制错误: {e}")
@@ -912,9 +1556,11 @@ def stop_image_recording():
     
     try:
         state.image_recording = False
+        data_save_manager.close_image_archive()
+        data_save_manager.end_session_if_idle()
         print("停止图像录制")
         
-        network_manager.send_message(state.command_socket, "STATUS", "TIMELAPSE_RECORDING_STOPPED")
+        network_manager.broadcast_message("STATUS", "TIMELAPSE_RECORDING_STOPPED")
         
     except Exception as e:
         print(f"停止图像录制错误: {e}")
@@ -925,8 +1571,10 @@ def start_combined_recording():
         # 创建结果文件夹
         state.current_result_folder = data_save_manager.create_result_folder()
         
-        # 初始化CSV文件
-        state.csv_file, state.csv_writer = data_save_manager.initialize_csv_file(state.current_result_folder)
+        # 初始化CSV文件（如已在单独记录数据，先关闭之前的文件）
+        csv_recorder, state.csv_recorder = state.csv_recorder, None
+        data_save_manager.close_csv_recorder(csv_recorder)
+        state.csv_recorder = data_save_manager.initialize_csv_file(state.current_result_folder)
         
         state.data_recording = True
         state.image_recording = True
@@ -940,7 +1588,7 @@ def start_combined_recording():
         print(f"开启录像+数据记录，保存到: {state.current_result_folder}")
         print(f"数据记录间隔: {state.data_interval}秒")
         print(f"图像记录间隔: {state.image_interval}秒")
-        network_manager.send_message(state.command_socket, "STATUS", "TIMELAPSE_RECORDING_AND_GPIO_STARTED")
+        network_manager.broadcast_message("STATUS", "TIMELAPSE_RECORDING_AND_GPIO_STARTED")
         
     except Exception as e:
         print(f"开启录像+数据记录错误: {e}")
@@ -951,15 +1599,15 @@ def stop_combined_recording():
         state.data_recording = False
         state.image_recording = False
         state.combined_recording = False
+        data_save_manager.close_image_archive()
         
         # 关闭CSV文件
-        if state.csv_file:
-            state.csv_file.close()
-            state.csv_file = None
-            state.csv_writer = None
+        csv_recorder, state.csv_recorder = state.csv_recorder, None
+        data_save_manager.close_csv_recorder(csv_recorder)
+        data_save_manager.end_session_if_idle()
         
         print("停止录像+数据记录")
-        network_manager.send_message(state.command_socket, "STATUS", "TIMELAPSE_RECORDING_AND_GPIO_STOPPED")
+        network_manager.broadcast_message("STATUS", "TIMELAPSE_RECORDING_AND_GPIO_STOPPED")
         
     except Exception as e:
         print(f"停止录像+数据记录错误: {e}")
@@ -994,6 +1642,7 @@ def send_current_image():
                 state.image_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
                 state.image_socket.settimeout(10)  # 设置连接超时
                 state.image_socket.connect((IMAGE_HOST, IMAGE_PORT))
+                network_manager.image_connects += 1
                 print(f"成功连接到图像服务器: {IMAGE_HOST}:{IMAGE_PORT}")
             except Exception as conn_error:
                 print(f"连接图像服务器失败: {conn_error}")
@@ -1037,11 +1686,8 @@ def cleanup():
     state.data_monitoring = False
     
     # 关闭网络连接
-    if state.command_socket:
-        try:
-            state.command_socket.close()
-        except:
-            pass
+    for channel in network_manager.get_clients():
+        network_manager.remove_client(channel)
     
     if state.image_socket:
         try:
@@ -1049,9 +1695,16 @@ def cleanup():
         except:
             pass
     
+    # 停止实时预览和文件传输服务
+    stream_server.stop()
+    transfer_server.stop()
+    
     # 清理摄像头
     camera_manager.cleanup()
     
+    # 写完会话目录中尚未写入的更新
+    session_catalog.close()
+    
     print("资源清理完成")
 
 def main():
@@ -1081,13 +1734,38 @@ def main():
         print("   3. 是否安装了picamera模块 (pip3 install picamera)")
         print("   4. 摄像头是否被其他程序占用")
     
+    # 检查上次运行中未正常结束的记录会话（如断电）
+    for summary in recover_all("."):
+        print_summary(summary)
+        try:
+            # 断电前的会话目录可能落后于数据文件，按恢复后的分段清单和文件大小更新（不重新读取数据）
+            session_catalog.update_totals(summary["folder"], summary["totals"], "recovered")
+        except Exception as e:
+            print(f"更新会话目录错误: {e}")
+    
     print(f"🌐 网络配置:")
     print(f"   指令端口: {COMMAND_PORT}")
     print(f"   图像接收端: {IMAGE_HOST}:{IMAGE_PORT}")
+    print(f"   实时预览: http://<本机IP>:{STREAM_PORT}/ （最大 {STREAM_MAX_FPS} fps）")
+    print(f"   文件传输端口: {TRANSFER_PORT}")
     
     print(f"💡 图像间隔设置指令:")
     print(f"   设置间隔: set_image_interval:<秒数>")
     print(f"   查询间隔: get_image_interval")
+    print(f"   预览帧率: set_stream_fps:<帧率>")
+    print(f"   断线补发: resume:<流ID>:<最后收到的序号>")
+    print(f"   记录格式: set_record_format:<csv|columnar>（下次开始记录时生效）")
+    print(f"   记录内容: set_record_values:<full|raw>（raw只记录原始ADC值，下次开始记录时生效）")
+    print(f"   时间戳格式: set_timestamps:<text|ns>（ns为整数纳秒时间戳+单调时钟）")
+    print(f'   会话查询: query_sessions[:{{"since": ..., "channel": ..., "above": ..., "limit": ...}}]  get_session:<文件夹>')
+    print(f"   图像保存: set_image_storage:<archive|files>")
+    print(f"   存储空间: set_storage:quota_mb=<MB>,retention=<{'|'.join(RETENTION_POLICIES)}>,warn_mb=,image_mb=,data_mb=  查询: get_storage")
+    print(f"   记录压缩: set_compression:<none|{'|'.join(available_compressions())}>（下次开始记录时生效）")
+    print(f"   分段切换: set_rotation:mb=<MB>,minutes=<分钟>,rows=<行数>（0表示不按该条件切换）")
+    print(f"   CSV刷新策略: set_flush_policy:rows=<行数>,ms=<毫秒>,fsync=<秒>  查询: get_recorder_stats")
+    print(f'   遥测订阅: subscribe:{{"fields": [...], "max_rate": <Hz>, "aggregate": "latest|mean|minmax"}}')
+    print(f"   发送策略: set_send_policy:<drop_oldest|coalesce|block>[:<队列长度>[:<超时毫秒>]]")
+    print(f"   连接统计: get_link_stats（发送速率、丢弃数量、图像发送耗时）")
     print("=" * 60)
     
     try:
@@ -1096,6 +1774,15 @@ def main():
         data_thread = threading.Thread(target=data_monitoring_loop, daemon=True)
         data_thread.start()
         
+        # 启动实时预览服务
+        if camera_manager.camera_available:
+            print("🚀 启动实时预览服务...")
+            stream_server.start()
+        
+        # 启动文件传输服务
+        print("🚀 启动文件传输服务...")
+        transfer_server.start()
+        
         # 启动指令服务器
         print("🚀 启动指令服务器...")
         setup_command_server()